@@ -0,0 +1,279 @@
+"""Daily order rollups per store.
+
+create_order and update_order adjust the rollup rows in the same transaction
+as the order, so the analytics API never scans orders. On first startup with
+existing orders and no rollups they are built automatically; to repair
+drift, rebuild from the orders tables:
+
+    python -m app.analytics backfill [--store-id ID]
+    python -m app.analytics check [--store-id ID]
+"""
+import argparse
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import select, delete, func
+from app.config import settings
+from app.database import engine
+from app.models import Order, OrderItem, OrderStatus, Product, StoreDailyStats, ProductDailyStats
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_xact_lock key serializing the startup backfill across workers
+BACKFILL_LOCK_ID = 716_001
+
+ROLLUP_TZ = timezone(timedelta(minutes=settings.ANALYTICS_UTC_OFFSET_MINUTES))
+# Statuses that count as sales; cancelled orders only show up in by_status
+SALE_STATUSES = [s for s in OrderStatus if s != OrderStatus.CANCELLED]
+
+if engine.dialect.name == "postgresql":
+    from sqlalchemy.dialects.postgresql import insert
+else:
+    from sqlalchemy.dialects.sqlite import insert
+
+def order_day(created_at: datetime) -> date:
+    """Rollup day of an order; naive timestamps are UTC"""
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at.astimezone(ROLLUP_TZ).date()
+
+def increment(model, rows: list, keys: list):
+    """INSERT rows, adding their counters to existing rows on key conflict"""
+    stmt = insert(model).values(rows)
+    counters = [name for name in rows[0] if name not in keys]
+    return stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={name: getattr(model, name) + stmt.excluded[name] for name in counters}
+    )
+
+def order_rollup_rows(order: Order, status: OrderStatus, sign: int) -> tuple:
+    """Store and product rollup rows adding (sign=1) or removing (sign=-1) order under status"""
+    day = order_day(order.created_at)
+    products = defaultdict(lambda: [0, 0.0])
+    for item in order.items:
+        products[item.product_id][0] += item.quantity
+        products[item.product_id][1] += item.total
+    store_row = {
+        "store_id": order.store_id, "day": day, "status": status,
+        "orders": sign, "revenue": sign * order.total,
+        "units": sign * sum(units for units, _ in products.values()),
+    }
+    product_rows = [
+        {"store_id": order.store_id, "day": day, "product_id": product_id, "status": status,
+         "units": sign * units, "revenue": sign * revenue}
+        for product_id, (units, revenue) in products.items()
+    ]
+    return [store_row], product_rows
+
+async def record_order_change(db, order: Order, old_status: Optional[OrderStatus], new_status: OrderStatus):
+    """Move order's contribution from old_status (None for a new order) to new_status.
+
+    Call before committing, with order.items loaded.
+    """
+    store_rows, product_rows = order_rollup_rows(order, new_status, 1)
+    if old_status is not None:
+        old_store_rows, old_product_rows = order_rollup_rows(order, old_status, -1)
+        store_rows += old_store_rows
+        product_rows += old_product_rows
+    await db.execute(increment(StoreDailyStats, store_rows, ["store_id", "day", "status"]))
+    if product_rows:
+        await db.execute(increment(ProductDailyStats, product_rows, ["store_id", "day", "product_id", "status"]))
+
+def today() -> date:
+    return datetime.now(ROLLUP_TZ).date()
+
+async def summarize(db, store_id: int, date_from: date, date_to: date, top: int) -> dict:
+    """Analytics for an inclusive date range, read from the rollups only"""
+    in_range = (
+        StoreDailyStats.store_id == store_id,
+        StoreDailyStats.day >= date_from,
+        StoreDailyStats.day <= date_to,
+    )
+    counters = (
+        func.sum(StoreDailyStats.orders).label("orders"),
+        func.sum(StoreDailyStats.revenue).label("revenue"),
+        func.sum(StoreDailyStats.units).label("units"),
+    )
+    days = (await db.execute(
+        select(StoreDailyStats.day, *counters)
+        .where(*in_range, StoreDailyStats.status.in_(SALE_STATUSES))
+        .group_by(StoreDailyStats.day)
+        .order_by(StoreDailyStats.day)
+    )).all()
+    by_status = (await db.execute(
+        select(StoreDailyStats.status, *counters)
+        .where(*in_range)
+        .group_by(StoreDailyStats.status)
+    )).all()
+
+    units = func.sum(ProductDailyStats.units).label("units")
+    revenue = func.sum(ProductDailyStats.revenue).label("revenue")
+    top_products = (await db.execute(
+        select(ProductDailyStats.product_id, units, revenue)
+        .where(
+            ProductDailyStats.store_id == store_id,
+            ProductDailyStats.day >= date_from,
+            ProductDailyStats.day <= date_to,
+            ProductDailyStats.status.in_(SALE_STATUSES),
+        )
+        .group_by(ProductDailyStats.product_id)
+        .having(units > 0)
+        .order_by(revenue.desc(), ProductDailyStats.product_id)
+        .limit(top)
+    )).all()
+    titles = {}
+    if top_products:
+        titles = dict((await db.execute(select(Product.id, Product.title).where(
+            Product.id.in_([row.product_id for row in top_products])
+        ))).all())
+
+    # Zero rows remain after status changes; drop them from the output
+    days = [row for row in days if row.orders]
+    orders = sum(row.orders for row in days)
+    revenue_total = sum(row.revenue for row in days)
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "orders": orders,
+        "revenue": revenue_total,
+        "units": sum(row.units for row in days),
+        "average_order_value": revenue_total / orders if orders else 0.0,
+        "days": [row._asdict() for row in days],
+        "by_status": [row._asdict() for row in by_status if row.orders],
+        "top_products": [
+            {**row._asdict(), "title": titles.get(row.product_id)} for row in top_products
+        ],
+    }
+
+def compute_rollups(session, store_id: Optional[int] = None) -> tuple:
+    """Aggregate rollups from orders and order_items (sync session).
+
+    Returns ({(store_id, day, status): [orders, revenue, units]},
+    {(store_id, day, product_id, status): [units, revenue]}).
+    """
+    stores = defaultdict(lambda: [0, 0.0, 0])
+    products = defaultdict(lambda: [0, 0.0])
+
+    orders = select(Order.store_id, Order.created_at, Order.status, Order.total)
+    items = select(
+        Order.store_id, Order.created_at, Order.status,
+        OrderItem.product_id, OrderItem.quantity, OrderItem.total
+    ).join(OrderItem, OrderItem.order_id == Order.id)
+    if store_id is not None:
+        orders = orders.where(Order.store_id == store_id)
+        items = items.where(Order.store_id == store_id)
+
+    for row in session.execute(orders.execution_options(yield_per=1000)):
+        totals = stores[(row.store_id, order_day(row.created_at), row.status)]
+        totals[0] += 1
+        totals[1] += row.total
+    for row in session.execute(items.execution_options(yield_per=1000)):
+        day = order_day(row.created_at)
+        stores[(row.store_id, day, row.status)][2] += row.quantity
+        totals = products[(row.store_id, day, row.product_id, row.status)]
+        totals[0] += row.quantity
+        totals[1] += row.total
+    return stores, products
+
+def load_rollups(session, store_id: Optional[int] = None) -> tuple:
+    """Read the rollup tables in the shape returned by compute_rollups"""
+    store_query = select(StoreDailyStats)
+    product_query = select(ProductDailyStats)
+    if store_id is not None:
+        store_query = store_query.where(StoreDailyStats.store_id == store_id)
+        product_query = product_query.where(ProductDailyStats.store_id == store_id)
+    stores = {
+        (r.store_id, r.day, r.status): [r.orders, r.revenue, r.units]
+        for r in session.scalars(store_query)
+    }
+    products = {
+        (r.store_id, r.day, r.product_id, r.status): [r.units, r.revenue]
+        for r in session.scalars(product_query)
+    }
+    return stores, products
+
+def backfill(session, store_id: Optional[int] = None):
+    """Replace the rollups of one or all stores with a full recompute.
+
+    Orders created while this runs may be missed; run it in a quiet period.
+    """
+    stores, products = compute_rollups(session, store_id)
+    for model in (StoreDailyStats, ProductDailyStats):
+        query = delete(model)
+        if store_id is not None:
+            query = query.where(model.store_id == store_id)
+        session.execute(query)
+    if stores:
+        session.execute(insert(StoreDailyStats), [
+            {"store_id": s, "day": d, "status": st, "orders": o, "revenue": r, "units": u}
+            for (s, d, st), (o, r, u) in stores.items()
+        ])
+    if products:
+        session.execute(insert(ProductDailyStats), [
+            {"store_id": s, "day": d, "product_id": p, "status": st, "units": u, "revenue": r}
+            for (s, d, p, st), (u, r) in products.items()
+        ])
+    session.commit()
+    return len(stores), len(products)
+
+def backfill_if_empty():
+    """Build the rollups from existing orders the first time the app runs with them.
+
+    Orders from before the rollups existed have no rows to move between
+    statuses, so their first status change would drive counters negative.
+    Runs on startup; once any rollup row exists it only costs two lookups.
+    """
+    from app.database import SessionLocal
+
+    with SessionLocal() as session:
+        if session.scalar(select(StoreDailyStats.id).limit(1)) is not None:
+            return
+        if session.scalar(select(Order.id).limit(1)) is None:
+            return
+        if engine.dialect.name == "postgresql":
+            # One worker backfills; the others wait here, then see its rows
+            session.execute(select(func.pg_advisory_xact_lock(BACKFILL_LOCK_ID)))
+            if session.scalar(select(StoreDailyStats.id).limit(1)) is not None:
+                session.commit()
+                return
+        store_rows, product_rows = backfill(session)
+        logger.info("Built %d store and %d product rollup rows from existing orders", store_rows, product_rows)
+
+def check(session, store_id: Optional[int] = None) -> list:
+    """Compare the rollup tables with a full recompute; return mismatched keys"""
+    expected = compute_rollups(session, store_id)
+    actual = load_rollups(session, store_id)
+    mismatches = []
+    for wanted, stored in zip(expected, actual):
+        for key in set(wanted) | set(stored):
+            # Missing rows equal zero ones, which status changes leave behind
+            size = len(wanted.get(key) or stored[key])
+            a = wanted.get(key, [0] * size)
+            b = stored.get(key, [0] * size)
+            if any(abs(x - y) > 1e-6 for x, y in zip(a, b)):
+                mismatches.append((key, a, b))
+    return mismatches
+
+def main():
+    from app.database import SessionLocal, init_db
+
+    parser = argparse.ArgumentParser(prog="python -m app.analytics")
+    parser.add_argument("command", choices=["backfill", "check"])
+    parser.add_argument("--store-id", type=int)
+    args = parser.parse_args()
+
+    init_db()
+    with SessionLocal() as session:
+        if args.command == "backfill":
+            store_rows, product_rows = backfill(session, args.store_id)
+            print(f"Rebuilt {store_rows} store and {product_rows} product rollup rows")
+        else:
+            mismatches = check(session, args.store_id)
+            for key, expected, stored in mismatches:
+                print(f"{key}: expected {expected}, stored {stored}")
+            print(f"{len(mismatches)} mismatched rollup rows")
+            raise SystemExit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,16 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import NamedTuple, Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select, event
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
 from app.models import User
 from app.config import settings
+from app.otp_store import get_otp_store
+from app.cache import TTLCache
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
@@ -39,61 +42,173 @@ def verify_token(token: str) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    # Development mode: accept dev tokens
-    if token and token.startswith('dev-token-'):
-        # Get or create dev user
-        dev_user = db.query(User).filter(User.phone == 'dev-user').first()
-        if not dev_user:
-            dev_user = User(phone='dev-user', full_name='Dev User', is_active=True)
-            db.add(dev_user)
-            db.commit()
-            db.refresh(dev_user)
-        return dev_user
-    
-    # Production: verify real JWT token
-    payload = verify_token(token)
-    user_id: int = payload.get("sub")
-    if user_id is None:
+class CurrentUser(NamedTuple):
+    """Immutable snapshot of the authenticated user, safe to cache across requests"""
+    id: int
+    phone: str
+    email: Optional[str]
+    full_name: Optional[str]
+    is_active: bool
+    is_superuser: bool
+    created_at: Optional[datetime]
+
+    @classmethod
+    def from_user(cls, user: User) -> "CurrentUser":
+        return cls(
+            id=user.id,
+            phone=user.phone,
+            email=user.email,
+            full_name=user.full_name,
+            is_active=user.is_active,
+            is_superuser=user.is_superuser,
+            created_at=user.created_at,
+        )
+
+    @classmethod
+    def from_claims(cls, payload: dict) -> Optional["CurrentUser"]:
+        """Build from claims embedded by create_user_token, if present"""
+        claims = payload.get("usr")
+        if not claims:
+            return None
+        return cls(
+            id=int(payload["sub"]),
+            phone=claims["phone"],
+            email=claims.get("email"),
+            full_name=claims.get("name"),
+            is_active=claims.get("active", True),
+            is_superuser=claims.get("su", False),
+            created_at=None,
+        )
+
+# user id (or DEV_USER_KEY) -> CurrentUser
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+DEV_USER_KEY = "dev-user"
+
+def invalidate_user_cache(user_id: int):
+    """Drop cached snapshot so user changes apply on the next request"""
+    user_cache.delete(user_id)
+    user_cache.delete(DEV_USER_KEY)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    invalidate_user_cache(target.id)
+
+def create_user_token(user: User, expires_delta: Optional[timedelta] = None) -> str:
+    """Create access token for user, embedding profile claims if enabled"""
+    data = {"sub": str(user.id)}
+    if settings.JWT_EMBED_USER_CLAIMS:
+        data["usr"] = {
+            "phone": user.phone,
+            "email": user.email,
+            "name": user.full_name,
+            "active": user.is_active,
+            "su": user.is_superuser,
+        }
+    return create_access_token(data, expires_delta=expires_delta)
+
+def ensure_active(user: CurrentUser) -> CurrentUser:
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Inactive user"
+        )
+    return user
+
+def get_user_id(payload: dict) -> int:
+    """Read the user id from the token subject"""
+    try:
+        return int(payload["sub"])
+    except (KeyError, TypeError, ValueError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    user = db.query(User).filter(User.id == user_id).first()
+
+async def get_dev_user(db: AsyncSession) -> CurrentUser:
+    """Get or create the development user"""
+    cached = user_cache.get(DEV_USER_KEY)
+    if cached:
+        return cached
+    
+    dev_user = await db.scalar(select(User).where(User.phone == 'dev-user'))
+    if not dev_user:
+        dev_user = User(phone='dev-user', full_name='Dev User', is_active=True)
+        db.add(dev_user)
+        await db.commit()
+        await db.refresh(dev_user)
+    
+    snapshot = CurrentUser.from_user(dev_user)
+    user_cache.set(DEV_USER_KEY, snapshot)
+    return snapshot
+
+async def load_user(user_id: int, db: AsyncSession) -> CurrentUser:
+    """Get user snapshot from cache, falling back to the database"""
+    cached = user_cache.get(user_id)
+    if cached:
+        return ensure_active(cached)
+    
+    user = await db.scalar(select(User).where(User.id == user_id))
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return user
+    snapshot = CurrentUser.from_user(user)
+    user_cache.set(user_id, snapshot)
+    return ensure_active(snapshot)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> CurrentUser:
+    # Development mode: accept dev tokens
+    if token and token.startswith('dev-token-'):
+        return await get_dev_user(db)
+    
+    # Production: verify real JWT token
+    payload = verify_token(token)
+    return await load_user(get_user_id(payload), db)
+
+async def get_token_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> CurrentUser:
+    """Like get_current_user, but trusts claims embedded in the token.
+    
+    For read-only endpoints: with JWT_EMBED_USER_CLAIMS on, no database or
+    cache lookup is needed until the token expires.
+    """
+    if token and token.startswith('dev-token-'):
+        return await get_dev_user(db)
+    
+    payload = verify_token(token)
+    claims_user = CurrentUser.from_claims(payload)
+    if claims_user:
+        return ensure_active(claims_user)
+    return await load_user(get_user_id(payload), db)
 
-# Simple OTP storage (in production, use Redis)
-otp_storage = {}
+async def get_admin_user(current_user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+    """Require a superuser"""
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return current_user
 
 def generate_otp() -> str:
     """Generate 6-digit OTP"""
     import random
     return str(random.randint(100000, 999999))
 
-def store_otp(phone: str, otp: str):
-    """Store OTP (in production, use Redis with TTL)"""
-    otp_storage[phone] = {
-        "otp": otp,
-        "expires_at": datetime.utcnow() + timedelta(minutes=10)
-    }
-
-def verify_otp(phone: str, otp: str) -> bool:
-    """Verify OTP"""
-    if phone not in otp_storage:
-        return False
-    stored = otp_storage[phone]
-    if datetime.utcnow() > stored["expires_at"]:
-        del otp_storage[phone]
-        return False
-    if stored["otp"] != otp:
-        return False
-    del otp_storage[phone]
-    return True
+async def otp_rate_limited(phone: str) -> bool:
+    """Count an OTP request for phone; True if it is over the rate limit"""
+    return await get_otp_store().hit_rate_limit(
+        phone, settings.OTP_RATE_LIMIT, settings.OTP_RATE_WINDOW_SECONDS
+    )
+
+async def store_otp(phone: str, otp: str):
+    """Store OTP with TTL"""
+    await get_otp_store().save(phone, otp, settings.OTP_TTL_SECONDS)
+
+async def verify_otp(phone: str, otp: str) -> bool:
+    """Verify and consume OTP"""
+    return await get_otp_store().consume(phone, otp)
 
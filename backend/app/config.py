@@ -8,15 +8,77 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = "postgresql://bdtraders:bdtraders123@db:5432/bdtraders"
+    DATABASE_ASYNC: bool = True  # asyncpg/aiosqlite; False runs the sync driver in a threadpool
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30  # seconds to wait for a connection before failing the request
+    DB_POOL_RECYCLE: int = -1  # seconds before a pooled connection is replaced; -1 keeps it
+    DB_POOL_PRE_PING: bool = True  # test each connection on checkout (one extra round trip)
+    DB_POOL_USE_LIFO: bool = False  # reuse the most recent connection so idle extras can time out
+    DB_SYNC_POOL_SIZE: int = 2  # sync engine pool when DATABASE_ASYNC is on (startup and maintenance only)
+    DB_PGBOUNCER: bool = False  # behind PgBouncer in transaction mode: no app pool, no prepared statement cache
     
     # Security
     SECRET_KEY: str = "your-secret-key-change-in-production"
     JWT_SECRET_KEY: str = "your-jwt-secret-change-in-production"
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    JWT_EMBED_USER_CLAIMS: bool = False  # lets read-only endpoints skip the user lookup
+    USER_CACHE_SIZE: int = 4096
+    USER_CACHE_TTL: int = 30  # seconds
+    
+    # Pagination
+    PAGE_SIZE_DEFAULT: int = 50
+    PAGE_SIZE_MAX: int = 200
+    
+    # Bulk import/export
+    IMPORT_BATCH_SIZE: int = 500  # rows per insert transaction
+    IMPORT_MAX_ERRORS: int = 1000  # row errors kept in a job report
+    IMPORT_JOB_TTL: int = 3600  # seconds a job report stays available
+    EXPORT_BATCH_SIZE: int = 1000  # rows fetched per server-side cursor round trip
+    
+    # Order numbers
+    ORDER_WORKER_ID: Optional[int] = None  # 0-1023; leased from the database when unset
+    ORDER_WORKER_LEASE_SECONDS: int = 60  # a leased number is renewed every third of this
+    
+    # Idempotency-Key support for order creation
+    IDEMPOTENCY_KEY_TTL: int = 86400  # seconds a key and its response are kept
+    
+    # Analytics
+    ANALYTICS_UTC_OFFSET_MINUTES: int = 360  # day boundary for rollups (Bangladesh, UTC+6)
     
     # Multi-tenancy
     BASE_DOMAIN: str = "72.61.239.193.sslip.io"
+    STORE_CACHE_SIZE: int = 1024
+    STORE_CACHE_TTL: int = 60  # seconds
+    STORE_CACHE_NEGATIVE_TTL: int = 5  # seconds, for unknown subdomains
+    STORE_DOMAINS_REFRESH_SECONDS: int = 60  # reload of the custom domain map, for other workers' changes
+    
+    # Prometheus metrics at /metrics
+    METRICS_ENABLED: bool = True
+    METRICS_TOKEN: Optional[str] = None  # /metrics is 404 until set; scrapes send Authorization: Bearer <token>
+    METRICS_MAX_TENANTS: int = 200  # per-tenant series kept; further stores count as "other"
+    
+    # Request profiling (off unless enabled; see app/profiling.py)
+    PROFILING_ENABLED: bool = False
+    PROFILING_TOKEN: Optional[str] = None  # requests sending X-Profile: <token> are profiled
+    PROFILING_SAMPLE_RATE: float = 0.0  # fraction of all requests to profile
+    PROFILING_BUFFER_SIZE: int = 50  # profiles kept per worker process
+    PROFILING_TOP_FUNCTIONS: int = 40  # functions listed in each call tree
+    
+    # Public storefront response cache
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_SIZE: int = 2048
+    RESPONSE_CACHE_TTL: int = 60  # seconds
+    RESPONSE_CACHE_REDIS: bool = False  # share entries across workers via REDIS_URL
+    RESPONSE_CACHE_VERSION_TTL: float = 1.0  # seconds other workers' invalidations may take to apply
+    
+    # OTP
+    OTP_BACKEND: str = "memory"  # "memory" (single worker) or "redis"
+    REDIS_URL: str = "redis://redis:6379/0"
+    OTP_TTL_SECONDS: int = 600
+    OTP_RATE_LIMIT: int = 5  # OTP requests per phone per window
+    OTP_RATE_WINDOW_SECONDS: int = 900
     
     # Email
     EMAIL_FROM: str = "noreply@bdtraders.com"
@@ -33,9 +95,26 @@ class Settings(BaseSettings):
     FACEBOOK_PIXEL_ID: Optional[str] = None
     META_ACCESS_TOKEN: Optional[str] = None
     
+    # Outbox worker (order notifications and tracking)
+    OUTBOX_WORKER_ENABLED: bool = True
+    OUTBOX_BATCH_SIZE: int = 50
+    OUTBOX_CONCURRENCY: int = 10  # events sent at once per worker
+    OUTBOX_POLL_INTERVAL: float = 2.0  # seconds
+    OUTBOX_MAX_ATTEMPTS: int = 8
+    OUTBOX_RETRY_BASE_SECONDS: int = 5  # doubled after every failed attempt
+    OUTBOX_RETRY_MAX_SECONDS: int = 3600
+    OUTBOX_LEASE_SECONDS: int = 300  # claimed events are retried after this if a worker dies
+    HTTP_TIMEOUT_SECONDS: float = 10.0
+    HTTP_MAX_CONNECTIONS: int = 20
+    META_GRAPH_API_URL: str = "https://graph.facebook.com/v18.0"
+    
     # File uploads
     UPLOAD_DIR: str = "/app/uploads"
-    MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
+    MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB per file
+    MAX_UPLOAD_FILES: int = 10  # files per upload request
+    FILE_STAT_CACHE_SIZE: int = 4096
+    FILE_STAT_CACHE_TTL: int = 300  # seconds
+    IMAGE_WORKERS: int = 2  # processes generating resized image variants
     
     class Config:
         env_file = ".env"
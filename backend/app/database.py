@@ -1,27 +1,343 @@
-from sqlalchemy import create_engine
+import anyio
+import bisect
+import logging
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from sqlalchemy import create_engine, exc, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool, AsyncAdaptedQueuePool
+from starlette.concurrency import run_in_threadpool
 from app.config import settings
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
-)
+logger = logging.getLogger(__name__)
+
+class PoolMetrics:
+    """Thread-safe checkout counters and wait-time histogram of one engine's pool"""
+
+    # Upper bounds in seconds of the checkout wait histogram buckets
+    WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_counts = [0] * (len(self.WAIT_BUCKETS) + 1)  # last bucket is +Inf
+        self._lock = threading.Lock()
+
+    def observe_wait(self, seconds: float):
+        bucket = bisect.bisect_left(self.WAIT_BUCKETS, seconds)
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_counts[bucket] += 1
+
+    def observe_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        """Consistent copy of the counters"""
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_counts": list(self.wait_counts),
+            }
+
+_in_checkout = ContextVar("in_checkout", default=False)
+
+def metered(pool_class, metrics: PoolMetrics):
+    """Subclass of pool_class recording checkout waits and timeouts in metrics.
+
+    Only the wait for a free connection is timed: opening a new one (overflow,
+    or every checkout of a NullPool) is measured and subtracted, so slow
+    connects do not read as pool saturation. A class attribute, so pools
+    recreated after a disconnect keep reporting.
+    """
+    class MeteredPool(pool_class):
+        def _create_connection(self):
+            started = time.perf_counter()
+            record = super()._create_connection()
+            # Read back by _do_get on the same record, so concurrent checkouts do not mix
+            record.connect_seconds = time.perf_counter() - started
+            return record
+
+        def _do_get(self):
+            if _in_checkout.get():
+                # QueuePool retries by calling _do_get again; the outer call times it
+                return super()._do_get()
+            token = _in_checkout.set(True)
+            started = time.perf_counter()
+            try:
+                record = super()._do_get()
+            except exc.TimeoutError:
+                metrics.observe_timeout()
+                raise
+            finally:
+                _in_checkout.reset(token)
+            connect_seconds = record.__dict__.pop("connect_seconds", 0.0)
+            metrics.observe_wait(max(time.perf_counter() - started - connect_seconds, 0.0))
+            return record
+
+    MeteredPool.metrics = metrics
+    return MeteredPool
+
+def pool_args(queue_pool_class, metrics: PoolMetrics, pool_size: int = None, max_overflow: int = None) -> dict:
+    """create_engine pool arguments from settings"""
+    if settings.DB_PGBOUNCER:
+        # PgBouncer pools server connections; a second pool here only pins them
+        return {"poolclass": metered(NullPool, metrics)}
+    return {
+        "poolclass": metered(queue_pool_class, metrics),
+        "pool_size": settings.DB_POOL_SIZE if pool_size is None else pool_size,
+        "max_overflow": settings.DB_MAX_OVERFLOW if max_overflow is None else max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_use_lifo": settings.DB_POOL_USE_LIFO,
+    }
+
+pool_metrics = {"sync": PoolMetrics()}
+
+# In async mode requests use async_engine; the sync engine only serves
+# startup, the order ID lease renewals and CLI tools, so it keeps a small
+# pool of its own instead of a second full-size one
+engine = create_engine(settings.DATABASE_URL, **pool_args(
+    QueuePool, pool_metrics["sync"],
+    **({"pool_size": settings.DB_SYNC_POOL_SIZE, "max_overflow": 0} if settings.DATABASE_ASYNC else {})
+))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def get_async_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto its async driver"""
+    scheme, sep, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+async_engine = None
+AsyncSessionLocal = None
+
+if settings.DATABASE_ASYNC:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    async_url = get_async_url(settings.DATABASE_URL)
+    pool_metrics["async"] = PoolMetrics()
+    if async_url.startswith("sqlite"):
+        # aiosqlite opens a connection per checkout; only waits are metered
+        async_pool_args = {"poolclass": metered(NullPool, pool_metrics["async"])}
+    else:
+        async_pool_args = pool_args(AsyncAdaptedQueuePool, pool_metrics["async"])
+    connect_args = {}
+    if settings.DB_PGBOUNCER and async_url.startswith("postgresql+asyncpg"):
+        # Transaction mode hands each transaction a different server
+        # connection, so named prepared statements must not be reused
+        connect_args = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    async_engine = create_async_engine(async_url, connect_args=connect_args, **async_pool_args)
+    # Objects stay usable after commit; attribute access must never trigger IO
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
+
+# Sessions open at once, when waiting for a connection would block a thread.
+# With the sync driver every call runs on a threadpool worker; if they all
+# wait on pool checkout, the sessions that hold connections never get a
+# worker back to finish. aiosqlite opens a connection per session, and
+# unbounded writers spend their time sleeping in SQLite's busy handler.
+SESSION_SLOTS = None
+if not settings.DB_PGBOUNCER and (async_engine is None or async_engine.dialect.name == "sqlite"):
+    SESSION_SLOTS = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+session_slots = None  # CapacityLimiter, created in the event loop on first use
+
+@asynccontextmanager
+async def session_slot():
+    """Wait up to DB_POOL_TIMEOUT for a free session slot"""
+    global session_slots
+    if SESSION_SLOTS is None:
+        yield
+        return
+    if session_slots is None:
+        session_slots = anyio.CapacityLimiter(SESSION_SLOTS)
+    # Any object can borrow; one per session, so a task may hold several
+    borrower = object()
+    with anyio.fail_after(settings.DB_POOL_TIMEOUT):
+        await session_slots.acquire_on_behalf_of(borrower)
+    try:
+        yield
+    finally:
+        session_slots.release_on_behalf_of(borrower)
+
+def pool_stats() -> dict:
+    """Current usage and cumulative checkout metrics of each engine's pool"""
+    pools = {"sync": engine.pool}
+    if async_engine is not None:
+        pools["async"] = async_engine.sync_engine.pool
+    stats = {}
+    for name, pool in pools.items():
+        metrics = pool_metrics[name].snapshot()
+        queued = isinstance(pool, QueuePool)
+        stats[name] = {
+            "pool": type(pool).__bases__[0].__name__,
+            "size": pool.size() if queued else 0,
+            "checked_out": pool.checkedout() if queued else None,
+            "overflow": max(pool.overflow(), 0) if queued else None,
+            "checkouts": metrics["checkouts"],
+            "timeouts": metrics["timeouts"],
+            "wait_seconds_total": round(metrics["wait_seconds_total"], 6),
+            "wait_buckets": dict(zip(
+                [str(bound) for bound in PoolMetrics.WAIT_BUCKETS] + ["+Inf"],
+                metrics["wait_counts"]
+            )),
+        }
+    return stats
+
+class SyncSessionAdapter:
+    """Awaitable facade over a sync Session, used when DATABASE_ASYNC is off.
+
+    Mirrors the subset of the AsyncSession API the routers use and runs every
+    blocking call in the threadpool, so handlers are written once for both modes.
+    """
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def execute(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, *args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, *args, **kwargs)
+
+    async def scalars(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalars, *args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, *args, **kwargs)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self, *args, **kwargs):
+        await run_in_threadpool(self.sync_session.flush, *args, **kwargs)
+
+    async def refresh(self, *args, **kwargs):
+        await run_in_threadpool(self.sync_session.refresh, *args, **kwargs)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+async def get_db():
+    """Yield a request-scoped session (AsyncSession or SyncSessionAdapter)"""
+    async with session_slot():
+        if AsyncSessionLocal is not None:
+            async with AsyncSessionLocal() as db:
+                yield db
+            return
+
+        db = SyncSessionAdapter(SessionLocal(expire_on_commit=False))
+        try:
+            yield db
+        finally:
+            await db.close()
+
+# Same session as get_db, for work outside a request such as background workers
+db_session = asynccontextmanager(get_db)
+
+async def stream_partitions(statement, size: int):
+    """Yield result rows in lists of up to size, read through a server-side cursor.
+
+    Uses a dedicated session so the stream can outlive the request-scoped
+    one; memory is bounded by size whatever the result length.
+    """
+    statement = statement.execution_options(yield_per=size)
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(statement)
+            async for partition in result.partitions():
+                yield partition
+        return
+
+    session = SessionLocal()
     try:
-        yield db
+        partitions = (await run_in_threadpool(session.execute, statement)).partitions()
+        while partition := await run_in_threadpool(next, partitions, None):
+            yield partition
     finally:
-        db.close()
+        await run_in_threadpool(session.close)
+
+def dedupe_product_slugs(conn) -> int:
+    """Rename products whose slug repeats within their store.
+
+    The oldest product keeps the slug, later ones get the first free
+    slug-N, so the unique (store_id, slug) index can be created on
+    databases from before it existed. Returns the number of renamed rows.
+    """
+    from sqlalchemy import func, select, update
+    from app.models import Product
+
+    duplicates = conn.execute(
+        select(Product.store_id, Product.slug)
+        .group_by(Product.store_id, Product.slug)
+        .having(func.count() > 1)
+    ).all()
+    renamed = 0
+    for store_id, slug in duplicates:
+        taken = set(conn.scalars(select(Product.slug).where(Product.store_id == store_id)))
+        product_ids = conn.scalars(
+            select(Product.id)
+            .where(Product.store_id == store_id, Product.slug == slug)
+            .order_by(Product.id)
+        ).all()
+        counter = 1
+        for product_id in product_ids[1:]:
+            while True:
+                suffix = f"-{counter}"
+                new_slug = slug[:Product.slug.type.length - len(suffix)] + suffix
+                counter += 1
+                if new_slug not in taken:
+                    break
+            taken.add(new_slug)
+            conn.execute(update(Product).where(Product.id == product_id).values(slug=new_slug))
+            renamed += 1
+    return renamed
 
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
-
+    # Older databases may hold repeated slugs the unique index would reject
+    if not any(index["name"] == "ix_products_store_slug" for index in inspect(engine).get_indexes("products")):
+        with engine.begin() as conn:
+            renamed = dedupe_product_slugs(conn)
+        if renamed:
+            logger.warning("Renamed %d products with duplicate slugs before adding ix_products_store_slug", renamed)
+    # create_all skips existing tables, so add indexes introduced since
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
@@ -0,0 +1,151 @@
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple
+import aiofiles
+from fastapi import HTTPException, Request, status
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from app.cache import TTLCache
+from app.config import settings
+
+# Uploaded filenames are UUIDs and never change, so clients may cache forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+CHUNK_SIZE = 64 * 1024
+
+class FileStat(NamedTuple):
+    path: Path
+    stat: os.stat_result
+    etag: str
+    last_modified: str
+
+# (directory, filename) -> FileStat; missing files are not cached since
+# image variants appear shortly after upload
+stat_cache = TTLCache(maxsize=settings.FILE_STAT_CACHE_SIZE, ttl=settings.FILE_STAT_CACHE_TTL)
+
+def stat_file(directory: Path, filename: str) -> Optional[FileStat]:
+    """Stat a file inside directory, served from cache when possible.
+
+    Returns None if it does not exist; raises 403 if it resolves outside
+    directory.
+    """
+    key = (directory, filename)
+    cached = stat_cache.get(key)
+    if cached:
+        return cached
+
+    path = directory / filename
+    try:
+        stat = path.stat()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    if not path.is_file():
+        return None
+
+    # Security: ensure file is within directory
+    try:
+        path.resolve().relative_to(directory.resolve())
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+
+    file = FileStat(
+        path=path,
+        stat=stat,
+        etag=f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+        last_modified=formatdate(stat.st_mtime, usegmt=True),
+    )
+    stat_cache.set(key, file)
+    return file
+
+def is_not_modified(request: Request, file: FileStat) -> bool:
+    """Evaluate If-None-Match, or If-Modified-Since when no ETag was sent"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or file.etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(file.stat.st_mtime) <= since
+    return False
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single "bytes=" range into inclusive (start, end).
+
+    Returns None to serve the whole file (absent, malformed or multi-range);
+    raises 416 if the range cannot be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_text, sep, end_text = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # Suffix range: last N bytes
+            start = max(size - int(end_text), 0)
+            end = size - 1
+    except ValueError:
+        return None
+
+    if start < 0 or start > end and end_text:
+        return None
+    if start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, min(end, size - 1)
+
+async def iter_file_range(path: Path, start: int, end: int):
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def file_response(request: Request, file: FileStat, headers: Optional[dict] = None) -> Response:
+    """Serve an immutable file with ETag, 304 and single Range support"""
+    headers = {
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "ETag": file.etag,
+        "Last-Modified": file.last_modified,
+        "Accept-Ranges": "bytes",
+        **(headers or {}),
+    }
+    if is_not_modified(request, file):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range in (file.etag, file.last_modified)):
+        byte_range = parse_range(range_header, file.stat.st_size)
+        if byte_range:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{file.stat.st_size}"
+            headers["Content-Length"] = str(end - start + 1)
+            media_type = mimetypes.guess_type(file.path.name)[0] or "application/octet-stream"
+            return StreamingResponse(
+                iter_file_range(file.path, start, end),
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                media_type=media_type,
+                headers=headers,
+            )
+
+    return FileResponse(file.path, stat_result=file.stat, headers=headers)
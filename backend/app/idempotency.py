@@ -0,0 +1,92 @@
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from app.config import settings
+from app.models import IdempotencyKey
+
+PURGE_INTERVAL = 3600  # seconds between sweeps of expired keys, per process
+_last_purge = 0.0
+
+def fingerprint(data) -> str:
+    """Hash of a request body, to detect a key reused for a different request"""
+    body = json.dumps(data.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(body.encode()).hexdigest()
+
+async def purge_expired(db):
+    """Delete expired keys at most once per PURGE_INTERVAL"""
+    global _last_purge
+    if time.monotonic() - _last_purge < PURGE_INTERVAL:
+        return
+    _last_purge = time.monotonic()
+    await db.execute(delete(IdempotencyKey).where(
+        IdempotencyKey.expires_at <= datetime.now(timezone.utc)
+    ))
+    await db.commit()
+
+async def claim_key(db, store_id: int, key: str, request_fingerprint: str) -> Tuple[Optional[IdempotencyKey], Optional[Response]]:
+    """Insert key in the current transaction, before any other work.
+
+    Returns (row, None) when this request owns the key: record the response
+    on row with save_response before committing. A concurrent request with
+    the same key blocks on the unique index until that commit, then gets
+    (None, stored response). If the owner fails and rolls back, the waiting
+    request takes the key over and runs normally.
+    """
+    await purge_expired(db)
+    for attempt in range(3):
+        now = datetime.now(timezone.utc)
+        row = IdempotencyKey(
+            store_id=store_id,
+            key=key,
+            fingerprint=request_fingerprint,
+            expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+        )
+        db.add(row)
+        try:
+            await db.flush()
+            return row, None
+        except IntegrityError:
+            await db.rollback()
+
+        expired = await db.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.store_id == store_id,
+            IdempotencyKey.key == key,
+            IdempotencyKey.expires_at <= now
+        ))
+        if expired.rowcount:
+            await db.commit()
+            continue
+
+        existing = await db.scalar(select(IdempotencyKey).where(
+            IdempotencyKey.store_id == store_id,
+            IdempotencyKey.key == key
+        ))
+        if existing is None:
+            continue
+        if existing.fingerprint != request_fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different request"
+            )
+        return None, Response(
+            content=existing.response_body,
+            status_code=existing.response_status,
+            media_type="application/json",
+            headers={"Idempotent-Replayed": "true"},
+        )
+
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="A request with this Idempotency-Key is in progress, please retry"
+    )
+
+def save_response(row: IdempotencyKey, status_code: int, model):
+    """Store the response for replay; commits with the rest of the transaction"""
+    row.response_status = status_code
+    row.response_body = model.model_dump_json()
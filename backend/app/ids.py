@@ -0,0 +1,231 @@
+"""Compact, time-ordered IDs for order numbers.
+
+Snowflake layout in 63 bits: milliseconds since ID_EPOCH (41 bits, ~69
+years), worker number (10 bits) and a per-millisecond sequence (12 bits).
+Encoded as 13 Crockford base32 characters, whose alphabet is in ASCII
+order, so IDs sort by creation time as strings and new rows land at the
+right edge of the unique index instead of at random positions.
+"""
+import asyncio
+import logging
+import os
+import secrets
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+ID_EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKERS = 1 << WORKER_BITS
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+ID_LENGTH = 13
+
+def encode_base32(value: int) -> str:
+    chars = []
+    for _ in range(ID_LENGTH):
+        value, digit = divmod(value, 32)
+        chars.append(ALPHABET[digit])
+    return "".join(reversed(chars))
+
+def lease_expiry(now: datetime) -> datetime:
+    return now + timedelta(seconds=settings.ORDER_WORKER_LEASE_SECONDS)
+
+def seed_worker_leases(session):
+    """Insert the rows of worker numbers missing from worker_leases"""
+    from app.models import WorkerLease
+
+    existing = set(session.scalars(select(WorkerLease.number)))
+    missing = [{"number": number} for number in range(MAX_WORKERS) if number not in existing]
+    if not missing:
+        return
+    try:
+        session.execute(insert(WorkerLease), missing)
+        session.commit()
+    except IntegrityError:
+        # Another process seeded them first
+        session.rollback()
+
+def claim_worker_number(token: str) -> int:
+    """Lease the lowest worker number that is free or whose lease expired.
+
+    Raises RuntimeError when every number is leased: wrapping around would
+    let two live processes generate the same IDs.
+    """
+    from app.database import SessionLocal
+    from app.models import WorkerLease
+
+    with SessionLocal() as session:
+        seed_worker_leases(session)
+        while True:
+            now = datetime.now(timezone.utc)
+            available = or_(WorkerLease.expires_at.is_(None), WorkerLease.expires_at < now)
+            number = session.scalar(
+                select(WorkerLease.number)
+                .where(available)
+                .order_by(WorkerLease.number)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            if number is None:
+                raise RuntimeError(
+                    f"All {MAX_WORKERS} order worker numbers are leased; "
+                    "stop stale processes or set ORDER_WORKER_ID"
+                )
+            # Conditional, for databases without row locks: another process
+            # may have taken the number since the select
+            result = session.execute(
+                update(WorkerLease)
+                .where(WorkerLease.number == number, available)
+                .values(
+                    token=token, hostname=socket.gethostname()[:255], pid=os.getpid(),
+                    heartbeat_at=now, expires_at=lease_expiry(now)
+                )
+            )
+            session.commit()
+            if result.rowcount == 1:
+                return number
+
+def renew_worker_lease(number: int, token: str) -> bool:
+    """Extend this process's lease; False if it was lost to another process"""
+    from app.database import SessionLocal
+    from app.models import WorkerLease
+
+    now = datetime.now(timezone.utc)
+    with SessionLocal() as session:
+        result = session.execute(
+            update(WorkerLease)
+            .where(WorkerLease.number == number, WorkerLease.token == token)
+            .values(heartbeat_at=now, expires_at=lease_expiry(now))
+        )
+        session.commit()
+    return result.rowcount == 1
+
+def release_worker_lease(number: int, token: str):
+    """Free the number for the next process to start"""
+    from app.database import SessionLocal
+    from app.models import WorkerLease
+
+    with SessionLocal() as session:
+        session.execute(
+            update(WorkerLease)
+            .where(WorkerLease.number == number, WorkerLease.token == token)
+            .values(token=None, expires_at=None)
+        )
+        session.commit()
+
+class WorkerNumberUnavailable(RuntimeError):
+    """No valid worker number lease right now; the renewal task is getting one"""
+
+class IdGenerator:
+    """Thread-safe generator, monotonic within the process.
+
+    Without a fixed worker_id, the worker number is leased from
+    worker_leases by start() and renewed, or leased again, by its task in
+    the threadpool. next_id never touches the database: while no lease is
+    known to be valid it raises WorkerNumberUnavailable, so two processes
+    never use one number at the same time.
+    """
+
+    def __init__(self, worker_id: int = None):
+        self.worker_id = worker_id
+        self.leased = worker_id is None
+        self._token: Optional[str] = None
+        # time.monotonic() after which the leased number may be reused elsewhere
+        self._lease_deadline = 0.0
+        self._last_ms = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def maintain(self):
+        """Renew the lease, or lease a number again if it was lost (blocking IO)"""
+        with self._lock:
+            number, token = self.worker_id, self._token
+        deadline = time.monotonic() + settings.ORDER_WORKER_LEASE_SECONDS
+        if token is not None:
+            # Matches on the token, so this cannot revive a number another
+            # process took meanwhile
+            renewed = renew_worker_lease(number, token)
+            with self._lock:
+                if self._token != token:
+                    return
+                if renewed:
+                    self._lease_deadline = deadline
+                    return
+                logger.warning("Lost the lease of order worker number %d", number)
+                self.worker_id = None
+                self._token = None
+        token = secrets.token_hex(16)
+        number = claim_worker_number(token)
+        with self._lock:
+            self.worker_id = number
+            self._token = token
+            self._lease_deadline = deadline
+        logger.info("Leased order worker number %d", number)
+
+    async def start(self):
+        """Lease a worker number and keep it leased from the event loop"""
+        if not self.leased or self._task is not None:
+            return
+        await run_in_threadpool(self.maintain)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        with self._lock:
+            number, token = self.worker_id, self._token
+            if token is not None:
+                self.worker_id = None
+                self._token = None
+        if token is not None:
+            await run_in_threadpool(release_worker_lease, number, token)
+
+    async def _run(self):
+        while True:
+            # Retry soon while IDs cannot be generated
+            leased = self._token is not None
+            await asyncio.sleep(settings.ORDER_WORKER_LEASE_SECONDS / 3 if leased else 1)
+            try:
+                await run_in_threadpool(self.maintain)
+            except Exception:
+                logger.exception("Renewing the order worker lease failed")
+
+    def next_id(self) -> str:
+        with self._lock:
+            if self.leased and (self._token is None or time.monotonic() >= self._lease_deadline):
+                raise WorkerNumberUnavailable("No order worker number is leased")
+            now_ms = int(time.time() * 1000) - ID_EPOCH_MS
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            elif self._sequence < MAX_SEQUENCE:
+                # Same millisecond, or the clock stepped back: keep counting
+                self._sequence += 1
+            else:
+                # Sequence exhausted: borrow the next millisecond
+                self._last_ms += 1
+                self._sequence = 0
+            value = (
+                (self._last_ms << (WORKER_BITS + SEQUENCE_BITS))
+                | (self.worker_id << SEQUENCE_BITS)
+                | self._sequence
+            )
+        return encode_base32(value)
+
+order_ids = IdGenerator(settings.ORDER_WORKER_ID)
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> target width in pixels
+VARIANT_WIDTHS = {
+    "thumb": 200,
+    "card": 600,
+    "full": 1200,
+}
+VARIANT_SOURCE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+# Output format -> (Pillow format, save options)
+SAVE_OPTIONS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+    "png": ("PNG", {"optimize": True}),
+}
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def variant_filename(filename: str, variant: str, fmt: str) -> str:
+    """Name of a derivative stored next to the original, e.g. <uuid>_card.webp"""
+    return f"{Path(filename).stem}_{variant}.{fmt}"
+
+def fallback_format(filename: str) -> str:
+    """Non-WebP format for browsers without WebP support"""
+    return "png" if Path(filename).suffix.lower() == ".png" else "jpg"
+
+# URL prefixes under which files in UPLOAD_DIR are served
+UPLOAD_URL_PREFIXES = ("/api/uploads/images/", "/uploads/")
+
+def local_upload_name(url: str) -> Optional[str]:
+    """Filename in UPLOAD_DIR for an uploaded image URL, None for external URLs"""
+    for prefix in UPLOAD_URL_PREFIXES:
+        if url.startswith(prefix):
+            name = url[len(prefix):].split("?", 1)[0]
+            return name if name and "/" not in name else None
+    return None
+
+def image_dimensions(url: str) -> Tuple[Optional[int], Optional[int]]:
+    """(width, height) of an uploaded image, read from its header only"""
+    name = local_upload_name(url)
+    if not name:
+        return None, None
+    from PIL import Image
+
+    try:
+        with Image.open(Path(settings.UPLOAD_DIR) / name) as image:
+            return image.size
+    except (OSError, ValueError):
+        return None, None
+
+def variant_urls(url: str) -> dict:
+    """Variant name -> URL for uploaded images that get resized variants"""
+    name = local_upload_name(url)
+    if not name or Path(name).suffix.lower() not in VARIANT_SOURCE_EXTENSIONS:
+        return {}
+    return {variant: f"/api/uploads/images/{name}?variant={variant}" for variant in VARIANT_WIDTHS}
+
+def migrate_product_images(engine, batch_size: int = 500):
+    """Move URLs from the legacy products.images JSON text into product_images.
+
+    Converted rows get the JSON column cleared in the same transaction, so this
+    is safe to run on every startup and from several workers at once.
+    """
+    from sqlalchemy import select, insert, update
+    from app.models import Product, ProductImage
+
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(Product.id, Product.images_json)
+                .where(Product.images_json.isnot(None))
+                .order_by(Product.id)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not rows:
+                return
+            images = []
+            for product_id, value in rows:
+                try:
+                    urls = json.loads(value) if value.strip() else []
+                except ValueError:
+                    logger.warning("Dropping unparseable images of product %s: %r", product_id, value)
+                    urls = []
+                if not isinstance(urls, list):
+                    urls = []
+                urls = dict.fromkeys(url for url in urls if isinstance(url, str) and url)
+                for position, url in enumerate(urls):
+                    width, height = image_dimensions(url)
+                    images.append({
+                        "product_id": product_id, "position": position,
+                        "url": url, "width": width, "height": height,
+                    })
+            if images:
+                conn.execute(insert(ProductImage), images)
+            conn.execute(
+                update(Product)
+                .where(Product.id.in_([product_id for product_id, _ in rows]))
+                .values({Product.images_json: None})
+            )
+            logger.info("Moved %d images of %d products into product_images", len(images), len(rows))
+
+def generate_variants(path: str) -> float:
+    """Write every width variant of path as WebP plus fallback; return seconds taken.
+
+    Runs in a worker process, so it must only use its arguments.
+    """
+    from PIL import Image, ImageOps
+
+    started = time.perf_counter()
+    source = Path(path)
+    fallback = fallback_format(source.name)
+    with Image.open(source) as opened:
+        image = ImageOps.exif_transpose(opened)
+        if fallback == "jpg" and image.mode != "RGB":
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        for variant, width in VARIANT_WIDTHS.items():
+            resized = image.copy()
+            # Never upscale; keep aspect ratio
+            resized.thumbnail((width, width * 10), Image.LANCZOS)
+            for fmt in ("webp", fallback):
+                pil_format, options = SAVE_OPTIONS[fmt]
+                target = source.with_name(variant_filename(source.name, variant, fmt))
+                tmp = target.with_name(f".{target.name}.part")
+                resized.save(tmp, format=pil_format, **options)
+                tmp.replace(target)
+    return time.perf_counter() - started
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+    return _pool
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+async def process_image(path: Path):
+    """Generate variants off the event loop (used as a background task)"""
+    if path.suffix.lower() not in VARIANT_SOURCE_EXTENSIONS:
+        return
+    loop = asyncio.get_running_loop()
+    try:
+        elapsed = await loop.run_in_executor(get_pool(), generate_variants, str(path))
+    except Exception:
+        logger.exception("Image variant generation failed for %s", path.name)
+        return
+    logger.info("Generated image variants for %s in %.1f ms", path.name, elapsed * 1000)
@@ -1,12 +1,20 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
-from app.database import init_db
-from app.middleware import tenant_middleware
-from app.routers import auth, stores, products, orders, public, uploads
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.database import engine, init_db, db_session, pool_stats
+from app.middleware import TenantMiddleware, refresh_store_domains
+from app.images import shutdown_pool, migrate_product_images
+from app.analytics import backfill_if_empty
+from app.search import init_search
+from app.notifications import close_http_client
+from app.outbox import outbox_worker
+from app.ids import order_ids
+from app.response_cache import response_cache
+from app.metrics import MetricsMiddleware, instrument_engines, request_metrics
+from app import profiling
+from app.routers import auth, stores, catalog, products, orders, public, uploads, analytics, admin
 from app.config import settings
-import os
+import secrets
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -24,26 +32,51 @@ app.add_middleware(
 )
 
 # Tenant middleware (must be before routes)
-@app.middleware("http")
-async def tenant_middleware_wrapper(request: Request, call_next):
-    return await tenant_middleware(request, call_next)
+app.add_middleware(TenantMiddleware)
+
+# Outside the tenant middleware, so request timing covers tenant resolution too
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engines()
+
+# Nothing is installed unless enabled, so profiling costs nothing when off
+if settings.PROFILING_ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware)
+    profiling.instrument_engines()
 
 # Include routers
 app.include_router(auth.router)
 app.include_router(stores.router)
+app.include_router(catalog.router)
 app.include_router(products.router)
 app.include_router(orders.router)
 app.include_router(public.router)
 app.include_router(uploads.router)
+app.include_router(analytics.router)
+app.include_router(admin.router)
+# Uploaded images are also served under /uploads, with the same caching
+app.add_api_route("/uploads/{filename}", uploads.get_image, methods=["GET", "HEAD"], include_in_schema=False)
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup"""
+    """Initialize database, search indexes and pending data migrations on startup"""
     init_db()
-    # Mount static files for uploaded images
-    upload_dir = settings.UPLOAD_DIR
-    if os.path.exists(upload_dir):
-        app.mount("/uploads", StaticFiles(directory=upload_dir), name="uploads")
+    init_search(engine)
+    migrate_product_images(engine)
+    backfill_if_empty()
+    async with db_session() as db:
+        await refresh_store_domains(db)
+    await order_ids.start()
+    if settings.OUTBOX_WORKER_ENABLED:
+        outbox_worker.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background workers and close outbound connections"""
+    shutdown_pool()
+    await outbox_worker.stop()
+    await order_ids.stop()
+    await close_http_client()
 
 @app.get("/api/health")
 async def health_check():
@@ -51,9 +84,25 @@ async def health_check():
     return {
         "status": "ok",
         "app": settings.APP_NAME,
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "response_cache": response_cache.stats,
+        "database_pool": pool_stats()
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Prometheus text exposition of this worker's metrics"""
+    # Series carry store ids and routes, so there is no unauthenticated endpoint
+    if not settings.METRICS_ENABLED or not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    expected = f"Bearer {settings.METRICS_TOKEN}"
+    if not secrets.compare_digest(request.headers.get("authorization", ""), expected):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token"
+        )
+    return PlainTextResponse(request_metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     """Root endpoint"""
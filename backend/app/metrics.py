@@ -0,0 +1,205 @@
+"""Process-local request and database metrics in Prometheus text format.
+
+Each worker process keeps its own numbers; scrape every worker, or run one
+worker per container, to get totals.
+"""
+import bisect
+import time
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.config import settings
+from app.database import engine, async_engine, pool_stats
+from app.response_cache import response_cache
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SQL_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+# [statements, seconds] of the current request, None outside requests
+sql_usage: ContextVar[Optional[list]] = ContextVar("sql_usage", default=None)
+
+class Histogram:
+    """Labelled histogram; observe() is a dict lookup, a bisect and two adds"""
+
+    def __init__(self, name: str, help: str, labelnames: tuple, buckets: tuple):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self.series = {}
+
+    def observe(self, labels: tuple, value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self.series.items():
+            pairs = format_labels(self.labelnames, labels)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{pairs},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{pairs}}} {total}")
+            lines.append(f"{self.name}_count{{{pairs}}} {cumulative}")
+        return lines
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names: tuple, values: tuple) -> str:
+    return ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values))
+
+def metric(name: str, kind: str, help: str, samples: list) -> list:
+    """Exposition lines of a counter or gauge from (labels string, value) samples"""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+    return lines
+
+class RequestMetrics:
+    """Request latency, SQL usage and per-tenant counters of this process"""
+
+    def __init__(self, max_tenants: int):
+        self.max_tenants = max_tenants
+        self.in_flight = 0
+        self.latency = Histogram(
+            "http_request_duration_seconds", "Request latency by route template",
+            ("method", "route", "status"), LATENCY_BUCKETS
+        )
+        self.statements = Histogram(
+            "db_statements_per_request", "SQL statements issued per request",
+            ("method", "route"), STATEMENT_BUCKETS
+        )
+        self.sql_time = Histogram(
+            "db_time_per_request_seconds", "Time spent in SQL statements per request",
+            ("method", "route"), SQL_TIME_BUCKETS
+        )
+        # tenant id -> requests; at most max_tenants ids, the rest count as "other"
+        self.tenants = {}
+
+    def record(self, method: str, route: str, status: int, seconds: float,
+               tenant_id: Optional[int], usage: list):
+        self.latency.observe((method, route, status), seconds)
+        self.statements.observe((method, route), usage[0])
+        self.sql_time.observe((method, route), usage[1])
+        tenant = tenant_id or "none"
+        if tenant not in self.tenants and len(self.tenants) >= self.max_tenants:
+            tenant = "other"
+        self.tenants[tenant] = self.tenants.get(tenant, 0) + 1
+
+    def render(self) -> str:
+        lines = metric("http_requests_in_flight", "gauge", "Requests being handled", [("", self.in_flight)])
+        for histogram in (self.latency, self.statements, self.sql_time):
+            lines += histogram.render()
+        lines += metric(
+            "http_tenant_requests_total", "counter", "Requests per store id",
+            [(format_labels(("tenant",), (tenant,)), count) for tenant, count in self.tenants.items()]
+        )
+        lines += render_pools()
+        lines += metric(
+            "response_cache_lookups_total", "counter", "Storefront response cache lookups by result",
+            [(format_labels(("result",), (result,)), count) for result, count in response_cache.stats.items()]
+        )
+        return "\n".join(lines) + "\n"
+
+def render_pools() -> list:
+    """Connection pool gauges, timeout counters and checkout wait histograms"""
+    stats = pool_stats()
+    labels = {name: format_labels(("engine",), (name,)) for name in stats}
+    lines = metric(
+        "db_pool_checked_out", "gauge", "Connections checked out of the pool",
+        [(labels[name], s["checked_out"]) for name, s in stats.items() if s["checked_out"] is not None]
+    )
+    lines += metric(
+        "db_pool_overflow", "gauge", "Connections open beyond the pool size",
+        [(labels[name], s["overflow"]) for name, s in stats.items() if s["overflow"] is not None]
+    )
+    lines += metric(
+        "db_pool_checkout_timeouts_total", "counter", "Checkouts that gave up after DB_POOL_TIMEOUT",
+        [(labels[name], s["timeouts"]) for name, s in stats.items()]
+    )
+    name = "db_pool_checkout_wait_seconds"
+    lines += [
+        f"# HELP {name} Time spent waiting for a free connection, excluding opening new ones",
+        f"# TYPE {name} histogram",
+    ]
+    for engine_name, engine_stats in stats.items():
+        # One snapshot, so buckets, sum and count agree
+        cumulative = 0
+        for bound, count in engine_stats["wait_buckets"].items():
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels[engine_name]},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels[engine_name]}}} {engine_stats['wait_seconds_total']}")
+        lines.append(f"{name}_count{{{labels[engine_name]}}} {cumulative}")
+    return lines
+
+request_metrics = RequestMetrics(max_tenants=settings.METRICS_MAX_TENANTS)
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if sql_usage.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    usage = sql_usage.get()
+    started = conn.info.get("query_started")
+    if usage is not None and started:
+        usage[0] += 1
+        usage[1] += time.perf_counter() - started.pop()
+
+def instrument_engines():
+    """Count SQL statements and their time against the request that issued them"""
+    engines = [engine] if async_engine is None else [engine, async_engine.sync_engine]
+    for target in engines:
+        if not event.contains(target, "before_cursor_execute", before_cursor_execute):
+            event.listen(target, "before_cursor_execute", before_cursor_execute)
+            event.listen(target, "after_cursor_execute", after_cursor_execute)
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing each HTTP request into request_metrics.
+
+    Routes are labelled by their template (/api/products/{product_id}), so
+    the label set stays bounded; unmatched paths share one label.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        usage = [0, 0.0]
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        token = sql_usage.set(usage)
+        request_metrics.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_metrics.in_flight -= 1
+            sql_usage.reset(token)
+            route = scope.get("route")
+            request_metrics.record(
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                status_code,
+                elapsed,
+                scope.get("state", {}).get("tenant_id"),
+                usage,
+            )
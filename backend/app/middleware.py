@@ -1,30 +1,124 @@
-from fastapi import Request, HTTPException, status
+from fastapi import HTTPException, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
-from app.models import Store
+from starlette.types import ASGIApp, Receive, Scope, Send
+from typing import NamedTuple, Optional
+from app.database import db_session
+from app.models import Store, StoreDomain
 from app.config import settings
+from app.cache import TTLCache
+import logging
 import re
+import time
 
-def get_tenant_from_subdomain(host: str) -> str:
-    """Extract tenant subdomain from host header"""
-    # Remove port if present
-    host = host.split(':')[0]
-    
-    # Remove www. if present
-    host = host.replace('www.', '')
-    
-    # Extract subdomain
-    base_domain = settings.BASE_DOMAIN
-    if host.endswith(base_domain):
-        subdomain = host.replace(f'.{base_domain}', '').replace(base_domain, '')
-        if subdomain and subdomain != 'api' and subdomain != 'admin':
+logger = logging.getLogger(__name__)
+
+class StoreSnapshot(NamedTuple):
+    """Immutable subset of a Store kept in the tenant cache"""
+    id: int
+    subdomain: str
+    name: str
+    is_active: bool
+    currency: str
+    brand_color: str
+    logo: Optional[str]
+    default_language: str
+
+    @classmethod
+    def from_store(cls, store: Store) -> "StoreSnapshot":
+        return cls(
+            id=store.id,
+            subdomain=store.subdomain,
+            name=store.name,
+            is_active=store.is_active,
+            currency=store.currency,
+            brand_color=store.brand_color,
+            logo=store.logo,
+            default_language=store.default_language,
+        )
+
+# subdomain -> StoreSnapshot, or None for a cached negative lookup
+store_cache = TTLCache(maxsize=settings.STORE_CACHE_SIZE, ttl=settings.STORE_CACHE_TTL)
+_NOT_CACHED = object()
+
+# Subdomains of BASE_DOMAIN that are not stores
+RESERVED_SUBDOMAINS = frozenset({"api", "admin", "www"})
+
+def normalize_host(host: str) -> str:
+    """Lowercase host without port, trailing dot or leading www."""
+    host = host.lower()
+    if host.startswith("["):
+        # IPv6 literal; never a tenant, but keep its colons intact
+        return host.partition("]")[0] + "]"
+    host = host.partition(":")[0].rstrip(".")
+    return host[4:] if host.startswith("www.") else host
+
+class HostResolver:
+    """Maps a Host header to the subdomain of the store it addresses.
+
+    <subdomain>.BASE_DOMAIN is matched by a pattern compiled once; merchants'
+    own domains are looked up in an exact-match map loaded from store_domains.
+    Custom domains map to the store's subdomain (which never changes), so both
+    kinds of host share the store cache. Results are memoized per normalized
+    host, so ports, case and www. variants of one host share an entry and a
+    known host costs normalize_host plus one dict lookup.
+    """
+
+    def __init__(self, base_domain: str, max_hosts: int):
+        self.pattern = re.compile(
+            rf"([a-z0-9](?:[a-z0-9-]*[a-z0-9])?)\.{re.escape(normalize_host(base_domain))}"
+        )
+        self.max_hosts = max_hosts
+        self.domains = {}
+        self.hosts = {}
+        self.loaded_at: Optional[float] = None
+
+    def resolve(self, host: str) -> Optional[str]:
+        host = normalize_host(host)
+        subdomain = self.hosts.get(host, _NOT_CACHED)
+        if subdomain is _NOT_CACHED:
+            subdomain = self.parse(host)
+            # Bounded so random Host headers cannot grow it without limit
+            if len(self.hosts) < self.max_hosts:
+                self.hosts[host] = subdomain
+        return subdomain
+
+    def parse(self, host: str) -> Optional[str]:
+        """Subdomain for a host already passed through normalize_host"""
+        subdomain = self.domains.get(host)
+        if subdomain:
             return subdomain
-    
-    # Fallback: check if host is just the base domain (main site)
-    if host == base_domain:
+        match = self.pattern.fullmatch(host)
+        if match and match.group(1) not in RESERVED_SUBDOMAINS:
+            return match.group(1)
         return None
-    
-    return None
+
+    def set_domains(self, domains: dict):
+        # Swapped whole so requests never see a half-built map
+        self.domains = domains
+        self.hosts = {}
+        self.loaded_at = time.monotonic()
+
+    def is_stale(self) -> bool:
+        return (
+            self.loaded_at is None
+            or time.monotonic() - self.loaded_at > settings.STORE_DOMAINS_REFRESH_SECONDS
+        )
+
+host_resolver = HostResolver(settings.BASE_DOMAIN, max_hosts=settings.STORE_CACHE_SIZE)
+
+def get_tenant_from_subdomain(host: str) -> Optional[str]:
+    """Extract tenant subdomain from host header"""
+    return host_resolver.resolve(host)
+
+async def refresh_store_domains(db):
+    """Reload the custom domain map of active stores"""
+    rows = await db.execute(
+        select(StoreDomain.domain, Store.subdomain)
+        .join(Store, Store.id == StoreDomain.store_id)
+        .where(Store.is_active == True)
+    )
+    host_resolver.set_domains(dict(rows.all()))
 
 def get_store_by_subdomain(db: Session, subdomain: str) -> Store:
     """Get store by subdomain"""
@@ -47,27 +141,72 @@ def get_store_by_subdomain(db: Session, subdomain: str) -> Store:
     
     return store
 
-async def tenant_middleware(request: Request, call_next):
-    """Middleware to extract tenant from subdomain"""
-    host = request.headers.get("host", "")
-    subdomain = get_tenant_from_subdomain(host)
+async def resolve_store(subdomain: str) -> Optional[StoreSnapshot]:
+    """Get active store snapshot by subdomain, served from cache when possible"""
+    cached = store_cache.get(subdomain, _NOT_CACHED)
+    if cached is not _NOT_CACHED:
+        return cached
     
-    # Store subdomain in request state for use in routes
-    request.state.subdomain = subdomain
-    request.state.tenant_id = None
+    # Through db_session, so async mode needs no sync pool for requests
+    async with db_session() as db:
+        store = await db.scalar(select(Store).where(Store.subdomain == subdomain, Store.is_active == True))
+    if not store:
+        store_cache.set(subdomain, None, ttl=settings.STORE_CACHE_NEGATIVE_TTL)
+        return None
     
-    # If subdomain exists, get store and set tenant_id
-    if subdomain:
-        db = SessionLocal()
+    snapshot = StoreSnapshot.from_store(store)
+    store_cache.set(subdomain, snapshot)
+    return snapshot
+
+def invalidate_store_cache(subdomain: str):
+    """Drop cached tenant lookup so store edits are visible on the next request"""
+    store_cache.delete(subdomain)
+
+# Paths that never look at the tenant; requests to them skip host parsing and the DB
+TENANT_EXEMPT_PREFIXES = ("/api/health", "/metrics", "/docs", "/redoc", "/openapi.json", "/uploads/", "/api/uploads/")
+
+def get_host(scope: Scope) -> str:
+    """Host header from the raw ASGI scope"""
+    for name, value in scope["headers"]:
+        if name == b"host":
+            return value.decode("latin-1")
+    return ""
+
+async def resolve_tenant(host: str) -> dict:
+    """Request state entries for the tenant addressed by host"""
+    if host_resolver.is_stale():
+        # Mark fresh first so concurrent requests do not all reload
+        host_resolver.loaded_at = time.monotonic()
         try:
-            store = get_store_by_subdomain(db, subdomain)
-            request.state.tenant_id = store.id
-            request.state.store = store
-        except HTTPException:
-            pass
-        finally:
-            db.close()
-    
-    response = await call_next(request)
-    return response
+            async with db_session() as db:
+                await refresh_store_domains(db)
+        except Exception:
+            logger.exception("Reloading custom domains failed; keeping the previous map")
+    state = {"subdomain": get_tenant_from_subdomain(host), "tenant_id": None}
+    subdomain = state["subdomain"]
+    if subdomain:
+        store = await resolve_store(subdomain)
+        if store:
+            state["tenant_id"] = store.id
+            state["store"] = store
+    return state
+
+class TenantMiddleware:
+    """Pure ASGI middleware that sets request.state.subdomain, tenant_id and store.
+
+    Unlike @app.middleware("http"), it leaves the response untouched, so
+    streamed bodies pass straight through with their backpressure.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
 
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] in ("http", "websocket"):
+            # Request.state reads and writes scope["state"]
+            state = scope.setdefault("state", {})
+            if scope["path"].startswith(TENANT_EXEMPT_PREFIXES):
+                state.update(subdomain=None, tenant_id=None)
+            else:
+                state.update(await resolve_tenant(get_host(scope)))
+        await self.app(scope, receive, send)
@@ -1,9 +1,10 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, ForeignKey, Text, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Boolean, Float, Date, DateTime, ForeignKey, Text, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
 import enum
 from app.database import Base
+from app.images import variant_urls
 
 class OrderStatus(str, enum.Enum):
     PENDING = "pending"
@@ -13,6 +14,11 @@ class OrderStatus(str, enum.Enum):
     DELIVERED = "delivered"
     CANCELLED = "cancelled"
 
+class OutboxStatus(str, enum.Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
 class User(Base):
     __tablename__ = "users"
     
@@ -51,9 +57,27 @@ class Store(Base):
     products = relationship("Product", back_populates="store", cascade="all, delete-orphan")
     orders = relationship("Order", back_populates="store", cascade="all, delete-orphan")
     shipping_classes = relationship("ShippingClass", back_populates="store", cascade="all, delete-orphan")
+    domains = relationship("StoreDomain", back_populates="store", cascade="all, delete-orphan")
+
+class StoreDomain(Base):
+    """Merchant's own domain serving a store, next to its subdomain"""
+    __tablename__ = "store_domains"
+    
+    id = Column(Integer, primary_key=True)
+    store_id = Column(Integer, ForeignKey("stores.id", ondelete="CASCADE"), nullable=False, index=True)
+    domain = Column(String(255), unique=True, nullable=False)  # lowercase, without www.
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    store = relationship("Store", back_populates="domains")
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # Keyset pagination: WHERE store_id = ? AND id > ? ORDER BY id
+        Index("ix_products_store_id_id", "store_id", "id"),
+        # Slugs are unique per store; also serves (store_id, slug) lookups
+        Index("ix_products_store_slug", "store_id", "slug", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     store_id = Column(Integer, ForeignKey("stores.id"), nullable=False, index=True)
@@ -65,7 +89,8 @@ class Product(Base):
     price = Column(Float, nullable=False)
     discount_price = Column(Float, nullable=True)
     stock = Column(Integer, default=0)
-    images = Column(Text, nullable=True)  # JSON array of image URLs
+    # Legacy JSON array of image URLs; moved into product_images at startup
+    images_json = Column("images", Text, nullable=True)
     is_published = Column(Boolean, default=False)
     meta_title = Column(String(255), nullable=True)
     meta_description = Column(Text, nullable=True)
@@ -74,6 +99,30 @@ class Product(Base):
     
     store = relationship("Store", back_populates="products")
     order_items = relationship("OrderItem", back_populates="product")
+    # Loaded with one IN query per batch of products, so listings never load per row
+    images = relationship(
+        "ProductImage", back_populates="product", order_by="ProductImage.position",
+        cascade="all, delete-orphan", lazy="selectin"
+    )
+
+class ProductImage(Base):
+    __tablename__ = "product_images"
+    __table_args__ = (
+        Index("ix_product_images_product_position", "product_id", "position"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False, default=0)
+    url = Column(String(500), nullable=False)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    
+    product = relationship("Product", back_populates="images")
+    
+    @property
+    def variants(self) -> dict:
+        return variant_urls(self.url)
 
 class ShippingClass(Base):
     __tablename__ = "shipping_classes"
@@ -91,6 +140,10 @@ class ShippingClass(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Keyset pagination: WHERE store_id = ? AND (created_at, id) < (?, ?)
+        Index("ix_orders_store_created_id", "store_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     store_id = Column(Integer, ForeignKey("stores.id"), nullable=False, index=True)
@@ -130,3 +183,80 @@ class OrderItem(Base):
     order = relationship("Order", back_populates="items")
     product = relationship("Product", back_populates="order_items")
 
+class StoreDailyStats(Base):
+    """Order totals per store, day and status, maintained by app.analytics"""
+    __tablename__ = "store_daily_stats"
+    __table_args__ = (
+        Index("ux_store_daily_stats", "store_id", "day", "status", unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    store_id = Column(Integer, ForeignKey("stores.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    status = Column(SQLEnum(OrderStatus), nullable=False)
+    orders = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+    units = Column(Integer, nullable=False, default=0)
+
+class ProductDailyStats(Base):
+    """Units and revenue per product, day and order status, maintained by app.analytics"""
+    __tablename__ = "product_daily_stats"
+    __table_args__ = (
+        Index("ux_product_daily_stats", "store_id", "day", "product_id", "status", unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    store_id = Column(Integer, ForeignKey("stores.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    # No foreign key, so deleting a product keeps its sales history
+    product_id = Column(Integer, nullable=False)
+    status = Column(SQLEnum(OrderStatus), nullable=False)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+
+class OutboxEvent(Base):
+    """Side effect (notification, tracking call) committed with the change that caused it"""
+    __tablename__ = "outbox_events"
+    __table_args__ = (
+        # Worker poll: WHERE status = 'pending' AND available_at <= now
+        Index("ix_outbox_events_status_available", "status", "available_at"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=False)  # JSON
+    status = Column(SQLEnum(OutboxStatus), nullable=False, default=OutboxStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime(timezone=True), nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+class IdempotencyKey(Base):
+    """Client Idempotency-Key of a create request and the response it produced"""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        Index("ux_idempotency_keys_store_key", "store_id", "key", unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    # No foreign key: keys are claimed before the store is loaded
+    store_id = Column(Integer, nullable=False)
+    key = Column(String(255), nullable=False)
+    fingerprint = Column(String(64), nullable=False)  # sha256 of the request body
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class WorkerLease(Base):
+    """One row per worker number of app.ids, leased by a running process"""
+    __tablename__ = "worker_leases"
+    
+    number = Column(Integer, primary_key=True, autoincrement=False)  # 0-1023
+    token = Column(String(32), nullable=True)  # random per lease; renewals must match it
+    hostname = Column(String(255), nullable=True)
+    pid = Column(Integer, nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    # Free once this has passed; NULL for numbers never leased or released
+    expires_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,124 @@
+import hashlib
+import re
+import smtplib
+from email.message import EmailMessage
+from typing import Optional
+import httpx
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared pooled client for outbound API calls, created on first use"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=settings.HTTP_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=settings.HTTP_MAX_CONNECTIONS),
+        )
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+def normalize_phone(phone: str) -> str:
+    """Digits with country code; local Bangladeshi numbers (01XXXXXXXXX) get 880"""
+    digits = re.sub(r"\D", "", phone)
+    if len(digits) == 11 and digits.startswith("01"):
+        digits = "88" + digits
+    return digits
+
+def sha256(value: str) -> str:
+    return hashlib.sha256(value.strip().lower().encode()).hexdigest()
+
+def order_events(store, order) -> list:
+    """(kind, payload) side effects of a new order, for the enabled integrations"""
+    message = (
+        f"{store.name}: your order {order.order_number} for "
+        f"{order.total:.2f} {store.currency} has been received."
+    )
+    events = []
+    if settings.WHATSAPP_API_URL:
+        events.append(("whatsapp", {"to": normalize_phone(order.customer_phone), "message": message}))
+    if settings.SMTP_HOST and order.customer_email:
+        events.append(("email", {
+            "to": order.customer_email,
+            "subject": f"Order {order.order_number} received",
+            "body": message,
+        }))
+    pixel_id = store.facebook_pixel_id or settings.FACEBOOK_PIXEL_ID
+    if pixel_id and settings.META_ACCESS_TOKEN:
+        user_data = {"ph": [sha256(normalize_phone(order.customer_phone))]}
+        if order.customer_email:
+            user_data["em"] = [sha256(order.customer_email)]
+        events.append(("meta_capi", {
+            "pixel_id": pixel_id,
+            "event": {
+                "event_name": "Purchase",
+                "event_time": int(order.created_at.timestamp()),
+                # Lets Meta deduplicate against the browser pixel's Purchase event
+                "event_id": order.order_number,
+                "action_source": "website",
+                "user_data": user_data,
+                "custom_data": {
+                    "currency": store.currency,
+                    "value": order.total,
+                    "order_id": order.order_number,
+                    "contents": [
+                        {"id": str(item.product_id), "quantity": item.quantity, "item_price": item.price}
+                        for item in order.items
+                    ],
+                },
+            },
+        }))
+    return events
+
+async def send_whatsapp(payload: dict):
+    response = await get_http_client().post(
+        settings.WHATSAPP_API_URL,
+        json=payload,
+        headers={"Authorization": f"Bearer {settings.WHATSAPP_API_KEY}"},
+    )
+    response.raise_for_status()
+
+def _send_email(payload: dict):
+    message = EmailMessage()
+    message["From"] = settings.EMAIL_FROM
+    message["To"] = payload["to"]
+    message["Subject"] = payload["subject"]
+    message.set_content(payload["body"])
+    with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.HTTP_TIMEOUT_SECONDS) as smtp:
+        if settings.SMTP_USER:
+            smtp.starttls()
+            smtp.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        smtp.send_message(message)
+
+async def send_email(payload: dict):
+    await run_in_threadpool(_send_email, payload)
+
+async def send_meta_capi(payloads: list):
+    """Send events of one pixel in a single /events call"""
+    response = await get_http_client().post(
+        f"{settings.META_GRAPH_API_URL}/{payloads[0]['pixel_id']}/events",
+        # Token in the body, not the URL, so it stays out of logged errors
+        json={"data": [payload["event"] for payload in payloads], "access_token": settings.META_ACCESS_TOKEN},
+    )
+    response.raise_for_status()
+
+# Outbox event kind -> sender; a sender raises to have the event retried
+SENDERS = {
+    "whatsapp": send_whatsapp,
+    "email": send_email,
+}
+
+# Outbox event kind -> (batch key of a payload, sender of the payloads of
+# one key); claimed events sharing a key are sent in one call
+BATCH_SENDERS = {
+    "meta_capi": (lambda payload: payload["pixel_id"], send_meta_capi),
+}
+# Events per Conversions API request allowed by Meta
+MAX_BATCH_EVENTS = 1000
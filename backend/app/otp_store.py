@@ -0,0 +1,118 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+from app.config import settings
+
+class OTPStore(ABC):
+    """Interface for OTP storage shared by all workers"""
+
+    @abstractmethod
+    async def save(self, phone: str, otp: str, ttl: int):
+        """Store otp for phone, replacing any previous code"""
+
+    @abstractmethod
+    async def consume(self, phone: str, otp: str) -> bool:
+        """Delete and return True if otp matches the stored, unexpired code"""
+
+    @abstractmethod
+    async def hit_rate_limit(self, phone: str, limit: int, window: int) -> bool:
+        """Count an OTP request and return True if phone is over limit for window"""
+
+class MemoryOTPStore(OTPStore):
+    """Per-process store; a daemon thread sweeps expired entries"""
+
+    def __init__(self, sweep_interval: float = 60.0):
+        self._codes: Dict[str, Tuple[str, float]] = {}
+        self._requests: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+        self._sweeper = threading.Thread(
+            target=self._sweep_forever, args=(sweep_interval,), daemon=True
+        )
+        self._sweeper.start()
+
+    async def save(self, phone: str, otp: str, ttl: int):
+        with self._lock:
+            self._codes[phone] = (otp, time.monotonic() + ttl)
+
+    async def consume(self, phone: str, otp: str) -> bool:
+        with self._lock:
+            stored = self._codes.get(phone)
+            if stored is None:
+                return False
+            code, expires_at = stored
+            if expires_at <= time.monotonic():
+                del self._codes[phone]
+                return False
+            if code != otp:
+                return False
+            del self._codes[phone]
+            return True
+
+    async def hit_rate_limit(self, phone: str, limit: int, window: int) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            count, resets_at = self._requests.get(phone, (0, now + window))
+            if resets_at <= now:
+                count, resets_at = 0, now + window
+            count += 1
+            self._requests[phone] = (count, resets_at)
+            return count > limit
+
+    def sweep(self):
+        """Remove expired codes and rate limit windows"""
+        now = time.monotonic()
+        with self._lock:
+            for phone in [p for p, (_, exp) in self._codes.items() if exp <= now]:
+                del self._codes[phone]
+            for phone in [p for p, (_, exp) in self._requests.items() if exp <= now]:
+                del self._requests[phone]
+
+    def _sweep_forever(self, interval: float):
+        while True:
+            time.sleep(interval)
+            self.sweep()
+
+# Delete the key only when the code matches, so a wrong guess does not burn it
+_CONSUME_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+return 0
+"""
+
+class RedisOTPStore(OTPStore):
+    """Store shared across workers; expiry uses native Redis key TTLs"""
+
+    def __init__(self, client, prefix: str = "otp"):
+        self.client = client
+        self.prefix = prefix
+        self._consume = client.register_script(_CONSUME_SCRIPT)
+
+    async def save(self, phone: str, otp: str, ttl: int):
+        await self.client.set(f"{self.prefix}:code:{phone}", otp, ex=ttl)
+
+    async def consume(self, phone: str, otp: str) -> bool:
+        return bool(await self._consume(keys=[f"{self.prefix}:code:{phone}"], args=[otp]))
+
+    async def hit_rate_limit(self, phone: str, limit: int, window: int) -> bool:
+        key = f"{self.prefix}:rate:{phone}"
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.incr(key)
+            pipe.expire(key, window, nx=True)
+            count, _ = await pipe.execute()
+        return count > limit
+
+_otp_store: Optional[OTPStore] = None
+
+def get_otp_store() -> OTPStore:
+    """Return the configured OTP store, created on first use"""
+    global _otp_store
+    if _otp_store is None:
+        if settings.OTP_BACKEND == "redis":
+            from app.redis_client import get_redis
+            _otp_store = RedisOTPStore(get_redis())
+        else:
+            _otp_store = MemoryOTPStore()
+    return _otp_store
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import select
+from app.config import settings
+from app.database import db_session
+from app.models import OutboxEvent, OutboxStatus
+from app.notifications import BATCH_SENDERS, MAX_BATCH_EVENTS, SENDERS
+
+logger = logging.getLogger(__name__)
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+def enqueue(db, events: list):
+    """Add (kind, payload) events to the session; they are sent once it commits"""
+    now = utcnow()
+    db.add_all([
+        OutboxEvent(kind=kind, payload=json.dumps(payload), available_at=now)
+        for kind, payload in events
+    ])
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff after the given number of failed attempts"""
+    seconds = settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, settings.OUTBOX_RETRY_MAX_SECONDS))
+
+class OutboxWorker:
+    """Asyncio task that drains outbox_events in batches.
+
+    Events are claimed with SKIP LOCKED and leased for OUTBOX_LEASE_SECONDS,
+    so several app workers can poll the same table without sending twice,
+    and events claimed by a worker that died are picked up again.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(settings.OUTBOX_CONCURRENCY)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        """Skip the poll wait, e.g. right after an order commits"""
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                claimed = await self.process_batch()
+            except Exception:
+                logger.exception("Outbox batch failed")
+                claimed = 0
+            if claimed < settings.OUTBOX_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), settings.OUTBOX_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+    async def process_batch(self) -> int:
+        """Claim, send and record one batch of due events; return how many were claimed"""
+        now = utcnow()
+        async with db_session() as db:
+            events = (await db.scalars(
+                select(OutboxEvent)
+                .where(OutboxEvent.status == OutboxStatus.PENDING, OutboxEvent.available_at <= now)
+                .order_by(OutboxEvent.available_at, OutboxEvent.id)
+                .limit(settings.OUTBOX_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )).all()
+            if not events:
+                return 0
+            for event in events:
+                event.attempts += 1
+                event.available_at = now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+            await db.commit()
+
+            errors = await self._send_all(events)
+
+            now = utcnow()
+            for event, error in zip(events, errors):
+                if error is None:
+                    event.status = OutboxStatus.SENT
+                    event.processed_at = now
+                    event.last_error = None
+                elif event.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                    event.status = OutboxStatus.FAILED
+                    event.processed_at = now
+                    event.last_error = error
+                    logger.error("Outbox event %s (%s) failed permanently: %s", event.id, event.kind, error)
+                else:
+                    event.available_at = now + retry_delay(event.attempts)
+                    event.last_error = error
+            await db.commit()
+        return len(events)
+
+    async def _send_all(self, events: list) -> list:
+        """Send claimed events; return an error message or None for each.
+
+        Batchable kinds go out in one call per batch key, and the call's
+        outcome applies to every event in it.
+        """
+        errors = {}
+        singles = []
+        batches = {}
+        for event in events:
+            batch_sender = BATCH_SENDERS.get(event.kind)
+            if batch_sender is None:
+                singles.append(event)
+                continue
+            try:
+                payload = json.loads(event.payload)
+                key = batch_sender[0](payload)
+            except (ValueError, KeyError, TypeError) as e:
+                errors[event.id] = f"Invalid payload: {e!r}"[:1000]
+                continue
+            batch = batches.setdefault((event.kind, key), [[]])
+            if len(batch[-1]) >= MAX_BATCH_EVENTS:
+                batch.append([])
+            batch[-1].append((event, payload))
+
+        async def send_single(event: OutboxEvent):
+            errors[event.id] = await self._send(event)
+
+        async def send_batch(kind: str, batch: list):
+            error = await self._call(
+                BATCH_SENDERS[kind][1], [payload for _, payload in batch],
+                f"{len(batch)} {kind} events ({', '.join(str(event.id) for event, _ in batch)})"
+            )
+            for event, _ in batch:
+                errors[event.id] = error
+
+        await asyncio.gather(
+            *(send_single(event) for event in singles),
+            *(send_batch(kind, batch) for (kind, _), chunks in batches.items() for batch in chunks),
+        )
+        return [errors[event.id] for event in events]
+
+    async def _send(self, event: OutboxEvent) -> Optional[str]:
+        """Send one event; return an error message or None"""
+        sender = SENDERS.get(event.kind)
+        if sender is None:
+            return f"Unknown event kind {event.kind}"
+        try:
+            payload = json.loads(event.payload)
+        except ValueError as e:
+            return f"Invalid payload: {e!r}"[:1000]
+        return await self._call(sender, payload, f"Outbox event {event.id} ({event.kind}) attempt {event.attempts}")
+
+    async def _call(self, sender, payload, description: str) -> Optional[str]:
+        async with self._semaphore:
+            try:
+                await sender(payload)
+            except Exception as e:
+                logger.warning("%s failed: %r", description, e)
+                return repr(e)[:1000]
+        return None
+
+outbox_worker = OutboxWorker()
@@ -0,0 +1,60 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException, status
+from app.config import settings
+
+def clamp_limit(limit: Optional[int]) -> int:
+    """Apply the server-side page size default and cap"""
+    if not limit or limit < 1:
+        return settings.PAGE_SIZE_DEFAULT
+    return min(limit, settings.PAGE_SIZE_MAX)
+
+def encode_cursor(*values) -> str:
+    """Encode keyset values as an opaque URL-safe cursor"""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError(cursor)
+        return values
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def decode_order_cursor(cursor: str) -> tuple:
+    """Decode a (created_at, id) order cursor"""
+    created_at, order_id = decode_cursor(cursor, 2)
+    try:
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def decode_product_cursor(cursor: str) -> int:
+    """Decode an (id) product cursor"""
+    product_id, = decode_cursor(cursor, 1)
+    try:
+        return int(product_id)
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def split_page(rows: list, limit: int, cursor_of) -> tuple:
+    """Split a limit + 1 fetch into (page, next_cursor)"""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, cursor_of(page[-1])
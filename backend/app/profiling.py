@@ -0,0 +1,136 @@
+"""Opt-in per-request profiling.
+
+A request is profiled when it sends X-Profile with PROFILING_TOKEN, or is
+picked by PROFILING_SAMPLE_RATE. Its cProfile call tree and SQL statements
+are kept in a ring buffer that superusers browse under /api/admin/profiles.
+With PROFILING_ENABLED off, neither the middleware nor the SQL listeners
+are installed.
+"""
+import cProfile
+import io
+import itertools
+import pstats
+import random
+import secrets
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import event
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.config import settings
+from app.database import engine, async_engine
+
+PROFILE_HEADER = b"x-profile"
+# Statements longer than this are cut in stored profiles
+MAX_STATEMENT_LENGTH = 2000
+
+# (statement, seconds) of the request being profiled, None otherwise
+profile_sql: ContextVar[Optional[list]] = ContextVar("profile_sql", default=None)
+
+profiles = deque(maxlen=settings.PROFILING_BUFFER_SIZE)
+_profile_ids = itertools.count(1)
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if profile_sql.get() is not None:
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    statements = profile_sql.get()
+    started = conn.info.get("profile_started")
+    if statements is not None and started:
+        statements.append((statement[:MAX_STATEMENT_LENGTH], time.perf_counter() - started.pop()))
+
+def instrument_engines():
+    """Record SQL statements of profiled requests"""
+    engines = [engine] if async_engine is None else [engine, async_engine.sync_engine]
+    for target in engines:
+        if not event.contains(target, "before_cursor_execute", before_cursor_execute):
+            event.listen(target, "before_cursor_execute", before_cursor_execute)
+            event.listen(target, "after_cursor_execute", after_cursor_execute)
+
+def profile_trigger(scope: Scope) -> Optional[str]:
+    """Why this request should be profiled, or None"""
+    if settings.PROFILING_TOKEN:
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                if secrets.compare_digest(value, settings.PROFILING_TOKEN.encode()):
+                    return "header"
+                break
+    if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+        return "sample"
+    return None
+
+def call_tree(profiler: cProfile.Profile) -> str:
+    """Top functions by cumulative time, with the functions each one called"""
+    buffer = io.StringIO()
+    stats = pstats.Stats(profiler, stream=buffer)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE)
+    stats.print_stats(settings.PROFILING_TOP_FUNCTIONS)
+    stats.print_callees(settings.PROFILING_TOP_FUNCTIONS)
+    return buffer.getvalue()
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware that profiles selected HTTP requests.
+
+    cProfile hooks the event loop thread, so other requests running on the
+    loop meanwhile show up in the call tree; only one request is profiled
+    at a time. SQL statements are attributed to the request exactly.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.busy = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or self.busy or scope["path"].startswith("/api/admin/profiles"):
+            await self.app(scope, receive, send)
+            return
+        trigger = profile_trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = next(_profile_ids)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []), (b"x-profile-id", str(profile_id).encode())
+                ]
+            await send(message)
+
+        self.busy = True
+        statements = []
+        token = profile_sql.set(statements)
+        profiler = cProfile.Profile()
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - started
+            profile_sql.reset(token)
+            self.busy = False
+            route = scope.get("route")
+            profiles.append({
+                "id": profile_id,
+                "trigger": trigger,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route.path if route is not None else None,
+                "status": status_code,
+                "tenant_id": scope.get("state", {}).get("tenant_id"),
+                "started_at": started_at,
+                "duration": duration,
+                "sql_count": len(statements),
+                "sql_time": sum(seconds for _, seconds in statements),
+                "sql": [{"statement": statement, "seconds": seconds} for statement, seconds in statements],
+                "call_tree": call_tree(profiler),
+            })
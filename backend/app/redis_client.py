@@ -0,0 +1,11 @@
+from app.config import settings
+
+_client = None
+
+def get_redis():
+    """Return the shared asyncio Redis client, created on first use"""
+    global _client
+    if _client is None:
+        from redis import asyncio as aioredis
+        _client = aioredis.from_url(settings.REDIS_URL, decode_responses=False)
+    return _client
@@ -0,0 +1,136 @@
+import functools
+import logging
+from typing import Dict, Optional
+from urllib.parse import urlencode
+from fastapi import Request
+from pydantic import TypeAdapter
+from redis.exceptions import RedisError
+from fastapi.responses import Response
+from app.cache import TTLCache
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """Per-tenant cache of serialized JSON response bodies.
+
+    Keys embed a per-tenant version; invalidating a tenant bumps its version
+    so every older entry becomes unreachable and ages out. With a Redis
+    client, bodies and versions are shared by all workers and the local LRU
+    acts as a first tier. Versions read from Redis are kept for version_ttl
+    seconds, so a local hit costs no round trip and other workers' updates
+    show up within that delay. Redis errors degrade to cache misses.
+    """
+
+    def __init__(self, maxsize: int, ttl: int, redis=None, prefix: str = "resp", version_ttl: float = 1.0):
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.redis = redis
+        self.prefix = prefix
+        self._versions: Dict[int, int] = {}
+        self._redis_versions = TTLCache(maxsize=maxsize, ttl=version_ttl)
+        self.stats = {"hits": 0, "redis_hits": 0, "misses": 0, "errors": 0}
+
+    async def _version(self, tenant_id: int) -> int:
+        if self.redis is None:
+            return self._versions.get(tenant_id, 0)
+        version = self._redis_versions.get(tenant_id)
+        if version is None:
+            version = int(await self.redis.get(f"{self.prefix}:ver:{tenant_id}") or 0)
+            self._redis_versions.set(tenant_id, version)
+        return version
+
+    async def _key(self, request: Request) -> str:
+        tenant_id = getattr(request.state, "tenant_id", None) or 0
+        version = await self._version(tenant_id)
+        query = urlencode(sorted(request.query_params.multi_items()))
+        return f"{self.prefix}:{tenant_id}:{version}:{request.url.path}?{query}"
+
+    @staticmethod
+    def _response(body: bytes, hit: str) -> Response:
+        return Response(content=body, media_type="application/json", headers={"X-Cache": hit})
+
+    def _redis_failed(self, action: str):
+        self.stats["errors"] += 1
+        logger.warning("Response cache %s failed; serving uncached", action, exc_info=True)
+
+    async def get(self, request: Request) -> Optional[Response]:
+        """Return the cached response for request, if any"""
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return None
+        try:
+            key = await self._key(request)
+            body = self.local.get(key)
+            if body is not None:
+                self.stats["hits"] += 1
+                return self._response(body, "HIT")
+            if self.redis is not None:
+                body = await self.redis.get(key)
+                if body is not None:
+                    self.stats["redis_hits"] += 1
+                    self.local.set(key, body)
+                    return self._response(body, "HIT")
+        except RedisError:
+            self._redis_failed("lookup")
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, request: Request, body: bytes) -> Response:
+        """Cache body for request and return it as a response"""
+        if settings.RESPONSE_CACHE_ENABLED:
+            try:
+                key = await self._key(request)
+                self.local.set(key, body)
+                if self.redis is not None:
+                    await self.redis.set(key, body, ex=self.ttl)
+            except RedisError:
+                self._redis_failed("store")
+        return self._response(body, "MISS")
+
+    async def invalidate(self, tenant_id: int):
+        """Drop every cached response for tenant_id"""
+        # Tenant 0 holds responses for requests without a subdomain, which
+        # fall back to the first active store
+        for tenant in (tenant_id, 0):
+            if self.redis is not None:
+                try:
+                    version = await self.redis.incr(f"{self.prefix}:ver:{tenant}")
+                except RedisError:
+                    # Entries still expire after ttl; the write itself succeeded
+                    self._redis_failed("invalidation")
+                    continue
+                self._redis_versions.set(tenant, version)
+            else:
+                self._versions[tenant] = self._versions.get(tenant, 0) + 1
+
+def _create_response_cache() -> ResponseCache:
+    redis = None
+    if settings.RESPONSE_CACHE_REDIS:
+        from app.redis_client import get_redis
+        redis = get_redis()
+    return ResponseCache(
+        settings.RESPONSE_CACHE_SIZE, settings.RESPONSE_CACHE_TTL, redis,
+        version_ttl=settings.RESPONSE_CACHE_VERSION_TTL
+    )
+
+response_cache = _create_response_cache()
+
+def cached_response(model):
+    """Cache an endpoint's JSON body, serialized through model.
+
+    The endpoint must take a `request` argument. Errors are not cached.
+    """
+    adapter = TypeAdapter(model)
+
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            request = kwargs["request"]
+            cached = await response_cache.get(request)
+            if cached is not None:
+                return cached
+            result = await endpoint(*args, **kwargs)
+            body = adapter.dump_json(adapter.validate_python(result, from_attributes=True))
+            return await response_cache.set(request, body)
+        return wrapper
+    return decorator
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from app.schemas import ProfileSummary, ProfileResponse
+from app.auth import get_admin_user, CurrentUser
+from app.profiling import profiles
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+@router.get("/profiles", response_model=list[ProfileSummary])
+async def list_profiles(
+    route: str = Query(None),
+    min_duration: float = Query(0, ge=0),
+    current_user: CurrentUser = Depends(get_admin_user)
+):
+    """Recent request profiles, newest first (see PROFILING_* settings)"""
+    return [
+        profile for profile in reversed(profiles)
+        if profile["duration"] >= min_duration and (route is None or profile["route"] == route)
+    ]
+
+@router.get("/profiles/{profile_id}", response_model=ProfileResponse)
+async def get_profile(
+    profile_id: int,
+    current_user: CurrentUser = Depends(get_admin_user)
+):
+    """One profile with its call tree and SQL statements"""
+    for profile in profiles:
+        if profile["id"] == profile_id:
+            return profile
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Profile not found"
+    )
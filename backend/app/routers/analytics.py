@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db
+from app.models import Store
+from app.schemas import AnalyticsSummary
+from app.auth import get_token_user, CurrentUser
+from app.analytics import summarize, today
+from datetime import date, timedelta
+from typing import Optional
+
+router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+
+@router.get("/orders", response_model=AnalyticsSummary)
+async def get_order_analytics(
+    request: Request,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    top: int = Query(10, ge=1, le=100),
+    current_user: CurrentUser = Depends(get_token_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Revenue, order count, AOV and top products per day (owner only).
+
+    Dates are inclusive and default to the last 30 days.
+    """
+    if not hasattr(request.state, 'tenant_id') or not request.state.tenant_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Store context required"
+        )
+    
+    store_id = await db.scalar(select(Store.id).where(
+        Store.id == request.state.tenant_id,
+        Store.owner_id == current_user.id
+    ))
+    if not store_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Store not found"
+        )
+    
+    date_to = date_to or today()
+    date_from = date_from or date_to - timedelta(days=29)
+    if date_from > date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="date_from must not be after date_to"
+        )
+    
+    return await summarize(db, store_id, date_from, date_to, top)
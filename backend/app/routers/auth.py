@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
 from app.models import User
 from app.schemas import OTPRequest, OTPVerify, Token, Login, UserResponse
 from app.auth import (
-    generate_otp, store_otp, verify_otp,
-    create_access_token, verify_password, get_password_hash,
-    get_current_user
+    generate_otp, store_otp, verify_otp, otp_rate_limited,
+    create_user_token, verify_password, get_password_hash,
+    get_current_user, CurrentUser
 )
 from datetime import timedelta
 from app.config import settings
@@ -14,10 +15,16 @@ from app.config import settings
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 @router.post("/otp/request")
-async def request_otp(request: OTPRequest, db: Session = Depends(get_db)):
+async def request_otp(request: OTPRequest, db: AsyncSession = Depends(get_db)):
     """Request OTP for phone number"""
+    if await otp_rate_limited(request.phone):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many OTP requests. Please try again later."
+        )
+    
     otp = generate_otp()
-    store_otp(request.phone, otp)
+    await store_otp(request.phone, otp)
     
     # In production, send OTP via SMS service
     # For now, return it (remove in production!)
@@ -27,27 +34,25 @@ async def request_otp(request: OTPRequest, db: Session = Depends(get_db)):
     }
 
 @router.post("/otp/verify")
-async def verify_otp_endpoint(request: OTPVerify, db: Session = Depends(get_db)):
+async def verify_otp_endpoint(request: OTPVerify, db: AsyncSession = Depends(get_db)):
     """Verify OTP and login/register"""
-    if not verify_otp(request.phone, request.otp):
+    if not await verify_otp(request.phone, request.otp):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid or expired OTP"
         )
     
     # Get or create user
-    user = db.query(User).filter(User.phone == request.phone).first()
+    user = await db.scalar(select(User).where(User.phone == request.phone))
     if not user:
         user = User(phone=request.phone, is_active=True)
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
     
     # Create access token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.id}, expires_delta=access_token_expires
-    )
+    access_token = create_user_token(user, expires_delta=access_token_expires)
     
     return Token(
         access_token=access_token,
@@ -56,9 +61,9 @@ async def verify_otp_endpoint(request: OTPVerify, db: Session = Depends(get_db))
     )
     
 @router.post("/login", response_model=Token)
-async def login(login_data: Login, db: Session = Depends(get_db)):
+async def login(login_data: Login, db: AsyncSession = Depends(get_db)):
     """Login with phone/password or OTP"""
-    user = db.query(User).filter(User.phone == login_data.phone).first()
+    user = await db.scalar(select(User).where(User.phone == login_data.phone))
     
     if not user:
         raise HTTPException(
@@ -68,7 +73,7 @@ async def login(login_data: Login, db: Session = Depends(get_db)):
     
     # OTP login
     if login_data.otp:
-        if not verify_otp(login_data.phone, login_data.otp):
+        if not await verify_otp(login_data.phone, login_data.otp):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid OTP"
@@ -85,9 +90,7 @@ async def login(login_data: Login, db: Session = Depends(get_db)):
         )
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.id}, expires_delta=access_token_expires
-    )
+    access_token = create_user_token(user, expires_delta=access_token_expires)
     
     return Token(
         access_token=access_token,
@@ -96,7 +99,7 @@ async def login(login_data: Login, db: Session = Depends(get_db)):
     )
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(current_user: CurrentUser = Depends(get_current_user)):
     """Get current user info"""
     return current_user
 
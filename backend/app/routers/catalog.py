@@ -0,0 +1,274 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query, UploadFile, File
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app.database import get_db, db_session, stream_partitions
+from app.models import Product, ProductImage, Store
+from app.schemas import ProductCreate
+from app.auth import get_current_user, CurrentUser
+from app.cache import TTLCache
+from app.config import settings
+from app.response_cache import response_cache
+from app.routers.products import allocate_slugs, describe_images, is_slug_conflict, SLUG_ATTEMPTS
+from itertools import islice
+from pathlib import Path
+from typing import Optional
+import csv
+import io
+import json
+import uuid
+
+# Registered before the products router so /import and /export are not
+# captured by /api/products/{product_id}
+router = APIRouter(prefix="/api/products", tags=["products"])
+
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+MEDIA_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+EXPORT_FIELDS = ["id", "slug", *ProductCreate.model_fields]
+# Exported straight from products columns; images come from product_images
+COLUMN_FIELDS = [field for field in EXPORT_FIELDS if field != "images"]
+
+# job_id -> (owner_id, report)
+import_jobs = TTLCache(maxsize=1024, ttl=settings.IMPORT_JOB_TTL)
+
+async def get_owned_store_id(request: Request, current_user: CurrentUser, db: AsyncSession) -> int:
+    """Store from the subdomain if the user owns it, else the user's first store"""
+    query = select(Store.id).where(Store.owner_id == current_user.id)
+    if getattr(request.state, 'tenant_id', None):
+        query = query.where(Store.id == request.state.tenant_id)
+    store_id = await db.scalar(query.limit(1))
+    if not store_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No store found. Please create a store first."
+        )
+    return store_id
+
+def resolve_format(format: Optional[str], filename: Optional[str]) -> str:
+    if format:
+        return format
+    fmt = FORMATS.get(Path(filename or "").suffix.lower())
+    if not fmt:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unknown file format. Use .csv or .jsonl, or pass format."
+        )
+    return fmt
+
+def iter_rows(binary, fmt: str):
+    """Yield (row_number, data) from an uploaded file; data is a dict or an error message"""
+    text = io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            # Empty cells mean "not set" so optional fields keep their defaults
+            yield number, {k: v for k, v in row.items() if k and v not in ("", None)}
+        return
+
+    number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield number, "Invalid JSON"
+            continue
+        if not isinstance(data, dict):
+            yield number, "Expected a JSON object"
+            continue
+        yield number, data
+
+def validate_row(data) -> tuple:
+    """Return (ProductCreate, None) or (None, errors) for one row"""
+    if isinstance(data, str):
+        return None, [{"field": None, "message": data}]
+    try:
+        return ProductCreate(**data), None
+    except ValidationError as e:
+        return None, [
+            {"field": ".".join(str(part) for part in error["loc"]), "message": error["msg"]}
+            for error in e.errors()
+        ]
+
+async def insert_batch(db: AsyncSession, store_id: int, products: list) -> bool:
+    """Insert one batch in its own transaction; False if no unique slugs could be found"""
+    image_rows = await run_in_threadpool(
+        lambda: [describe_images(product.images or []) for product in products]
+    )
+    for attempt in range(SLUG_ATTEMPTS):
+        slugs = await allocate_slugs(db, store_id, [product.title for product in products])
+        values = [
+            {**product.dict(exclude={"images"}), "store_id": store_id, "slug": slug}
+            for product, slug in zip(products, slugs)
+        ]
+        try:
+            product_ids = (await db.scalars(
+                insert(Product).returning(Product.id, sort_by_parameter_order=True), values
+            )).all()
+            images = [
+                {**row, "product_id": product_id}
+                for product_id, rows in zip(product_ids, image_rows)
+                for row in rows
+            ]
+            if images:
+                await db.execute(insert(ProductImage), images)
+            await db.commit()
+            return True
+        except IntegrityError as e:
+            await db.rollback()
+            if not is_slug_conflict(e):
+                raise
+            # A concurrent create took one of the slugs; allocate again
+    return False
+
+@router.post("/import")
+async def import_products(
+    request: Request,
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|jsonl)$"),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Bulk create products from a CSV or JSONL file.
+
+    The file is read and inserted in batches of IMPORT_BATCH_SIZE rows, each
+    committed on its own, so memory stays bounded. Invalid rows are skipped
+    and listed in the returned report, which stays available by job id.
+    """
+    store_id = await get_owned_store_id(request, current_user, db)
+    fmt = resolve_format(format, file.filename)
+
+    report = {
+        "job_id": uuid.uuid4().hex,
+        "status": "completed",
+        "total": 0,
+        "created": 0,
+        "failed": 0,
+        "errors": [],
+        "errors_truncated": False,
+    }
+
+    def add_error(number: int, errors: list):
+        report["failed"] += 1
+        if len(report["errors"]) < settings.IMPORT_MAX_ERRORS:
+            report["errors"].append({"row": number, "errors": errors})
+        else:
+            report["errors_truncated"] = True
+
+    rows = iter_rows(file.file, fmt)
+    try:
+        # Parsing reads the spooled upload, so keep it off the event loop
+        while batch := await run_in_threadpool(list, islice(rows, settings.IMPORT_BATCH_SIZE)):
+            report["total"] += len(batch)
+            numbers, products = [], []
+            for number, data in batch:
+                product, errors = validate_row(data)
+                if errors:
+                    add_error(number, errors)
+                else:
+                    numbers.append(number)
+                    products.append(product)
+            if not products:
+                continue
+            if await insert_batch(db, store_id, products):
+                report["created"] += len(products)
+            else:
+                for number in numbers:
+                    add_error(number, [{"field": "slug", "message": "Could not allocate a unique slug"}])
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File must be UTF-8 encoded"
+        )
+    except csv.Error as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid CSV: {e}"
+        )
+    finally:
+        if report["created"]:
+            await response_cache.invalidate(store_id)
+
+    import_jobs.set(report["job_id"], (current_user.id, report))
+    return report
+
+@router.get("/import/{job_id}")
+async def get_import_job(
+    job_id: str,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Get the report of a recent import"""
+    job = import_jobs.get(job_id)
+    if not job or job[0] != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Import job not found"
+        )
+    return job[1]
+
+async def load_image_urls(db, product_ids: list) -> dict:
+    """product_id -> image URLs in display order, for one export partition"""
+    urls = {}
+    rows = await db.execute(
+        select(ProductImage.product_id, ProductImage.url)
+        .where(ProductImage.product_id.in_(product_ids))
+        .order_by(ProductImage.product_id, ProductImage.position)
+    )
+    for product_id, url in rows:
+        urls.setdefault(product_id, []).append(url)
+    return urls
+
+def export_rows(partition, urls: dict, fmt: str) -> list:
+    """Rows in EXPORT_FIELDS order; CSV gets images as a JSON array cell"""
+    rows = []
+    for row in partition:
+        values = row._mapping
+        images = urls.get(values["id"], [])
+        if fmt == "csv":
+            images = json.dumps(images, ensure_ascii=False) if images else None
+        rows.append([images if field == "images" else values[field] for field in EXPORT_FIELDS])
+    return rows
+
+def format_rows(rows, fmt: str) -> str:
+    if fmt == "jsonl":
+        return "".join(
+            json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + "\n" for row in rows
+        )
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+@router.get("/export")
+async def export_products(
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|jsonl)$"),
+    published_only: bool = False,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Stream the store's products as CSV or JSONL (re-importable via /import)"""
+    store_id = await get_owned_store_id(request, current_user, db)
+    query = select(*(getattr(Product, field) for field in COLUMN_FIELDS)).where(
+        Product.store_id == store_id
+    ).order_by(Product.id)
+    if published_only:
+        query = query.where(Product.is_published == True)
+
+    async def generate():
+        if format == "csv":
+            yield format_rows([EXPORT_FIELDS], format)
+        # The request session may be closed while streaming, so use our own
+        async with db_session() as image_db:
+            async for partition in stream_partitions(query, settings.EXPORT_BATCH_SIZE):
+                urls = await load_image_urls(image_db, [row.id for row in partition])
+                yield format_rows(export_rows(partition, urls, format), format)
+
+    return StreamingResponse(
+        generate(),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="products-{store_id}.{format}"'}
+    )
@@ -1,60 +1,116 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import Order, OrderItem, Product, Store, User, ShippingClass, OrderStatus
-from app.schemas import OrderCreate, OrderResponse, OrderUpdate, OrderItemResponse
-from app.auth import get_current_user
-import secrets
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query, Header
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, update, case, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, noload
+from app.database import get_db, stream_partitions
+from app.models import Order, OrderItem, Product, Store, ShippingClass, OrderStatus
+from app.schemas import OrderCreate, OrderResponse, OrderUpdate, OrderItemResponse, OrderPage
+from app.auth import get_current_user, get_token_user, CurrentUser
+from app.analytics import record_order_change
+from app.idempotency import claim_key, fingerprint, save_response
+from app.ids import order_ids, WorkerNumberUnavailable
+from app.notifications import order_events
+from app.outbox import enqueue, outbox_worker
+from app.pagination import clamp_limit, encode_cursor, decode_order_cursor, split_page
+from app.config import settings
+from typing import Optional
+import csv
+import io
+import json
+from datetime import datetime, timezone
 
 router = APIRouter(prefix="/api/orders", tags=["orders"])
 
 def generate_order_number() -> str:
-    """Generate unique order number"""
-    return f"ORD{secrets.token_hex(4).upper()}{int(datetime.utcnow().timestamp())}"
+    """Generate unique, time-ordered order number, e.g. ORD0A8NHCEF40400"""
+    return f"ORD{order_ids.next_id()}"
+
+def select_orders():
+    """Order query with items fetched in one batched IN query"""
+    return select(Order).options(selectinload(Order.items))
+
+async def reserve_stock(db: AsyncSession, quantities: dict) -> bool:
+    """Atomically decrement stock for {product_id: quantity}.
+    
+    A single conditional UPDATE; it only succeeds if every product still has
+    enough stock, so concurrent checkouts cannot oversell.
+    """
+    needed = case(quantities, value=Product.id)
+    result = await db.execute(
+        update(Product)
+        .where(Product.id.in_(sorted(quantities)), Product.stock >= needed)
+        .values(stock=Product.stock - needed)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == len(quantities)
 
 @router.post("", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
 async def create_order(
     order_data: OrderCreate,
     request: Request,
-    db: Session = Depends(get_db)
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Create a new order (public endpoint)"""
+    """Create a new order (public endpoint).
+    
+    With an Idempotency-Key header, retries of the same request return the
+    original response instead of creating another order.
+    """
     if not hasattr(request.state, 'tenant_id') or not request.state.tenant_id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Store context required"
         )
     
-    store = db.query(Store).filter(Store.id == request.state.tenant_id).first()
+    idempotency_row = None
+    if idempotency_key:
+        idempotency_row, replay = await claim_key(
+            db, request.state.tenant_id, idempotency_key, fingerprint(order_data)
+        )
+        if replay is not None:
+            return replay
+    
+    store = await db.scalar(select(Store).where(Store.id == request.state.tenant_id))
     if not store:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Store not found"
         )
     
-    # Calculate totals
-    subtotal = 0.0
-    items_data = []
-    
+    # Load all line item products in one query
+    quantities = {}
     for item_data in order_data.items:
-        product = db.query(Product).filter(
-            Product.id == item_data.product_id,
+        quantities[item_data.product_id] = quantities.get(item_data.product_id, 0) + item_data.quantity
+    
+    products = {}
+    if quantities:
+        products = {p.id: p for p in (await db.scalars(select(Product).where(
+            Product.id.in_(quantities),
             Product.store_id == store.id,
             Product.is_published == True
-        ).first()
-        
+        ).options(noload(Product.images)))).all()}
+    
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Product {item_data.product_id} not found"
+                detail=f"Product {product_id} not found"
             )
         
-        if product.stock < item_data.quantity:
+        if product.stock < quantity:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Insufficient stock for {product.title}"
             )
+    
+    # Calculate totals
+    subtotal = 0.0
+    items_data = []
+    
+    for item_data in order_data.items:
+        product = products[item_data.product_id]
         
         price = product.discount_price or product.price
         item_total = price * item_data.quantity
@@ -71,20 +127,38 @@ async def create_order(
     shipping_cost = 0.0
     shipping_class = None
     if order_data.shipping_class_id:
-        shipping_class = db.query(ShippingClass).filter(
+        shipping_class = await db.scalar(select(ShippingClass).where(
             ShippingClass.id == order_data.shipping_class_id,
             ShippingClass.store_id == store.id,
             ShippingClass.is_active == True
-        ).first()
+        ))
         if shipping_class:
             shipping_cost = shipping_class.cost
     
     total = subtotal + shipping_cost
     
+    try:
+        order_number = generate_order_number()
+    except WorkerNumberUnavailable:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Orders are briefly unavailable, please try again",
+            headers={"Retry-After": "1"}
+        )
+    
+    # Reserve stock; fails if a concurrent order took it since the check above
+    if quantities and not await reserve_stock(db, quantities):
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Insufficient stock"
+        )
+    
     # Create order
     order = Order(
         store_id=store.id,
-        order_number=generate_order_number(),
+        order_number=order_number,
         customer_name=order_data.customer_name,
         customer_phone=order_data.customer_phone,
         customer_email=order_data.customer_email,
@@ -96,76 +170,190 @@ async def create_order(
         shipping_cost=shipping_cost,
         total=total,
         notes=order_data.notes,
-        status=OrderStatus.PENDING
+        status=OrderStatus.PENDING,
+        # Set here rather than by the database so the rollup day is known
+        created_at=datetime.now(timezone.utc)
     )
     db.add(order)
-    db.flush()
     
-    # Create order items and update stock
+    # Create order items
     for item_info in items_data:
         order_item = OrderItem(
-            order_id=order.id,
             product_id=item_info["product"].id,
             product_title=item_info["product"].title,
             quantity=item_info["quantity"],
             price=item_info["price"],
             total=item_info["total"]
         )
-        db.add(order_item)
-        
-        # Update product stock
-        item_info["product"].stock -= item_info["quantity"]
-    
-    db.commit()
-    db.refresh(order)
+        order.items.append(order_item)
     
-    # Load items for response
-    order.items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
+    await record_order_change(db, order, None, order.status)
+    # Notifications are sent by the outbox worker, never inline with checkout
+    enqueue(db, order_events(store, order))
+    if idempotency_row is not None:
+        await db.flush()
+        save_response(idempotency_row, status.HTTP_201_CREATED, OrderResponse.model_validate(order))
+    await db.commit()
+    outbox_worker.wake()
     
     return order
 
-@router.get("", response_model=list[OrderResponse])
+@router.get("", response_model=OrderPage)
 async def get_orders(
     request: Request,
     status_filter: OrderStatus = None,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1),
+    current_user: CurrentUser = Depends(get_token_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get orders for current store (owner only)"""
+    """Get orders for current store (owner only), newest first"""
     if not hasattr(request.state, 'tenant_id') or not request.state.tenant_id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Store context required"
         )
     
-    store = db.query(Store).filter(
+    store = await db.scalar(select(Store).where(
         Store.id == request.state.tenant_id,
         Store.owner_id == current_user.id
-    ).first()
+    ))
     if not store:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Store not found"
         )
     
-    query = db.query(Order).filter(Order.store_id == store.id)
+    limit = clamp_limit(limit)
+    query = select_orders().where(Order.store_id == store.id)
     if status_filter:
-        query = query.filter(Order.status == status_filter)
+        query = query.where(Order.status == status_filter)
+    if cursor:
+        query = query.where(tuple_(Order.created_at, Order.id) < decode_order_cursor(cursor))
     
-    orders = query.order_by(Order.created_at.desc()).all()
+    rows = (await db.scalars(
+        query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1)
+    )).all()
+    orders, next_cursor = split_page(rows, limit, lambda o: encode_cursor(o.created_at, o.id))
     
-    # Load items for each order
-    for order in orders:
-        order.items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
+    return {"items": orders, "next_cursor": next_cursor}
+
+ORDER_EXPORT_COLUMNS = [
+    Order.id, Order.order_number, Order.created_at, Order.status,
+    Order.customer_name, Order.customer_phone, Order.customer_email,
+    Order.shipping_address, Order.shipping_city, Order.shipping_postal,
+    Order.subtotal, Order.shipping_cost, Order.total, Order.notes,
+]
+ITEM_EXPORT_COLUMNS = [
+    OrderItem.product_id, OrderItem.product_title, OrderItem.quantity,
+    OrderItem.price, OrderItem.total.label("item_total"),
+]
+ORDER_EXPORT_FIELDS = [column.key for column in ORDER_EXPORT_COLUMNS]
+ITEM_EXPORT_FIELDS = ["product_id", "product_title", "quantity", "price", "total"]
+
+def export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, OrderStatus):
+        return value.value
+    return value
+
+async def iter_order_csv(query):
+    """One CSV line per order item, order columns repeated"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(ORDER_EXPORT_FIELDS + [f"item_{field}" for field in ITEM_EXPORT_FIELDS])
+    async for partition in stream_partitions(query, settings.EXPORT_BATCH_SIZE):
+        writer.writerows([export_value(value) for value in row] for row in partition)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+async def iter_order_ndjson(query):
+    """One JSON object per order with its items nested.
+
+    Rows arrive sorted by order, so an order is complete once the next one
+    starts; only the current order is held in memory.
+    """
+    order_size = len(ORDER_EXPORT_FIELDS)
+    current = None
+    async for partition in stream_partitions(query, settings.EXPORT_BATCH_SIZE):
+        lines = []
+        for row in partition:
+            values = [export_value(value) for value in row]
+            if current is None or current["id"] != values[0]:
+                if current is not None:
+                    lines.append(json.dumps(current, ensure_ascii=False))
+                current = dict(zip(ORDER_EXPORT_FIELDS, values[:order_size]))
+                current["items"] = []
+            # Orders without items come back from the outer join with NULL item columns
+            if values[order_size] is not None:
+                current["items"].append(dict(zip(ITEM_EXPORT_FIELDS, values[order_size:])))
+        if lines:
+            yield "\n".join(lines) + "\n"
+    if current is not None:
+        yield json.dumps(current, ensure_ascii=False) + "\n"
+
+@router.get("/export")
+async def export_orders(
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    status_filter: OrderStatus = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Stream the store's orders and items as CSV or NDJSON, oldest first.
+
+    Rows are read through a server-side cursor, so memory stays flat however
+    many orders match. date_from is inclusive, date_to exclusive.
+    """
+    if not hasattr(request.state, 'tenant_id') or not request.state.tenant_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Store context required"
+        )
+    
+    store_id = await db.scalar(select(Store.id).where(
+        Store.id == request.state.tenant_id,
+        Store.owner_id == current_user.id
+    ))
+    if not store_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Store not found"
+        )
+    
+    query = select(*ORDER_EXPORT_COLUMNS, *ITEM_EXPORT_COLUMNS).outerjoin(
+        OrderItem, OrderItem.order_id == Order.id
+    ).where(Order.store_id == store_id)
+    if status_filter:
+        query = query.where(Order.status == status_filter)
+    if date_from:
+        query = query.where(Order.created_at >= date_from)
+    if date_to:
+        query = query.where(Order.created_at < date_to)
+    query = query.order_by(Order.created_at, Order.id, OrderItem.id)
     
-    return orders
+    if format == "csv":
+        body, media_type = iter_order_csv(query), "text/csv"
+    else:
+        body, media_type = iter_order_ndjson(query), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="orders-{store_id}.{format}"'}
+    )
 
 @router.get("/{order_id}", response_model=OrderResponse)
 async def get_order(
     order_id: int,
     request: Request,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_token_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get order by ID"""
     if not hasattr(request.state, 'tenant_id') or not request.state.tenant_id:
@@ -174,18 +362,17 @@ async def get_order(
             detail="Store context required"
         )
     
-    order = db.query(Order).join(Store).filter(
+    order = await db.scalar(select_orders().join(Store).where(
         Order.id == order_id,
         Order.store_id == request.state.tenant_id,
         Store.owner_id == current_user.id
-    ).first()
+    ))
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Order not found"
         )
     
-    order.items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
     return order
 
 @router.put("/{order_id}", response_model=OrderResponse)
@@ -193,8 +380,8 @@ async def update_order(
     order_id: int,
     order_data: OrderUpdate,
     request: Request,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Update order status"""
     if not hasattr(request.state, 'tenant_id') or not request.state.tenant_id:
@@ -203,23 +390,35 @@ async def update_order(
             detail="Store context required"
         )
     
-    order = db.query(Order).join(Store).filter(
+    order = await db.scalar(select_orders().join(Store).where(
         Order.id == order_id,
         Order.store_id == request.state.tenant_id,
         Store.owner_id == current_user.id
-    ).first()
+    ))
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Order not found"
         )
     
-    order.status = order_data.status
+    # Conditional on the status we loaded, like reserve_stock, so two
+    # concurrent changes cannot both move the analytics rollups
+    old_status = order.status
+    values = {"status": order_data.status}
     if order_data.notes:
-        order.notes = order_data.notes
+        values["notes"] = order_data.notes
+    result = await db.execute(
+        update(Order).where(Order.id == order.id, Order.status == old_status).values(values)
+    )
+    if result.rowcount != 1:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Order status changed meanwhile; reload and try again"
+        )
+    if order_data.status != old_status:
+        await record_order_change(db, order, old_status, order_data.status)
     
-    db.commit()
-    db.refresh(order)
-    order.items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
+    await db.commit()
     return order
 
@@ -1,27 +1,94 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from sqlalchemy import select, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
-from app.models import Product, Store, User
-from app.schemas import ProductCreate, ProductResponse, ProductUpdate
-from app.auth import get_current_user
+from app.models import Product, ProductImage, Store
+from app.schemas import ProductCreate, ProductResponse, ProductUpdate, ProductPage
+from app.auth import get_current_user, get_token_user, CurrentUser
+from app.pagination import clamp_limit, encode_cursor, decode_product_cursor, split_page
+from app.config import settings
+from app.response_cache import response_cache
+from app.search import search_products
+from app.images import image_dimensions
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
 import re
 import secrets
-import json
 
 router = APIRouter(prefix="/api/products", tags=["products"])
 
+SLUG_ATTEMPTS = 3
+SLUG_INDEX = "ix_products_store_slug"
+
 def generate_slug(title: str) -> str:
     """Generate URL-friendly slug from title"""
     slug = re.sub(r'[^\w\s-]', '', title.lower())
     slug = re.sub(r'[-\s]+', '-', slug)
     return slug[:200]
 
+def is_slug_conflict(error: IntegrityError) -> bool:
+    """Whether error violated the unique (store_id, slug) index, the one conflict a new slug fixes"""
+    orig = error.orig
+    # psycopg reports the constraint in diag; asyncpg on the exception the adapter wraps
+    constraint = getattr(getattr(orig, "diag", None), "constraint_name", None) \
+        or getattr(orig.__cause__, "constraint_name", None)
+    if constraint is not None:
+        return constraint == SLUG_INDEX
+    # SQLite names the columns: "UNIQUE constraint failed: products.store_id, products.slug"
+    return str(orig).endswith("products.store_id, products.slug")
+
+def next_free_slug(base_slug: str, taken: set, start: int = 1) -> str:
+    """Return base_slug, or base_slug-N with the smallest N >= start not in taken"""
+    if base_slug not in taken:
+        return base_slug
+    counter = start
+    while f"{base_slug}-{counter}" in taken:
+        counter += 1
+    return f"{base_slug}-{counter}"
+
+async def fetch_taken_slugs(db: AsyncSession, store_id: int, base_slugs) -> set:
+    """Load every base and base-* slug of a store for the given bases in one query"""
+    conditions = []
+    for base_slug in set(base_slugs):
+        pattern = re.sub(r'([\\%_])', r'\\\1', base_slug) + "-%"
+        conditions.append(Product.slug == base_slug)
+        conditions.append(Product.slug.like(pattern, escape="\\"))
+    rows = await db.scalars(select(Product.slug).where(
+        Product.store_id == store_id,
+        or_(*conditions)
+    ))
+    return set(rows)
+
+async def allocate_slugs(db: AsyncSession, store_id: int, titles: list) -> list:
+    """Pick unused, mutually distinct slugs for a batch of titles"""
+    base_slugs = [generate_slug(title) for title in titles]
+    taken = await fetch_taken_slugs(db, store_id, base_slugs)
+    # Last suffix handed out per base, so repeated titles do not rescan
+    counters = {}
+    slugs = []
+    for base_slug in base_slugs:
+        slug = next_free_slug(base_slug, taken, counters.get(base_slug, 1))
+        if slug != base_slug:
+            counters[base_slug] = int(slug.rsplit("-", 1)[1]) + 1
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+def describe_images(urls: list) -> list:
+    """product_images rows (without product_id) for URLs in display order"""
+    rows = []
+    for position, url in enumerate(urls):
+        width, height = image_dimensions(url)
+        rows.append({"url": url, "position": position, "width": width, "height": height})
+    return rows
+
 @router.post("", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
 async def create_product(
     product_data: ProductCreate,
     request: Request,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new product"""
     # Get store from tenant_id (subdomain) or use first store of user
@@ -29,15 +96,15 @@ async def create_product(
     
     if hasattr(request.state, 'tenant_id') and request.state.tenant_id:
         # Use store from subdomain
-        store = db.query(Store).filter(
+        store = await db.scalar(select(Store).where(
             Store.id == request.state.tenant_id,
             Store.owner_id == current_user.id
-        ).first()
+        ))
     else:
         # No subdomain - use first store of current user
-        store = db.query(Store).filter(
+        store = await db.scalar(select(Store).where(
             Store.owner_id == current_user.id
-        ).first()
+        ).limit(1))
     
     if not store:
         raise HTTPException(
@@ -45,37 +112,45 @@ async def create_product(
             detail="No store found. Please create a store first."
         )
     
-    slug = generate_slug(product_data.title)
-    # Ensure unique slug
-    base_slug = slug
-    counter = 1
-    while db.query(Product).filter(Product.slug == slug, Product.store_id == store.id).first():
-        slug = f"{base_slug}-{counter}"
-        counter += 1
-    
+    store_id = store.id
     product_dict = product_data.dict()
-    # Handle images - if it's a string (JSON), keep it, otherwise convert to JSON
-    if 'images' in product_dict and product_dict['images']:
-        if isinstance(product_dict['images'], list):
-            import json
-            product_dict['images'] = json.dumps(product_dict['images'])
+    # Dimensions come from the uploaded files, so read them off the event loop
+    image_rows = await run_in_threadpool(describe_images, product_dict.pop('images') or [])
     
-    product = Product(
-        **product_dict,
-        store_id=store.id,
-        slug=slug
-    )
-    db.add(product)
-    db.commit()
-    db.refresh(product)
+    # The unique (store_id, slug) index settles races between concurrent
+    # creates; the loser picks the next free slug and retries
+    for attempt in range(SLUG_ATTEMPTS):
+        product = Product(
+            **product_dict,
+            store_id=store_id,
+            slug=(await allocate_slugs(db, store_id, [product_data.title]))[0],
+            images=[ProductImage(**row) for row in image_rows]
+        )
+        db.add(product)
+        try:
+            await db.commit()
+            break
+        except IntegrityError as e:
+            await db.rollback()
+            if not is_slug_conflict(e):
+                raise
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Could not allocate a unique slug, please retry"
+        )
+    await db.refresh(product)
+    await response_cache.invalidate(store_id)
     return product
 
-@router.get("", response_model=list[ProductResponse])
+@router.get("", response_model=ProductPage)
 async def get_products(
     request: Request,
     published_only: bool = False,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1),
+    current_user: CurrentUser = Depends(get_token_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get products for current store"""
     store_id = None
@@ -85,28 +160,57 @@ async def get_products(
         store_id = request.state.tenant_id
     else:
         # No subdomain - use first store of current user
-        store = db.query(Store).filter(
+        store = await db.scalar(select(Store).where(
             Store.owner_id == current_user.id
-        ).first()
+        ).limit(1))
         if store:
             store_id = store.id
     
     if not store_id:
-        return []  # Return empty list if no store
+        return {"items": []}  # Return empty page if no store
     
-    query = db.query(Product).filter(Product.store_id == store_id)
+    limit = clamp_limit(limit)
+    query = select(Product).where(Product.store_id == store_id)
     if published_only:
-        query = query.filter(Product.is_published == True)
+        query = query.where(Product.is_published == True)
+    if cursor:
+        query = query.where(Product.id > decode_product_cursor(cursor))
+    
+    rows = (await db.scalars(query.order_by(Product.id).limit(limit + 1))).all()
+    products, next_cursor = split_page(rows, limit, lambda p: encode_cursor(p.id))
+    return {"items": products, "next_cursor": next_cursor}
+
+@router.get("/search", response_model=ProductPage)
+async def search_store_products(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    published_only: bool = False,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1),
+    current_user: CurrentUser = Depends(get_token_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Search products of current store, best matches first"""
+    store_id = None
+    
+    if hasattr(request.state, 'tenant_id') and request.state.tenant_id:
+        store_id = request.state.tenant_id
+    else:
+        store = await db.scalar(select(Store).where(Store.owner_id == current_user.id).limit(1))
+        if store:
+            store_id = store.id
+    
+    if not store_id:
+        return {"items": []}
     
-    products = query.all()
-    return products
+    return await search_products(db, store_id, q, clamp_limit(limit), cursor, published_only)
 
 @router.get("/{product_id}", response_model=ProductResponse)
 async def get_product(
     product_id: int,
     request: Request,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_token_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get product by ID"""
     store_id = None
@@ -114,7 +218,7 @@ async def get_product(
     if hasattr(request.state, 'tenant_id') and request.state.tenant_id:
         store_id = request.state.tenant_id
     else:
-        store = db.query(Store).filter(Store.owner_id == current_user.id).first()
+        store = await db.scalar(select(Store).where(Store.owner_id == current_user.id).limit(1))
         if store:
             store_id = store.id
     
@@ -124,10 +228,10 @@ async def get_product(
             detail="Store not found"
         )
     
-    product = db.query(Product).filter(
+    product = await db.scalar(select(Product).where(
         Product.id == product_id,
         Product.store_id == store_id
-    ).first()
+    ))
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -139,7 +243,7 @@ async def get_product(
 async def get_product_by_slug(
     slug: str,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get product by slug (for public landing pages)"""
     # Try to get from subdomain first
@@ -150,17 +254,17 @@ async def get_product_by_slug(
     # If no subdomain, search all stores (for testing - in production, require subdomain)
     if not store_id:
         # Find product by slug across all stores (for development/testing)
-        product = db.query(Product).filter(
+        product = await db.scalar(select(Product).where(
             Product.slug == slug,
             Product.is_published == True
-        ).first()
+        ).limit(1))
     else:
         # Find product in specific store
-        product = db.query(Product).filter(
+        product = await db.scalar(select(Product).where(
             Product.slug == slug,
             Product.store_id == store_id,
             Product.is_published == True
-        ).first()
+        ).limit(1))
     
     if not product:
         raise HTTPException(
@@ -174,8 +278,8 @@ async def update_product(
     product_id: int,
     product_data: ProductUpdate,
     request: Request,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Update product"""
     store_id = None
@@ -183,7 +287,7 @@ async def update_product(
     if hasattr(request.state, 'tenant_id') and request.state.tenant_id:
         store_id = request.state.tenant_id
     else:
-        store = db.query(Store).filter(Store.owner_id == current_user.id).first()
+        store = await db.scalar(select(Store).where(Store.owner_id == current_user.id).limit(1))
         if store:
             store_id = store.id
     
@@ -193,11 +297,11 @@ async def update_product(
             detail="Store not found"
         )
     
-    product = db.query(Product).join(Store).filter(
+    product = await db.scalar(select(Product).join(Store).where(
         Product.id == product_id,
         Product.store_id == store_id,
         Store.owner_id == current_user.id
-    ).first()
+    ))
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -205,25 +309,36 @@ async def update_product(
         )
     
     product_dict = product_data.dict(exclude_unset=True)
-    # Handle images - if it's a string (JSON), keep it, otherwise convert to JSON
-    if 'images' in product_dict and product_dict['images']:
-        if isinstance(product_dict['images'], list):
-            import json
-            product_dict['images'] = json.dumps(product_dict['images'])
+    if 'images' in product_dict:
+        urls = product_dict.pop('images') or []
+        # Keep rows of images that stay so only added ones are inserted and measured
+        existing = {image.url: image for image in product.images}
+        new_rows = {
+            row["url"]: row for row in await run_in_threadpool(
+                describe_images, [url for url in urls if url not in existing]
+            )
+        }
+        images = []
+        for position, url in enumerate(urls):
+            image = existing.get(url) or ProductImage(**new_rows[url])
+            image.position = position
+            images.append(image)
+        product.images = images
     
     for key, value in product_dict.items():
         setattr(product, key, value)
     
-    db.commit()
-    db.refresh(product)
+    await db.commit()
+    await db.refresh(product)
+    await response_cache.invalidate(store_id)
     return product
 
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_product(
     product_id: int,
     request: Request,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete product"""
     store_id = None
@@ -231,7 +346,7 @@ async def delete_product(
     if hasattr(request.state, 'tenant_id') and request.state.tenant_id:
         store_id = request.state.tenant_id
     else:
-        store = db.query(Store).filter(Store.owner_id == current_user.id).first()
+        store = await db.scalar(select(Store).where(Store.owner_id == current_user.id).limit(1))
         if store:
             store_id = store.id
     
@@ -241,18 +356,19 @@ async def delete_product(
             detail="Store not found"
         )
     
-    product = db.query(Product).join(Store).filter(
+    product = await db.scalar(select(Product).join(Store).where(
         Product.id == product_id,
         Product.store_id == store_id,
         Store.owner_id == current_user.id
-    ).first()
+    ))
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
     
-    db.delete(product)
-    db.commit()
+    await db.delete(product)
+    await db.commit()
+    await response_cache.invalidate(store_id)
     return None
 
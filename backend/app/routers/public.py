@@ -1,29 +1,36 @@
 from fastapi import APIRouter, Request, Depends, HTTPException, Query, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
 from app.models import Store, Product, ShippingClass
-from app.schemas import StoreResponse, ProductResponse, ShippingClassResponse
+from app.schemas import StoreResponse, ProductResponse, ShippingClassResponse, ProductPage
+from app.pagination import clamp_limit, encode_cursor, decode_product_cursor, split_page
+from app.config import settings
+from app.response_cache import cached_response
+from app.search import search_products
+from typing import Optional
 
 router = APIRouter(prefix="/api/public", tags=["public"])
 
 @router.get("/store", response_model=StoreResponse)
+@cached_response(StoreResponse)
 async def get_store_info(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get public store information"""
     store = None
     
     # Try to get from subdomain
     if hasattr(request.state, 'tenant_id') and request.state.tenant_id:
-        store = db.query(Store).filter(
+        store = await db.scalar(select(Store).where(
             Store.id == request.state.tenant_id,
             Store.is_active == True
-        ).first()
+        ))
     
     # If no subdomain, return first active store (for testing)
     if not store:
-        store = db.query(Store).filter(Store.is_active == True).first()
+        store = await db.scalar(select(Store).where(Store.is_active == True).limit(1))
     
     if not store:
         raise HTTPException(
@@ -32,11 +39,14 @@ async def get_store_info(
         )
     return store
 
-@router.get("/products", response_model=list[ProductResponse])
+@router.get("/products", response_model=ProductPage)
+@cached_response(ProductPage)
 async def get_public_products(
     request: Request,
     slug: str = Query(None),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get published products for store"""
     store_id = None
@@ -48,38 +58,70 @@ async def get_public_products(
     # If slug provided, search by slug across all stores (for testing)
     if slug:
         if store_id:
-            products = db.query(Product).filter(
+            products = (await db.scalars(select(Product).where(
                 Product.slug == slug,
                 Product.store_id == store_id,
                 Product.is_published == True
-            ).all()
+            ))).all()
         else:
             # No subdomain - search all stores
-            products = db.query(Product).filter(
+            products = (await db.scalars(select(Product).where(
                 Product.slug == slug,
                 Product.is_published == True
-            ).all()
-        return products
+            ).limit(clamp_limit(limit)))).all()
+        return {"items": products}
     
     # If no subdomain, return first store's products (for testing)
     if not store_id:
-        store = db.query(Store).filter(Store.is_active == True).first()
+        store = await db.scalar(select(Store).where(Store.is_active == True).limit(1))
         if store:
             store_id = store.id
     
     if not store_id:
-        return []
+        return {"items": []}
     
-    products = db.query(Product).filter(
+    limit = clamp_limit(limit)
+    query = select(Product).where(
         Product.store_id == store_id,
         Product.is_published == True
-    ).all()
-    return products
+    )
+    if cursor:
+        query = query.where(Product.id > decode_product_cursor(cursor))
+    
+    rows = (await db.scalars(query.order_by(Product.id).limit(limit + 1))).all()
+    products, next_cursor = split_page(rows, limit, lambda p: encode_cursor(p.id))
+    return {"items": products, "next_cursor": next_cursor}
+
+@router.get("/products/search", response_model=ProductPage)
+@cached_response(ProductPage)
+async def search_public_products(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1),
+    db: AsyncSession = Depends(get_db)
+):
+    """Search published products of store, best matches first"""
+    store_id = None
+    
+    if hasattr(request.state, 'tenant_id') and request.state.tenant_id:
+        store_id = request.state.tenant_id
+    else:
+        # No subdomain - use first store (for testing), as get_public_products does
+        store = await db.scalar(select(Store).where(Store.is_active == True).limit(1))
+        if store:
+            store_id = store.id
+    
+    if not store_id:
+        return {"items": []}
+    
+    return await search_products(db, store_id, q, clamp_limit(limit), cursor, published_only=True)
 
 @router.get("/shipping-classes", response_model=list[ShippingClassResponse])
+@cached_response(list[ShippingClassResponse])
 async def get_shipping_classes(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get active shipping classes for store"""
     if not hasattr(request.state, 'tenant_id') or not request.state.tenant_id:
@@ -88,9 +130,9 @@ async def get_shipping_classes(
             detail="Store context required"
         )
     
-    classes = db.query(ShippingClass).filter(
+    classes = (await db.scalars(select(ShippingClass).where(
         ShippingClass.store_id == request.state.tenant_id,
         ShippingClass.is_active == True
-    ).all()
+    ))).all()
     return classes
 
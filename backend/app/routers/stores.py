@@ -1,9 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
-from app.models import Store, User
-from app.schemas import StoreCreate, StoreResponse, StoreBase
-from app.auth import get_current_user
+from app.models import Store, StoreDomain
+from app.schemas import StoreCreate, StoreResponse, StoreBase, StoreDomainCreate, StoreDomainResponse
+from app.auth import get_current_user, get_token_user, CurrentUser
+from app.config import settings
+from app.middleware import invalidate_store_cache, normalize_host, refresh_store_domains
+from app.response_cache import response_cache
 import re
 
 router = APIRouter(prefix="/api/stores", tags=["stores"])
@@ -15,11 +20,33 @@ def validate_subdomain(subdomain: str) -> bool:
     pattern = r'^[a-z0-9]([a-z0-9-]*[a-z0-9])?$'
     return bool(re.match(pattern, subdomain))
 
+def validate_domain(domain: str) -> bool:
+    """Validate a custom domain: dotted DNS labels outside BASE_DOMAIN"""
+    if len(domain) > 253 or "." not in domain:
+        return False
+    base_domain = normalize_host(settings.BASE_DOMAIN)
+    if domain == base_domain or domain.endswith(f".{base_domain}"):
+        return False
+    label = r'[a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?'
+    return bool(re.fullmatch(rf'{label}(\.{label})+', domain))
+
+async def get_owned_store(db: AsyncSession, store_id: int, current_user: CurrentUser) -> Store:
+    store = await db.scalar(select(Store).where(
+        Store.id == store_id,
+        Store.owner_id == current_user.id
+    ))
+    if not store:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Store not found"
+        )
+    return store
+
 @router.post("", response_model=StoreResponse, status_code=status.HTTP_201_CREATED)
 async def create_store(
     store_data: StoreCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new store"""
     if not validate_subdomain(store_data.subdomain):
@@ -29,7 +56,7 @@ async def create_store(
         )
     
     # Check if subdomain exists
-    existing = db.query(Store).filter(Store.subdomain == store_data.subdomain).first()
+    existing = await db.scalar(select(Store).where(Store.subdomain == store_data.subdomain))
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -38,30 +65,33 @@ async def create_store(
     
     store = Store(**store_data.dict(), owner_id=current_user.id)
     db.add(store)
-    db.commit()
-    db.refresh(store)
+    await db.commit()
+    await db.refresh(store)
+    # Clear any cached "not found" for this subdomain
+    invalidate_store_cache(store.subdomain)
+    await response_cache.invalidate(store.id)
     return store
 
 @router.get("", response_model=list[StoreResponse])
 async def get_my_stores(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_token_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all stores owned by current user"""
-    stores = db.query(Store).filter(Store.owner_id == current_user.id).all()
+    stores = (await db.scalars(select(Store).where(Store.owner_id == current_user.id))).all()
     return stores
 
 @router.get("/{store_id}", response_model=StoreResponse)
 async def get_store(
     store_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_token_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get store by ID"""
-    store = db.query(Store).filter(
+    store = await db.scalar(select(Store).where(
         Store.id == store_id,
         Store.owner_id == current_user.id
-    ).first()
+    ))
     if not store:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -73,14 +103,14 @@ async def get_store(
 async def update_store(
     store_id: int,
     store_data: StoreBase,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Update store"""
-    store = db.query(Store).filter(
+    store = await db.scalar(select(Store).where(
         Store.id == store_id,
         Store.owner_id == current_user.id
-    ).first()
+    ))
     if not store:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -90,7 +120,75 @@ async def update_store(
     for key, value in store_data.dict(exclude_unset=True).items():
         setattr(store, key, value)
     
-    db.commit()
-    db.refresh(store)
+    await db.commit()
+    await db.refresh(store)
+    invalidate_store_cache(store.subdomain)
+    await response_cache.invalidate(store.id)
     return store
 
+
+@router.get("/{store_id}/domains", response_model=list[StoreDomainResponse])
+async def get_store_domains(
+    store_id: int,
+    current_user: CurrentUser = Depends(get_token_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """List the store's custom domains"""
+    await get_owned_store(db, store_id, current_user)
+    return (await db.scalars(
+        select(StoreDomain).where(StoreDomain.store_id == store_id).order_by(StoreDomain.id)
+    )).all()
+
+@router.post("/{store_id}/domains", response_model=StoreDomainResponse, status_code=status.HTTP_201_CREATED)
+async def add_store_domain(
+    store_id: int,
+    domain_data: StoreDomainCreate,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Serve the store on a custom domain (point its DNS at this server first)"""
+    await get_owned_store(db, store_id, current_user)
+    domain = normalize_host(domain_data.domain.strip())
+    if not validate_domain(domain):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid domain"
+        )
+    
+    store_domain = StoreDomain(store_id=store_id, domain=domain)
+    db.add(store_domain)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Domain already in use"
+        )
+    await db.refresh(store_domain)
+    await refresh_store_domains(db)
+    return store_domain
+
+@router.delete("/{store_id}/domains/{domain_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_store_domain(
+    store_id: int,
+    domain_id: int,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Stop serving the store on a custom domain"""
+    await get_owned_store(db, store_id, current_user)
+    store_domain = await db.scalar(select(StoreDomain).where(
+        StoreDomain.id == domain_id,
+        StoreDomain.store_id == store_id
+    ))
+    if not store_domain:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Domain not found"
+        )
+    
+    await db.delete(store_domain)
+    await db.commit()
+    await refresh_store_domains(db)
+    return None
@@ -1,14 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Request, Query
+from fastapi.responses import RedirectResponse
+from multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
-from app.auth import get_current_user
-from app.models import User
+from app.auth import get_current_user, CurrentUser
 from app.config import settings
+from app.images import VARIANT_WIDTHS, variant_filename, fallback_format, process_image
+from app.file_serving import stat_file, file_response
 import os
 import uuid
+import aiofiles
+import aiofiles.os
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 router = APIRouter(prefix="/api/uploads", tags=["uploads"])
 
@@ -18,77 +22,170 @@ UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
 MAX_FILE_SIZE = settings.MAX_UPLOAD_SIZE
+MAX_UPLOAD_FILES = settings.MAX_UPLOAD_FILES
 
 def allowed_file(filename: str) -> bool:
     return Path(filename).suffix.lower() in ALLOWED_EXTENSIONS
 
-@router.post("/images")
+class UploadRejected(Exception):
+    def __init__(self, status_code: int, detail: str):
+        self.status_code = status_code
+        self.detail = detail
+
+class ImagePart:
+    """One file part of a multipart upload, streamed to a hidden .part file"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.path = UPLOAD_DIR / f"{uuid.uuid4()}{Path(filename).suffix}"
+        self.tmp_path = self.path.with_name(f".{self.path.name}.part")
+        self.size = 0
+        self.out = None
+
+async def receive_images(request: Request) -> List[ImagePart]:
+    """Stream the "files" parts of a multipart body to disk as it arrives.
+
+    Starlette's form parsing spools the whole body before the handler runs;
+    parsing request.stream() here lets a disallowed or oversized file end
+    the upload at that point. Memory use is bounded by the network chunk
+    size. Other fields are discarded. On error every partial file is removed.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadRejected(status.HTTP_400_BAD_REQUEST, "Expected multipart/form-data")
+    # Every file at the limit plus room for boundaries and part headers
+    max_request_size = MAX_UPLOAD_FILES * (MAX_FILE_SIZE + 1024)
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_request_size:
+        raise UploadRejected(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "Upload too large")
+
+    # Parser callbacks only record events; files are written after each
+    # chunk so disk IO can be awaited
+    events = []
+    header_field = bytearray()
+    header_value = bytearray()
+
+    def on_header_end():
+        events.append(("header", (bytes(header_field).lower(), bytes(header_value))))
+        header_field.clear()
+        header_value.clear()
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": lambda: events.append(("begin", None)),
+        "on_header_field": lambda data, start, end: header_field.extend(data[start:end]),
+        "on_header_value": lambda data, start, end: header_value.extend(data[start:end]),
+        "on_header_end": on_header_end,
+        "on_headers_finished": lambda: events.append(("headers_finished", None)),
+        "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+        "on_part_end": lambda: events.append(("end", None)),
+    })
+
+    parts = []
+    part = None
+    disposition = {}
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for kind, value in events:
+                if kind == "begin":
+                    part, disposition = None, {}
+                elif kind == "header" and value[0] == b"content-disposition":
+                    disposition = parse_options_header(value[1])[1]
+                elif kind == "headers_finished":
+                    filename = disposition.get(b"filename", b"").decode("utf-8", "replace")
+                    if disposition.get(b"name") != b"files" or not filename:
+                        continue
+                    if not allowed_file(filename):
+                        raise UploadRejected(status.HTTP_400_BAD_REQUEST, f"File type not allowed: {filename}")
+                    if len(parts) >= MAX_UPLOAD_FILES:
+                        raise UploadRejected(status.HTTP_400_BAD_REQUEST, f"At most {MAX_UPLOAD_FILES} files per upload")
+                    part = ImagePart(filename)
+                    parts.append(part)
+                    part.out = await aiofiles.open(part.tmp_path, "wb")
+                elif kind == "data" and part is not None:
+                    part.size += len(value)
+                    if part.size > MAX_FILE_SIZE:
+                        raise UploadRejected(status.HTTP_400_BAD_REQUEST, f"File too large: {part.filename}")
+                    await part.out.write(value)
+                elif kind == "end" and part is not None:
+                    await part.out.close()
+                    part.out = None
+            events.clear()
+        parser.finalize()
+        for part in parts:
+            await aiofiles.os.replace(part.tmp_path, part.path)
+    except BaseException:
+        for part in parts:
+            if part.out is not None:
+                await part.out.close()
+            if await aiofiles.os.path.exists(part.tmp_path):
+                await aiofiles.os.remove(part.tmp_path)
+        raise
+    return parts
+
+@router.post("/images", openapi_extra={"requestBody": {"required": True, "content": {
+    "multipart/form-data": {"schema": {
+        "type": "object",
+        "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+        "required": ["files"],
+    }}
+}}})
 async def upload_images(
-    files: List[UploadFile] = File(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    background_tasks: BackgroundTasks,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Upload one or more images"""
-    if not files:
+    """Upload one or more images; resized variants are generated in the background"""
+    try:
+        parts = await receive_images(request)
+    except UploadRejected as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+    if not parts:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="No files provided"
         )
     
-    uploaded_files = []
-    
-    for file in files:
-        # Validate file
-        if not allowed_file(file.filename):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"File type not allowed: {file.filename}"
-            )
-        
-        # Read file content
-        contents = await file.read()
-        
-        # Check file size
-        if len(contents) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"File too large: {file.filename}"
-            )
-        
-        # Generate unique filename
-        file_ext = Path(file.filename).suffix
-        unique_filename = f"{uuid.uuid4()}{file_ext}"
-        file_path = UPLOAD_DIR / unique_filename
-        
-        # Save file
-        with open(file_path, "wb") as f:
-            f.write(contents)
-        
-        # Return URL
-        file_url = f"/api/uploads/images/{unique_filename}"
-        uploaded_files.append(file_url)
+    for part in parts:
+        background_tasks.add_task(process_image, part.path)
     
-    return {"files": uploaded_files}
+    return {"files": [f"/api/uploads/images/{part.path.name}" for part in parts]}
 
-@router.get("/images/{filename}")
-async def get_image(filename: str):
-    """Serve uploaded image"""
-    file_path = UPLOAD_DIR / filename
+@router.api_route("/images/{filename}", methods=["GET", "HEAD"])
+async def get_image(
+    filename: str,
+    request: Request,
+    variant: Optional[str] = Query(None, description="thumb, card or full")
+):
+    """Serve uploaded image, or one of its resized variants"""
+    if variant is not None and variant not in VARIANT_WIDTHS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown variant: {variant}"
+        )
     
-    if not file_path.exists() or not file_path.is_file():
+    # Stat results are cached, so repeat hits skip the filesystem
+    image = stat_file(UPLOAD_DIR, filename)
+    if not image:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Image not found"
         )
     
-    # Security: ensure file is within upload directory
-    try:
-        file_path.resolve().relative_to(UPLOAD_DIR.resolve())
-    except ValueError:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
+    # Serve WebP when the browser accepts it. While variants are still being
+    # generated, redirect to the original without letting anyone cache the
+    # redirect, so the variant URL is never cached with the original's bytes
+    if variant:
+        fmt = "webp" if "image/webp" in request.headers.get("accept", "") else fallback_format(filename)
+        variant_image = stat_file(UPLOAD_DIR, variant_filename(filename, variant, fmt))
+        if variant_image:
+            return file_response(request, variant_image, headers={"Vary": "Accept"})
+        return RedirectResponse(
+            request.url.path,
+            status_code=status.HTTP_302_FOUND,
+            headers={"Cache-Control": "no-store", "Vary": "Accept"}
         )
     
-    return FileResponse(file_path)
+    return file_response(request, image)
 
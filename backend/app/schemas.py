@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, field_validator
+from typing import Optional, List, Dict
+from datetime import date, datetime
+import json
 from app.models import OrderStatus
 
 # User Schemas
@@ -62,6 +63,17 @@ class StoreResponse(StoreBase):
     class Config:
         from_attributes = True
 
+class StoreDomainCreate(BaseModel):
+    domain: str
+
+class StoreDomainResponse(StoreDomainCreate):
+    id: int
+    store_id: int
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
 # Product Schemas
 class ProductBase(BaseModel):
     title: str
@@ -72,9 +84,29 @@ class ProductBase(BaseModel):
     discount_price: Optional[float] = None
     stock: int = 0
     is_published: bool = False
-    images: Optional[str] = None  # JSON array of image URLs
+    images: Optional[List[str]] = None  # image URLs, in display order
     meta_title: Optional[str] = None
     meta_description: Optional[str] = None
+    
+    @field_validator("images", mode="before")
+    @classmethod
+    def parse_images(cls, value):
+        # Older clients and CSV imports send a JSON array as a string
+        if isinstance(value, str):
+            value = json.loads(value) if value.strip() else []
+        if isinstance(value, list) and all(isinstance(url, str) for url in value):
+            return list(dict.fromkeys(value))
+        return value
+
+class ProductImageResponse(BaseModel):
+    url: str
+    position: int
+    width: Optional[int] = None
+    height: Optional[int] = None
+    variants: Dict[str, str] = {}
+    
+    class Config:
+        from_attributes = True
 
 class ProductCreate(ProductBase):
     pass
@@ -86,13 +118,17 @@ class ProductResponse(ProductBase):
     id: int
     store_id: int
     slug: str
-    images: Optional[str] = None
+    images: List[ProductImageResponse] = []
     created_at: datetime
     updated_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
 
+class ProductPage(BaseModel):
+    items: List[ProductResponse]
+    next_cursor: Optional[str] = None
+
 # Order Schemas
 class OrderItemCreate(BaseModel):
     product_id: int
@@ -141,6 +177,10 @@ class OrderResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class OrderPage(BaseModel):
+    items: List[OrderResponse]
+    next_cursor: Optional[str] = None
+
 class OrderUpdate(BaseModel):
     status: OrderStatus
     notes: Optional[str] = None
@@ -160,3 +200,54 @@ class ShippingClassResponse(ShippingClassCreate):
     class Config:
         from_attributes = True
 
+# Analytics Schemas
+class DailyStats(BaseModel):
+    day: date
+    orders: int
+    revenue: float
+    units: int
+
+class StatusStats(BaseModel):
+    status: OrderStatus
+    orders: int
+    revenue: float
+    units: int
+
+class TopProduct(BaseModel):
+    product_id: int
+    title: Optional[str] = None
+    units: int
+    revenue: float
+
+class AnalyticsSummary(BaseModel):
+    date_from: date
+    date_to: date
+    orders: int
+    revenue: float
+    units: int
+    average_order_value: float
+    days: List[DailyStats]
+    by_status: List[StatusStats]
+    top_products: List[TopProduct]
+
+# Profiling Schemas
+class ProfiledStatement(BaseModel):
+    statement: str
+    seconds: float
+
+class ProfileSummary(BaseModel):
+    id: int
+    trigger: str
+    method: str
+    path: str
+    route: Optional[str] = None
+    status: int
+    tenant_id: Optional[int] = None
+    started_at: datetime
+    duration: float
+    sql_count: int
+    sql_time: float
+
+class ProfileResponse(ProfileSummary):
+    sql: List[ProfiledStatement]
+    call_tree: str
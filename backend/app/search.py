@@ -0,0 +1,138 @@
+from typing import Optional
+from fastapi import HTTPException, status
+from sqlalchemy import select, func, literal, literal_column, table, column, and_, or_
+from app.database import engine
+from app.models import Product
+from app.pagination import encode_cursor, decode_cursor, split_page
+
+# Postgres: the 'simple' config lowercases and splits on the parser's word
+# boundaries without stemming or stopwords, so Bangla and English text are
+# indexed alike. Typo tolerance comes from pg_trgm on the titles.
+TS_CONFIG = "simple"
+SEARCH_VECTOR = literal_column("products.search_vector")
+
+PG_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"""ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('{TS_CONFIG}'::regconfig, coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('{TS_CONFIG}'::regconfig, coalesce(title_bn, '')), 'A') ||
+        setweight(to_tsvector('{TS_CONFIG}'::regconfig, coalesce(description, '')), 'B') ||
+        setweight(to_tsvector('{TS_CONFIG}'::regconfig, coalesce(description_bn, '')), 'B')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING GIN (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_products_title_trgm ON products USING GIN (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_products_title_bn_trgm ON products USING GIN (title_bn gin_trgm_ops)",
+]
+
+# SQLite (local development): an external-content FTS5 table kept in sync by
+# triggers. unicode61 treats Bangla vowel signs, virama and ZWJ/ZWNJ as
+# separators, which would split every word into consonants, so they are
+# declared as token characters.
+BANGLA_TOKENCHARS = "".join(chr(c) for c in [
+    *range(0x0981, 0x0984), 0x09BC, *range(0x09BE, 0x09C5), 0x09C7, 0x09C8,
+    *range(0x09CB, 0x09CE), 0x09D7, 0x09E2, 0x09E3, 0x200C, 0x200D,
+])
+FTS_COLUMNS = "title, title_bn, description, description_bn"
+FTS_NEW = "new.id, new.title, new.title_bn, new.description, new.description_bn"
+FTS_OLD = "'delete', old.id, old.title, old.title_bn, old.description, old.description_bn"
+SQLITE_SEARCH_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        {FTS_COLUMNS}, content='products', content_rowid='id',
+        tokenize="unicode61 remove_diacritics 2 tokenchars '{BANGLA_TOKENCHARS}'"
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, {FTS_COLUMNS}) VALUES ({FTS_NEW});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, {FTS_COLUMNS}) VALUES ({FTS_OLD});
+    END""",
+    # Only text columns: stock and price updates on every checkout leave the index alone
+    f"""CREATE TRIGGER IF NOT EXISTS products_fts_update
+    AFTER UPDATE OF {FTS_COLUMNS} ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, {FTS_COLUMNS}) VALUES ({FTS_OLD});
+        INSERT INTO products_fts(rowid, {FTS_COLUMNS}) VALUES ({FTS_NEW});
+    END""",
+]
+products_fts = table("products_fts", column("rowid"))
+FTS_TABLE = literal_column("products_fts")
+
+def init_search(engine):
+    """Create the search column/table and indexes for the engine's dialect"""
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            for ddl in PG_SEARCH_DDL:
+                conn.exec_driver_sql(ddl)
+        elif engine.dialect.name == "sqlite":
+            exists = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE name = 'products_fts'"
+            ).first()
+            update_trigger = conn.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'products_fts_update'"
+            ).scalar()
+            if update_trigger and "UPDATE OF" not in update_trigger:
+                # Created before it was limited to the text columns
+                conn.exec_driver_sql("DROP TRIGGER products_fts_update")
+            for ddl in SQLITE_SEARCH_DDL:
+                conn.exec_driver_sql(ddl)
+            if not exists:
+                # Index products created before search existed
+                conn.exec_driver_sql("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+def fts5_query(q: str) -> str:
+    """Quote each term as a prefix match so user input is never FTS5 syntax"""
+    return " ".join(f'"{term}"*' for term in q.replace('"', " ").split())
+
+def search_filter(dialect: str, q: str) -> tuple:
+    """Return (join target or None, where clause, rank expression; higher is better)"""
+    if dialect == "postgresql":
+        query = func.websearch_to_tsquery(literal_column(f"'{TS_CONFIG}'::regconfig"), q)
+        matches = or_(
+            SEARCH_VECTOR.op("@@")(query),
+            literal(q).op("<%")(Product.title),
+            literal(q).op("<%")(Product.title_bn),
+        )
+        rank = func.ts_rank_cd(SEARCH_VECTOR, query) + func.greatest(
+            func.word_similarity(q, Product.title),
+            func.word_similarity(q, func.coalesce(Product.title_bn, "")),
+        )
+        return None, matches, rank
+    if dialect == "sqlite":
+        # bm25 is lower-is-better; titles weigh ten times the descriptions
+        rank = -func.bm25(FTS_TABLE, 10.0, 10.0, 1.0, 1.0)
+        return products_fts.c.rowid == Product.id, FTS_TABLE.op("MATCH")(fts5_query(q)), rank
+
+    pattern = f"%{q}%"
+    matches = or_(Product.title.ilike(pattern), Product.title_bn.ilike(pattern))
+    return None, matches, literal(0.0)
+
+def decode_search_cursor(cursor: str) -> tuple:
+    """Decode a (rank, id) search cursor"""
+    rank, product_id = decode_cursor(cursor, 2)
+    try:
+        return float(rank), int(product_id)
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+async def search_products(db, store_id: int, q: str, limit: int,
+                          cursor: Optional[str] = None, published_only: bool = False) -> dict:
+    """Ranked, keyset-paginated product search within one store"""
+    if not q.replace('"', " ").strip():
+        return {"items": []}
+    join_on, matches, rank = search_filter(engine.dialect.name, q)
+    query = select(Product, rank.label("rank"))
+    if join_on is not None:
+        query = query.join(products_fts, join_on)
+    query = query.where(Product.store_id == store_id, matches)
+    if published_only:
+        query = query.where(Product.is_published == True)
+    if cursor:
+        after_rank, after_id = decode_search_cursor(cursor)
+        query = query.where(or_(rank < after_rank, and_(rank == after_rank, Product.id > after_id)))
+
+    rows = (await db.execute(query.order_by(rank.desc(), Product.id).limit(limit + 1))).all()
+    rows, next_cursor = split_page(rows, limit, lambda row: encode_cursor(row.rank, row.Product.id))
+    return {"items": [row.Product for row in rows], "next_cursor": next_cursor}
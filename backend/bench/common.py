@@ -0,0 +1,71 @@
+"""Shared setup of the benchmarks.
+
+Settings are read when app modules are imported, so benchmarks call
+configure() before importing anything else from app.
+"""
+import asyncio
+import os
+import tempfile
+import uuid
+from typing import Optional
+
+def configure(url: Optional[str] = None, **env) -> str:
+    """Point the app at url, or a new temporary SQLite file; returns the URL"""
+    directory = tempfile.mkdtemp(prefix="bdtraders-bench-")
+    url = url or f"sqlite:///{directory}/bench.db"
+    os.environ["DATABASE_URL"] = url
+    os.environ.setdefault("UPLOAD_DIR", os.path.join(directory, "uploads"))
+    os.environ["OUTBOX_WORKER_ENABLED"] = "false"
+    os.environ["RESPONSE_CACHE_REDIS"] = "false"
+    os.environ["OTP_BACKEND"] = "memory"
+    os.environ.update(env)
+    return url
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))]
+
+def create_store(session) -> int:
+    """Insert a user and an active store owned by them; returns the store id"""
+    from app.models import Store, User
+
+    user = User(phone=f"01{uuid.uuid4().int % 10 ** 9:09d}", full_name="Bench")
+    store = Store(subdomain=f"bench{uuid.uuid4().hex[:12]}", name="Bench", owner=user)
+    session.add(store)
+    session.commit()
+    return store.id
+
+async def asgi_get(app, target: str, headers: dict) -> tuple:
+    """Run one GET through an ASGI app, discarding the body as it streams.
+
+    Unlike httpx's ASGITransport, which collects the whole body, memory
+    stays what the app itself uses. Returns (status, body bytes, lines).
+    """
+    path, _, query = target.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()],
+        "client": ("127.0.0.1", 50000), "server": ("bench.test", 80),
+    }
+    received = False
+    totals = {"status": None, "bytes": 0, "lines": 0}
+
+    async def receive():
+        nonlocal received
+        if received:
+            # Stay connected until the response ends
+            await asyncio.Event().wait()
+        received = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            totals["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            body = message.get("body", b"")
+            totals["bytes"] += len(body)
+            totals["lines"] += body.count(b"\n")
+
+    await app(scope, receive, send)
+    return totals["status"], totals["bytes"], totals["lines"]
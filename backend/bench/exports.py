@@ -0,0 +1,144 @@
+"""Throughput and memory of the streaming order and product exports.
+
+Seeds one store with --orders orders of two items each and --products
+products, then runs each export in a fresh interpreter and drains it
+through the ASGI app, discarding the body as a client would. Reports
+lines/s and peak RSS above the idle app: flat when streaming works,
+growing with the row count when something buffers the export.
+
+    python -m bench.exports [--orders 100000] [--products 100000] [--batch-size 1000] [--url URL]
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from bench.common import asgi_get, configure
+
+EXPORTS = [
+    ("/api/orders/export?format=csv", "orders csv"),
+    ("/api/orders/export?format=ndjson", "orders ndjson"),
+    ("/api/products/export?format=csv", "products csv"),
+    ("/api/products/export?format=jsonl", "products jsonl"),
+]
+SUBDOMAIN = "exports"
+HEADERS = {"host": f"{SUBDOMAIN}.bench.test", "authorization": "Bearer dev-token-bench"}
+
+def seed(orders: int, products: int, batch: int = 5000):
+    from sqlalchemy import insert
+    from app.analytics import backfill_if_empty
+    from app.database import SessionLocal, engine
+    from app.models import Order, OrderItem, OrderStatus, Product, Store, User
+
+    with SessionLocal() as session:
+        # Owned by the user the dev tokens resolve to
+        store = Store(subdomain=SUBDOMAIN, name="Bench", owner=User(phone="dev-user", full_name="Dev User"))
+        session.add(store)
+        session.commit()
+        store_id = store.id
+    with engine.begin() as conn:
+        for offset in range(0, products, batch):
+            conn.execute(insert(Product), [
+                {"store_id": store_id, "slug": f"p-{n}", "title": f"Cotton kurta {n}", "price": 100.0 + n % 50,
+                 "stock": 10, "is_published": True, "description": "Handloom cotton, machine washable. " * 4}
+                for n in range(offset, min(offset + batch, products))
+            ])
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        for offset in range(0, orders, batch):
+            ids = range(offset + 1, min(offset + batch, orders) + 1)
+            conn.execute(insert(Order), [
+                {"id": n, "store_id": store_id, "order_number": f"ORD{n:012d}", "status": OrderStatus.DELIVERED,
+                 "customer_name": "Rahim Uddin", "customer_phone": "01700000000",
+                 "shipping_address": "House 12, Road 5, Dhanmondi", "shipping_city": "Dhaka",
+                 "subtotal": 300.0, "shipping_cost": 60.0, "total": 360.0, "created_at": start + timedelta(minutes=n)}
+                for n in ids
+            ])
+            conn.execute(insert(OrderItem), [
+                {"order_id": n, "product_id": 1 + (n + line) % max(products, 1), "product_title": "Cotton kurta",
+                 "quantity": 1 + line, "price": 100.0, "total": 100.0 * (1 + line)}
+                for n in ids for line in range(2)
+            ])
+    backfill_if_empty()
+
+def rss_kib(field: str) -> int:
+    """VmRSS or VmHWM (peak) of this process in KiB, from /proc on Linux"""
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise KeyError(field)
+
+def reset_peak_rss() -> bool:
+    """Reset VmHWM to the current RSS (Linux 4.0+); False where unsupported"""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+async def measure(target: str) -> dict:
+    from app.main import app
+
+    await app.router.startup()
+    try:
+        await asgi_get(app, "/api/orders/export?date_from=2100-01-01", HEADERS)  # an empty export warms the app
+        baseline = rss_kib("VmRSS")
+        exact = reset_peak_rss()
+        started = time.perf_counter()
+        status, size, lines = await asgi_get(app, target, HEADERS)
+        elapsed = time.perf_counter() - started
+        if exact:
+            peak = rss_kib("VmHWM")
+        else:
+            # ru_maxrss is KiB on Linux and never resets; an upper bound
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    finally:
+        await app.router.shutdown()
+    if status != 200:
+        raise RuntimeError(f"{target} returned {status}")
+    return {"lines": lines, "bytes": size, "seconds": elapsed, "baseline": baseline, "peak": peak, "exact": exact}
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench.exports")
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, help="EXPORT_BATCH_SIZE; the app default otherwise")
+    parser.add_argument("--url", help="database URL; a temporary SQLite file by default")
+    parser.add_argument("--export", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    env = {"BASE_DOMAIN": "bench.test", "LOG_LEVEL": "WARNING"}
+    if args.batch_size:
+        env["EXPORT_BATCH_SIZE"] = str(args.batch_size)
+
+    if args.export:
+        configure(args.url, **env)
+        print(json.dumps(asyncio.run(measure(args.export))))
+        return
+
+    url = configure(args.url, **env)
+    from app import models  # registers the tables init_db creates
+    from app.database import init_db
+
+    init_db()
+    started = time.perf_counter()
+    seed(args.orders, args.products)
+    print(f"Seeded {args.orders} orders and {args.products} products in {time.perf_counter() - started:.1f}s")
+    print(f"{'export':<15} {'lines':>8} {'MiB':>7} {'lines/s':>9} {'idle MiB':>9} {'peak MiB':>9} {'+MiB':>6}")
+    for target, label in EXPORTS:
+        command = [sys.executable, "-m", "bench.exports", "--export", target, "--url", url]
+        if args.batch_size:
+            command += ["--batch-size", str(args.batch_size)]
+        output = subprocess.run(command, check=True, capture_output=True, text=True, env=os.environ).stdout
+        row = json.loads(output.strip().splitlines()[-1])
+        note = "" if row["exact"] else "  (peak since process start)"
+        print(f"{label:<15} {row['lines']:>8} {row['bytes'] / 2 ** 20:>7.1f} {row['lines'] / row['seconds']:>9.0f} "
+              f"{row['baseline'] / 1024:>9.1f} {row['peak'] / 1024:>9.1f} "
+              f"{(row['peak'] - row['baseline']) / 1024:>6.1f}{note}")
+
+if __name__ == "__main__":
+    main()
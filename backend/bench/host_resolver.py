@@ -0,0 +1,62 @@
+"""Cost of mapping a Host header to a store subdomain.
+
+Times HostResolver.resolve on a warm memo, its uncached parse, and the
+chain of str.replace calls it replaced, for the host forms browsers and
+proxies send, with --domains custom domains loaded. A last row sends one
+store's host with a different port each time, which used to take a new
+memo entry per request.
+
+    python -m bench.host_resolver [--number 200000] [--domains 5000]
+"""
+import argparse
+import itertools
+import timeit
+from bench.common import configure
+
+BASE_DOMAIN = "example.com"
+
+def legacy_tenant(host: str):
+    """The parser HostResolver replaced"""
+    host = host.split(':')[0]
+    host = host.replace('www.', '')
+    if host.endswith(BASE_DOMAIN):
+        subdomain = host.replace(f'.{BASE_DOMAIN}', '').replace(BASE_DOMAIN, '')
+        if subdomain and subdomain != 'api' and subdomain != 'admin':
+            return subdomain
+    return None
+
+def ns_per_call(function, number: int) -> float:
+    return min(timeit.repeat(function, number=number, repeat=5)) / number * 1e9
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench.host_resolver")
+    parser.add_argument("--number", type=int, default=200_000, help="calls per timing")
+    parser.add_argument("--domains", type=int, default=5000, help="custom domains in the map")
+    args = parser.parse_args()
+    configure(BASE_DOMAIN=BASE_DOMAIN)
+    from app.config import settings
+    from app.middleware import HostResolver, normalize_host
+
+    resolver = HostResolver(BASE_DOMAIN, max_hosts=settings.STORE_CACHE_SIZE)
+    resolver.set_domains({f"shop{n}.com.bd": f"store{n}" for n in range(args.domains)})
+    hosts = [
+        ("<sub>.<base>:443", "Shop42.example.com:443"),
+        ("www.<sub>.<base>", "www.shop42.example.com"),
+        ("custom domain", "www.shop7.com.bd"),
+        ("unknown host", "203.0.113.7:8080"),
+    ]
+    print(f"{'host':<22} {'memo hit ns':>12} {'uncached ns':>12} {'legacy ns':>10}")
+    for label, host in hosts:
+        resolver.resolve(host)
+        hit = ns_per_call(lambda: resolver.resolve(host), args.number)
+        uncached = ns_per_call(lambda: resolver.parse(normalize_host(host)), args.number)
+        legacy = "n/a" if label == "custom domain" else f"{ns_per_call(lambda: legacy_tenant(host), args.number):.0f}"
+        print(f"{label:<22} {hit:>12.0f} {uncached:>12.0f} {legacy:>10}")
+
+    ports = itertools.count(1024)
+    resolver.set_domains({})
+    rotating = ns_per_call(lambda: resolver.resolve(f"shop42.example.com:{next(ports)}"), args.number)
+    print(f"{'rotating port':<22} {rotating:>12.0f}   memo entries: {len(resolver.hosts)}")
+
+if __name__ == "__main__":
+    main()
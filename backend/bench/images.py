@@ -0,0 +1,87 @@
+"""Time to generate the resized variants of uploaded images.
+
+Writes sample photos (a 12 MP phone JPEG, a 4 MP PNG with transparency
+and a 2 MP WebP, noisy so encoders cannot shortcut them) or uses the
+images in --images, then times app.images.generate_variants on each in
+this process, and the throughput of a process pool as uploads use it.
+
+    python -m bench.images [--repeat 3] [--workers 1 2 4] [--images DIR]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from bench.common import percentile
+
+SAMPLES = [
+    ("phone.jpg", (4000, 3000), "RGB"),
+    ("cutout.png", (2000, 2000), "RGBA"),
+    ("banner.webp", (2000, 1000), "RGB"),
+]
+
+def write_samples(directory: Path) -> list:
+    from PIL import Image
+
+    paths = []
+    for name, size, mode in SAMPLES:
+        bands = [
+            Image.linear_gradient("L").resize(size),
+            Image.radial_gradient("L").resize(size),
+            Image.effect_noise(size, 48),
+        ]
+        if mode == "RGBA":
+            bands.append(Image.radial_gradient("L").resize(size).point(lambda v: 255 - v))
+        path = directory / name
+        Image.merge(mode, bands).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+def variant_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.parent.glob(f"{path.stem}_*"))
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench.images")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--images", help="directory of .jpg/.jpeg/.png/.webp files; generated samples by default")
+    args = parser.parse_args()
+    from app.images import VARIANT_SOURCE_EXTENSIONS, generate_variants
+
+    directory = Path(tempfile.mkdtemp(prefix="bdtraders-bench-"))
+    try:
+        if args.images:
+            paths = []
+            for source in sorted(Path(args.images).iterdir()):
+                if source.suffix.lower() in VARIANT_SOURCE_EXTENSIONS:
+                    paths.append(Path(shutil.copy(source, directory)))
+        else:
+            paths = write_samples(directory)
+
+        print(f"{'image':<24} {'source KiB':>10} {'variants KiB':>12} {'p50 ms':>8} {'p99 ms':>8}")
+        for path in paths:
+            samples = [generate_variants(str(path)) for _ in range(args.repeat)]
+            print(f"{path.name:<24} {path.stat().st_size / 1024:>10.0f} {variant_bytes(path) / 1024:>12.0f} "
+                  f"{percentile(samples, 50) * 1000:>8.1f} {percentile(samples, 99) * 1000:>8.1f}")
+
+        # One file per job, as uploads have unique names; variants of one file
+        # written concurrently would share their .part names
+        jobs = [
+            shutil.copy(path, path.with_name(f"{path.stem}-{n}{path.suffix}"))
+            for n in range(args.repeat) for path in paths
+        ]
+        print(f"\n{'workers':>7} {'images/s':>9}   ({len(jobs)} images, {os.cpu_count()} CPUs)")
+        for workers in args.workers:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(generate_variants, jobs[:workers]))  # start the processes
+                started = time.perf_counter()
+                list(pool.map(generate_variants, jobs))
+                elapsed = time.perf_counter() - started
+            print(f"{workers:>7} {len(jobs) / elapsed:>9.2f}")
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Request latency under concurrency with DATABASE_ASYNC on and off.
+
+Runs the app in-process (no HTTP server) against one database, once per
+mode in a fresh interpreter since the mode is read at import. Each of
+--concurrency clients loops over a storefront mix: product listing and
+search uncached, plus one checkout in every ten requests. Failed
+requests (on SQLite, checkouts that hit "database is locked" under load)
+are counted, not retried.
+
+    python -m bench.latency [--requests 2000] [--concurrency 1 10 50] [--url URL]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from bench.common import configure, create_store, percentile
+
+BASE_DOMAIN = "bench.test"
+
+def seed(products: int) -> dict:
+    from sqlalchemy import insert
+    from app.database import SessionLocal, engine
+    from app.models import Product, Store
+
+    with SessionLocal() as session:
+        store_id = create_store(session)
+        subdomain = session.get(Store, store_id).subdomain
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [
+            {"store_id": store_id, "slug": f"p-{n}", "title": f"Cotton kurta {n}", "price": 100.0,
+             "stock": 1_000_000, "is_published": True}
+            for n in range(products)
+        ])
+    return {"host": f"{subdomain}.{BASE_DOMAIN}", "product_ids": list(range(1, products + 1))}
+
+async def run_mode(requests: int, concurrency: list, target: dict) -> list:
+    import httpx
+    from app.main import app
+
+    await app.router.startup()
+    results = []
+    try:
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            headers = {"host": target["host"]}
+            order = {
+                "customer_name": "Bench", "customer_phone": "01700000000", "shipping_address": "Dhaka",
+                "items": [{"product_id": target["product_ids"][0], "quantity": 1}],
+            }
+
+            async def one(n: int) -> tuple:
+                started = time.perf_counter()
+                if n % 10 == 9:
+                    response = await http.post("/api/orders", headers=headers, json=order)
+                elif n % 2:
+                    response = await http.get("/api/public/products/search?q=kurta&limit=20", headers=headers)
+                else:
+                    response = await http.get("/api/public/products?limit=20", headers=headers)
+                return time.perf_counter() - started, response.status_code >= 400
+
+            for clients in concurrency:
+                counter = iter(range(requests))
+                samples, errors = [], 0
+
+                async def client():
+                    nonlocal errors
+                    for n in counter:
+                        duration, failed = await one(n)
+                        samples.append(duration)
+                        errors += failed
+
+                started = time.perf_counter()
+                await asyncio.gather(*(client() for _ in range(clients)))
+                elapsed = time.perf_counter() - started
+                results.append({
+                    "concurrency": clients, "rps": requests / elapsed,
+                    "p50": percentile(samples, 50), "p99": percentile(samples, 99), "errors": errors,
+                })
+    finally:
+        await app.router.shutdown()
+    return results
+
+def child(args):
+    """Measure one mode in this process and print the results as JSON"""
+    configure(args.url, DATABASE_ASYNC=args.mode, BASE_DOMAIN=BASE_DOMAIN,
+              RESPONSE_CACHE_ENABLED="false", LOG_LEVEL="WARNING")
+    from app.database import init_db
+    from app.search import init_search
+    from app.database import engine
+
+    init_db()
+    init_search(engine)
+    target = seed(args.products)
+    print(json.dumps(asyncio.run(run_mode(args.requests, args.concurrency, target))))
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench.latency")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--url", help="database URL; a temporary SQLite file per mode by default")
+    parser.add_argument("--mode", choices=["true", "false"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode:
+        child(args)
+        return
+
+    print(f"{'mode':<6} {'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for mode, label in (("true", "async"), ("false", "sync")):
+        command = [
+            sys.executable, "-m", "bench.latency", "--mode", mode, "--requests", str(args.requests),
+            "--products", str(args.products), "--concurrency", *map(str, args.concurrency),
+        ]
+        if args.url:
+            command += ["--url", args.url]
+        output = subprocess.run(command, check=True, capture_output=True, text=True, env=os.environ).stdout
+        for row in json.loads(output.strip().splitlines()[-1]):
+            print(f"{label:<6} {row['concurrency']:>7} {row['rps']:>8.0f} "
+                  f"{row['p50'] * 1000:>8.2f} {row['p99'] * 1000:>8.2f} {row['errors']:>6}")
+
+if __name__ == "__main__":
+    main()
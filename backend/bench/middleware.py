@@ -0,0 +1,94 @@
+"""Per-request cost of the tenant middleware.
+
+Builds a minimal FastAPI app three ways: without tenant resolution, with
+TenantMiddleware, and with the same resolution behind
+@app.middleware("http") (BaseHTTPMiddleware) as it ran before. Each
+serves a small JSON response on a store host, /api/health (exempt from
+tenant resolution) and a --stream-mib streamed body, requested one after
+another through the ASGI interface. The store is cached after the first
+request, so this measures the middleware, not the database.
+
+    python -m bench.middleware [--seconds 2] [--stream-mib 16]
+"""
+import argparse
+import asyncio
+import time
+from bench.common import asgi_get, configure, create_store
+
+CHUNK = 64 * 1024
+
+def build(variant: str, stream_mib: int):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import StreamingResponse
+    from app.middleware import TENANT_EXEMPT_PREFIXES, TenantMiddleware, get_host, resolve_tenant
+
+    app = FastAPI()
+    if variant == "TenantMiddleware":
+        app.add_middleware(TenantMiddleware)
+    elif variant == "BaseHTTPMiddleware":
+        @app.middleware("http")
+        async def tenant(request: Request, call_next):
+            state = request.scope.setdefault("state", {})
+            if request.url.path.startswith(TENANT_EXEMPT_PREFIXES):
+                state.update(subdomain=None, tenant_id=None)
+            else:
+                state.update(await resolve_tenant(get_host(request.scope)))
+            return await call_next(request)
+
+    @app.get("/api/public/store")
+    async def store(request: Request):
+        return {"id": getattr(request.state, "tenant_id", None)}
+
+    @app.get("/api/health")
+    async def health():
+        return {"status": "healthy"}
+
+    @app.get("/api/download")
+    async def download():
+        async def chunks():
+            chunk = b"x" * CHUNK
+            for _ in range(stream_mib * 2 ** 20 // CHUNK):
+                yield chunk
+        return StreamingResponse(chunks())
+
+    return app
+
+async def rate(app, target: str, headers: dict, seconds: float) -> float:
+    """Sequential requests per second for about seconds"""
+    await asgi_get(app, target, headers)
+    count = 0
+    started = time.perf_counter()
+    while (elapsed := time.perf_counter() - started) < seconds:
+        status, _, _ = await asgi_get(app, target, headers)
+        if status != 200:
+            raise RuntimeError(f"{target} returned {status}")
+        count += 1
+    return count / elapsed
+
+async def run(seconds: float, stream_mib: int, headers: dict):
+    targets = [("/api/public/store", "JSON on store host"), ("/api/health", "/api/health"),
+               ("/api/download", f"{stream_mib} MiB stream")]
+    variants = ["none", "TenantMiddleware", "BaseHTTPMiddleware"]
+    apps = {variant: build(variant, stream_mib) for variant in variants}
+    print(f"{'request':<20}" + "".join(f"{variant:>20}" for variant in variants) + "   (req/s)")
+    for target, label in targets:
+        rates = [await rate(apps[variant], target, headers, seconds) for variant in variants]
+        print(f"{label:<20}" + "".join(f"{value:>20.0f}" for value in rates))
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench.middleware")
+    parser.add_argument("--seconds", type=float, default=2.0, help="time spent on each cell")
+    parser.add_argument("--stream-mib", type=int, default=16)
+    args = parser.parse_args()
+    configure(BASE_DOMAIN="bench.test", STORE_DOMAINS_REFRESH_SECONDS="3600")
+    from app import models  # registers the tables init_db creates
+    from app.database import SessionLocal, init_db
+    from app.models import Store
+
+    init_db()
+    with SessionLocal() as session:
+        subdomain = session.get(Store, create_store(session)).subdomain
+    asyncio.run(run(args.seconds, args.stream_mib, {"host": f"{subdomain}.bench.test"}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Insert throughput and unique index size of order number schemes.
+
+Compares the legacy ORD + 8 random hex chars + unix seconds numbers with
+the time-ordered IDs of app.ids, inserting into a table shaped like
+orders.order_number. Runs on a temporary SQLite file by default; pass
+--url to measure a PostgreSQL database instead (the table is dropped
+afterwards).
+
+    python -m bench.order_numbers [--rows 200000] [--batch 1000] [--url URL]
+"""
+import argparse
+import os
+import secrets
+import tempfile
+import time
+from datetime import datetime
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, insert, text
+from app.ids import IdGenerator
+
+def legacy_number() -> str:
+    return f"ORD{secrets.token_hex(4).upper()}{int(datetime.utcnow().timestamp())}"
+
+def snowflake_numbers():
+    generator = IdGenerator(worker_id=1)
+    return lambda: f"ORD{generator.next_id()}"
+
+def index_bytes(engine, table: str) -> int:
+    """Size of the order_number unique index"""
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(f"VACUUM ANALYZE {table}"))
+            return conn.scalar(text(
+                "SELECT pg_relation_size(indexrelid) FROM pg_index "
+                "WHERE indrelid = CAST(:table AS regclass) AND NOT indisprimary"
+            ), {"table": table})
+    with engine.connect() as conn:
+        return conn.scalar(
+            text("SELECT sum(pgsize) FROM dbstat WHERE name LIKE :pattern"),
+            {"pattern": f"sqlite_autoindex_{table}%"}
+        )
+
+def run(engine, scheme: str, make_number, rows: int, batch: int) -> dict:
+    metadata = MetaData()
+    table = Table(
+        f"bench_{scheme}", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("order_number", String(50), nullable=False, unique=True),
+    )
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    try:
+        started = time.perf_counter()
+        for offset in range(0, rows, batch):
+            with engine.begin() as conn:
+                conn.execute(insert(table), [{"order_number": make_number()} for _ in range(min(batch, rows - offset))])
+        elapsed = time.perf_counter() - started
+        size = index_bytes(engine, table.name)
+    finally:
+        metadata.drop_all(engine)
+    return {"scheme": scheme, "length": len(make_number()), "rows_per_second": rows / elapsed, "index_bytes": size}
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench.order_numbers")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--url", help="database URL; a temporary SQLite file by default")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_engine(url)
+    print(f"{'scheme':<10} {'chars':>5} {'rows/s':>10} {'index MiB':>10}")
+    for scheme, make_number in (("legacy", legacy_number), ("snowflake", snowflake_numbers())):
+        result = run(engine, scheme, make_number, args.rows, args.batch)
+        print(f"{result['scheme']:<10} {result['length']:>5} {result['rows_per_second']:>10.0f} "
+              f"{result['index_bytes'] / 2 ** 20:>10.2f}")
+
+if __name__ == "__main__":
+    main()
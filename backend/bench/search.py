@@ -0,0 +1,108 @@
+"""Product search latency at catalog scale.
+
+Seeds one store with --products products (100k by default) whose titles
+and descriptions mix English and Bangla words, then times search_products
+against a LIKE scan of the same columns, as the catalog was filtered
+before search existed.
+
+    python -m bench.search [--products 100000] [--repeat 20] [--url URL]
+"""
+import argparse
+import asyncio
+import random
+import time
+from bench.common import configure, create_store, percentile
+
+ENGLISH = (
+    "cotton silk linen kurta saree panjabi shirt lungi scarf shawl jamdani muslin blue red green "
+    "black white printed embroidered handloom premium classic summer winter festive casual"
+).split()
+BANGLA = "শাড়ি পাঞ্জাবি লুঙ্গি জামদানি সুতি রেশম লাল নীল সবুজ কালো সাদা নকশি হাতের কাজ উৎসব".split()
+SYLLABLES = "ka ri mo na shi to ra le vu do pa zi ne bo ha".split()
+# Brand/model words, each in about one title in 2000; ENGLISH and BANGLA
+# words match a large share of the catalog, the worst case for ranking
+BRANDS = sorted({"".join(random.Random(n).choices(SYLLABLES, k=4)) for n in range(50)})
+QUERIES = [
+    "kurta", "blue silk", "jamd", "embroidered saree", "শাড়ি", "জামদানি শাড়ি",
+    BRANDS[0], BRANDS[1][:5], f"{BRANDS[2]} cotton", "nomatchword",
+]
+
+def words(rng: random.Random, vocabulary: list, count: int) -> str:
+    return " ".join(rng.choice(vocabulary) for _ in range(count))
+
+def seed(store_id: int, products: int, batch: int = 5000):
+    from sqlalchemy import insert
+    from app.database import engine
+    from app.models import Product
+
+    rng = random.Random(15)
+    for offset in range(0, products, batch):
+        rows = [
+            {
+                "store_id": store_id, "slug": f"p-{n}", "price": 100.0, "stock": 10, "is_published": True,
+                "title": f"{rng.choice(BRANDS) if rng.random() < 0.025 else ''} {words(rng, ENGLISH, 3)}".strip(),
+                "title_bn": words(rng, BANGLA, 2),
+                "description": words(rng, ENGLISH, 25), "description_bn": words(rng, BANGLA, 15),
+            }
+            for n in range(offset, min(offset + batch, products))
+        ]
+        with engine.begin() as conn:
+            conn.execute(insert(Product), rows)
+
+async def time_queries(store_id: int, repeat: int) -> dict:
+    from sqlalchemy import or_, select
+    from app.database import db_session
+    from app.models import Product
+    from app.search import search_products
+
+    async def fts(db, q):
+        return (await search_products(db, store_id, q, 20, published_only=True))["items"]
+
+    async def like(db, q):
+        pattern = f"%{q}%"
+        return (await db.scalars(
+            select(Product).where(Product.store_id == store_id, Product.is_published == True, or_(
+                Product.title.ilike(pattern), Product.title_bn.ilike(pattern),
+                Product.description.ilike(pattern), Product.description_bn.ilike(pattern),
+            )).order_by(Product.id).limit(20)
+        )).all()
+
+    results = {}
+    async with db_session() as db:
+        for name, run in (("search", fts), ("like scan", like)):
+            for q in QUERIES:
+                samples = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    found = await run(db, q)
+                    samples.append(time.perf_counter() - started)
+                results[(name, q)] = (len(found), samples)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench.search")
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--url", help="database URL; a temporary SQLite file by default")
+    args = parser.parse_args()
+    configure(args.url)
+
+    from app.database import SessionLocal, engine, init_db
+    from app.search import init_search
+
+    init_db()
+    init_search(engine)
+    with SessionLocal() as session:
+        store_id = create_store(session)
+    started = time.perf_counter()
+    seed(store_id, args.products)
+    print(f"Seeded {args.products} products in {time.perf_counter() - started:.1f}s ({engine.dialect.name})")
+
+    results = asyncio.run(time_queries(store_id, args.repeat))
+    print(f"{'method':<10} {'query':<22} {'hits':>5} {'p50 ms':>8} {'p99 ms':>8}")
+    for (name, q), (hits, samples) in results.items():
+        print(f"{name:<10} {q:<22} {hits:>5} {percentile(samples, 50) * 1000:>8.2f} "
+              f"{percentile(samples, 99) * 1000:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Slug allocation when a store repeats one title many times.
+
+Creates --products products titled alike through POST /api/products,
+from --clients concurrent clients, and reports the create latency per
+slice of the run: each create scans the slugs already taken for the
+title, so later creates see a longer list. Then imports the same number
+of rows in one file into a second store. Conflicts (409) are counted.
+
+    python -m bench.slugs [--products 10000] [--clients 1] [--slices 5] [--url URL]
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from bench.common import configure, percentile
+
+TITLE = "Cotton kurta"
+AUTH = {"Authorization": "Bearer dev-token-bench"}
+
+async def run(products: int, clients: int, slices: int):
+    import httpx
+    from app.main import app
+
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+            async def new_store() -> dict:
+                subdomain = f"bench{uuid.uuid4().hex[:12]}"
+                response = await http.post("/api/stores", headers=AUTH, json={"name": "Bench", "subdomain": subdomain})
+                response.raise_for_status()
+                return dict(AUTH, host=f"{subdomain}.bench.test")
+
+            headers = await new_store()
+            counter = iter(range(products))
+            samples = [None] * products
+            conflicts = 0
+
+            async def client():
+                nonlocal conflicts
+                for n in counter:
+                    started = time.perf_counter()
+                    response = await http.post("/api/products", headers=headers, json={"title": TITLE, "price": 100.0})
+                    samples[n] = time.perf_counter() - started
+                    if response.status_code == 409:
+                        conflicts += 1
+                    elif response.status_code != 201:
+                        response.raise_for_status()
+
+            started = time.perf_counter()
+            await asyncio.gather(*(client() for _ in range(clients)))
+            elapsed = time.perf_counter() - started
+            print(f"POST /api/products: {products} creates in {elapsed:.1f}s "
+                  f"({products / elapsed:.0f}/s, {clients} clients, {conflicts} conflicts)")
+            print(f"{'creates':<14} {'p50 ms':>8} {'p99 ms':>8}")
+            size = -(-products // slices)
+            for offset in range(0, products, size):
+                chunk = samples[offset:offset + size]
+                print(f"{offset + 1:>6}-{offset + len(chunk):<7} {percentile(chunk, 50) * 1000:>8.2f} "
+                      f"{percentile(chunk, 99) * 1000:>8.2f}")
+
+            headers = await new_store()
+            body = "".join(json.dumps({"title": TITLE, "price": 100.0}) + "\n" for _ in range(products))
+            started = time.perf_counter()
+            response = await http.post("/api/products/import", headers=headers,
+                                       files={"file": ("items.jsonl", body.encode(), "application/x-ndjson")})
+            response.raise_for_status()
+            elapsed = time.perf_counter() - started
+            print(f"POST /api/products/import: {response.json()['created']} rows in {elapsed:.1f}s "
+                  f"({products / elapsed:.0f} rows/s)")
+    finally:
+        await app.router.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench.slugs")
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--clients", type=int, default=1)
+    parser.add_argument("--slices", type=int, default=5, help="latency rows to report, in creation order")
+    parser.add_argument("--url", help="database URL; a temporary SQLite file by default")
+    args = parser.parse_args()
+    configure(args.url, BASE_DOMAIN="bench.test", LOG_LEVEL="WARNING")
+    asyncio.run(run(args.products, args.clients, args.slices))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import os
+import tempfile
+import uuid
+
+# Settings are read at import time, so configure before anything imports app
+_tmp = tempfile.mkdtemp(prefix="bdtraders-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/test.db")
+os.environ["UPLOAD_DIR"] = os.path.join(_tmp, "uploads")
+os.environ["BASE_DOMAIN"] = "example.com"
+os.environ["OUTBOX_WORKER_ENABLED"] = "false"
+os.environ["RESPONSE_CACHE_REDIS"] = "false"
+os.environ["OTP_BACKEND"] = "memory"
+
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+
+AUTH = {"Authorization": "Bearer dev-token-tests"}
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def store(client):
+    """A new store owned by the dev user; returns (store json, owner headers)"""
+    subdomain = f"s{uuid.uuid4().hex[:12]}"
+    response = client.post("/api/stores", json={"name": "Test", "subdomain": subdomain}, headers=AUTH)
+    assert response.status_code == 201, response.text
+    return response.json(), dict(AUTH, host=f"{subdomain}.example.com")
+
+@pytest.fixture
+def product(client, store):
+    """Factory for published products in the store fixture's store"""
+    _, headers = store
+
+    def make(stock: int = 10, price: float = 100.0, **fields):
+        response = client.post("/api/products", headers=headers, json={
+            "title": f"Product {uuid.uuid4().hex[:8]}", "price": price,
+            "stock": stock, "is_published": True, **fields,
+        })
+        assert response.status_code == 201, response.text
+        return response.json()
+
+    return make
@@ -0,0 +1,81 @@
+import sqlite3
+import threading
+import time
+import pytest
+from sqlalchemy import exc, inspect, select, text
+from sqlalchemy.pool import QueuePool
+from app.database import PoolMetrics, SessionLocal, engine, init_db, metered
+from app.models import Product
+
+def test_init_db_renames_duplicate_slugs_before_adding_unique_index(client, store):
+    store_json, _ = store
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_products_store_slug"))
+    with SessionLocal() as db:
+        for slug in ("shirt", "shirt", "shirt-1", "shirt", "pants"):
+            db.add(Product(store_id=store_json["id"], title="Item", slug=slug, price=10.0))
+        db.commit()
+
+    init_db()
+
+    with SessionLocal() as db:
+        slugs = db.scalars(
+            select(Product.slug).where(Product.store_id == store_json["id"]).order_by(Product.id)
+        ).all()
+    assert slugs == ["shirt", "shirt-2", "shirt-1", "shirt-3", "pants"]
+    indexes = {index["name"]: index for index in inspect(engine).get_indexes("products")}
+    assert indexes["ix_products_store_slug"]["unique"]
+
+def metered_pool(metrics: PoolMetrics, connect_delay: float = 0.0, **kwargs):
+    def creator():
+        time.sleep(connect_delay)
+        return sqlite3.connect(":memory:", check_same_thread=False)
+    return metered(QueuePool, metrics)(creator, **{"pool_size": 1, "max_overflow": 0, **kwargs})
+
+def test_checkout_wait_excludes_opening_connections():
+    metrics = PoolMetrics()
+    pool = metered_pool(metrics, connect_delay=0.1)
+    pool.connect().close()
+    pool.connect().close()
+    stats = metrics.snapshot()
+    assert stats["checkouts"] == 2
+    assert stats["wait_seconds_total"] < 0.05
+
+def test_checkout_wait_times_waiting_for_a_free_connection():
+    metrics = PoolMetrics()
+    pool = metered_pool(metrics)
+    held = pool.connect()
+    waiter = threading.Thread(target=lambda: pool.connect().close())
+    waiter.start()
+    time.sleep(0.2)
+    held.close()
+    waiter.join()
+    stats = metrics.snapshot()
+    assert stats["checkouts"] == 2
+    assert stats["wait_seconds_total"] >= 0.15
+
+def test_checkout_timeouts_are_counted():
+    metrics = PoolMetrics()
+    pool = metered_pool(metrics, timeout=0.05)
+    held = pool.connect()
+    with pytest.raises(exc.TimeoutError):
+        pool.connect()
+    held.close()
+    assert metrics.snapshot()["timeouts"] == 1
+
+def test_pool_metrics_count_every_checkout_across_threads():
+    metrics = PoolMetrics()
+    pool = metered_pool(metrics, pool_size=4)
+
+    def check_out():
+        for _ in range(500):
+            pool.connect().close()
+
+    threads = [threading.Thread(target=check_out) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = metrics.snapshot()
+    assert stats["checkouts"] == 4000
+    assert sum(stats["wait_counts"]) == 4000
@@ -0,0 +1,136 @@
+"""Property-style checks of HostResolver over seeded random hosts"""
+import random
+import string
+import pytest
+from app.middleware import HostResolver, RESERVED_SUBDOMAINS
+
+BASE_DOMAINS = ["example.com", "shop.example.co.uk", "localhost"]
+LABEL_CHARS = string.ascii_lowercase + string.digits
+SEEDS = range(20)
+
+def legacy_tenant(host: str, base_domain: str):
+    """The parser HostResolver replaced, kept as an oracle for the cases it got right"""
+    host = host.split(':')[0]
+    host = host.replace('www.', '')
+    if host.endswith(base_domain):
+        subdomain = host.replace(f'.{base_domain}', '').replace(base_domain, '')
+        if subdomain and subdomain != 'api' and subdomain != 'admin':
+            return subdomain
+    return None
+
+def random_label(rng: random.Random) -> str:
+    """A valid DNS label that is not reserved"""
+    while True:
+        label = rng.choice(LABEL_CHARS)
+        if rng.random() < 0.9:
+            middle = "".join(rng.choice(LABEL_CHARS + "-") for _ in range(rng.randint(0, 20)))
+            label += middle + rng.choice(LABEL_CHARS)
+        if label not in RESERVED_SUBDOMAINS:
+            return label
+
+def random_case(rng: random.Random, value: str) -> str:
+    return "".join(char.upper() if rng.random() < 0.5 else char for char in value)
+
+def decorate(rng: random.Random, host: str) -> str:
+    """Same host as a browser or proxy may send it: any case, www., port, trailing dot"""
+    if rng.random() < 0.3:
+        host = "www." + host
+    if rng.random() < 0.3:
+        host += "."
+    if rng.random() < 0.5:
+        host += f":{rng.randint(1, 65535)}"
+    return random_case(rng, host)
+
+@pytest.mark.parametrize("base_domain", BASE_DOMAINS)
+@pytest.mark.parametrize("seed", SEEDS)
+def test_subdomains_resolve_regardless_of_case_port_www_and_trailing_dot(base_domain, seed):
+    rng = random.Random(seed)
+    resolver = HostResolver(base_domain, max_hosts=1000)
+    for _ in range(50):
+        label = random_label(rng)
+        assert resolver.resolve(decorate(rng, f"{label}.{base_domain}")) == label
+
+@pytest.mark.parametrize("base_domain", BASE_DOMAINS)
+@pytest.mark.parametrize("seed", SEEDS)
+def test_matches_legacy_parser_where_it_was_correct(base_domain, seed):
+    # Lowercase single-label subdomains, with or without www. and a port;
+    # the legacy parser dropped "www." anywhere, so labels ending in www differ
+    rng = random.Random(seed)
+    resolver = HostResolver(base_domain, max_hosts=1000)
+    for _ in range(50):
+        label = random_label(rng)
+        if label.endswith("www"):
+            continue
+        host = f"{label}.{base_domain}"
+        if rng.random() < 0.3:
+            host = "www." + host
+        if rng.random() < 0.5:
+            host += f":{rng.randint(1, 65535)}"
+        assert resolver.resolve(host) == legacy_tenant(host, base_domain)
+    for host in (base_domain, f"www.{base_domain}", f"api.{base_domain}", f"admin.{base_domain}:8000"):
+        assert resolver.resolve(host) is None
+        assert legacy_tenant(host, base_domain) is None
+
+@pytest.mark.parametrize("base_domain", BASE_DOMAINS)
+@pytest.mark.parametrize("seed", SEEDS)
+def test_base_domain_reserved_and_unknown_hosts_have_no_tenant(base_domain, seed):
+    rng = random.Random(seed)
+    resolver = HostResolver(base_domain, max_hosts=1000)
+    label = random_label(rng)
+    hosts = [
+        base_domain,
+        *(f"{reserved}.{base_domain}" for reserved in RESERVED_SUBDOMAINS),
+        # Unknown domains, including ones the legacy suffix check accepted
+        f"{label}.{random_label(rng)}.test",
+        f"{label}{base_domain}",
+        f"{label}.{random_label(rng)}.{base_domain}",
+        f"{base_domain}.{label}.test",
+        f"-{label}.{base_domain}",
+        f"{label}_x.{base_domain}",
+        "127.0.0.1:8000",
+        "[::1]:8000",
+        "",
+    ]
+    for host in hosts:
+        assert resolver.resolve(decorate(rng, host) if host else host) is None, host
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_custom_domains_resolve_to_their_store(seed):
+    rng = random.Random(seed)
+    resolver = HostResolver("example.com", max_hosts=1000)
+    domains = {f"{random_label(rng)}.{rng.choice(['com', 'shop', 'com.bd'])}": random_label(rng) for _ in range(20)}
+    resolver.set_domains(domains)
+    for domain, subdomain in domains.items():
+        assert resolver.resolve(decorate(rng, domain)) == subdomain
+    # Subdomains of a custom domain are not the store
+    for domain in domains:
+        assert resolver.resolve(f"{random_label(rng)}.{domain}") is None
+
+def test_labels_ending_in_www_keep_it():
+    resolver = HostResolver("example.com", max_hosts=1000)
+    assert resolver.resolve("shopwww.example.com") == "shopwww"
+    assert legacy_tenant("shopwww.example.com", "example.com") == "shop"
+
+def test_set_domains_clears_memoized_results():
+    resolver = HostResolver("example.com", max_hosts=1000)
+    assert resolver.resolve("shop.test") is None
+    resolver.set_domains({"shop.test": "shop"})
+    assert resolver.resolve("shop.test") == "shop"
+    resolver.set_domains({})
+    assert resolver.resolve("shop.test") is None
+
+def test_memo_is_bounded():
+    resolver = HostResolver("example.com", max_hosts=10)
+    for n in range(100):
+        assert resolver.resolve(f"store{n}.example.com") == f"store{n}"
+    assert len(resolver.hosts) == 10
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_memo_is_keyed_on_the_normalized_host(seed):
+    # Random ports or letter case must not fill the memo with one store's host
+    rng = random.Random(seed)
+    resolver = HostResolver("example.com", max_hosts=10)
+    for _ in range(100):
+        assert resolver.resolve(decorate(rng, "shop.example.com")) == "shop"
+    assert list(resolver.hosts) == ["shop.example.com"]
+    assert resolver.resolve("other.example.com") == "other"
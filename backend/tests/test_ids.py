@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import select, update
+from app.database import SessionLocal
+from app.ids import (
+    IdGenerator, MAX_WORKERS, WorkerNumberUnavailable, order_ids, claim_worker_number, release_worker_lease, renew_worker_lease,
+)
+from app.models import Product, WorkerLease
+
+def set_expiry(numbers, expires_at):
+    with SessionLocal() as session:
+        session.execute(
+            update(WorkerLease).where(WorkerLease.number.in_(numbers)).values(expires_at=expires_at)
+        )
+        session.commit()
+
+def test_live_leases_get_distinct_numbers_and_released_ones_are_reused(client):
+    first = claim_worker_number("a" * 32)
+    second = claim_worker_number("b" * 32)
+    assert first != second
+    assert 0 <= first < MAX_WORKERS and 0 <= second < MAX_WORKERS
+
+    release_worker_lease(first, "a" * 32)
+    assert claim_worker_number("c" * 32) == first
+    release_worker_lease(first, "c" * 32)
+    release_worker_lease(second, "b" * 32)
+
+def test_expired_lease_is_reclaimed_and_old_holder_cannot_renew(client):
+    number = claim_worker_number("d" * 32)
+    set_expiry([number], datetime.now(timezone.utc) - timedelta(seconds=1))
+
+    assert claim_worker_number("e" * 32) == number
+    assert not renew_worker_lease(number, "d" * 32)
+    assert renew_worker_lease(number, "e" * 32)
+    release_worker_lease(number, "e" * 32)
+
+def test_claim_fails_instead_of_wrapping_when_all_numbers_are_leased(client):
+    with SessionLocal() as session:
+        saved = dict(session.execute(select(WorkerLease.number, WorkerLease.expires_at)).all())
+    set_expiry(list(range(MAX_WORKERS)), datetime.now(timezone.utc) + timedelta(hours=1))
+    try:
+        with pytest.raises(RuntimeError, match="leased"):
+            claim_worker_number("f" * 32)
+    finally:
+        with SessionLocal() as session:
+            for number, expires_at in saved.items():
+                session.execute(
+                    update(WorkerLease).where(WorkerLease.number == number).values(expires_at=expires_at)
+                )
+            session.commit()
+
+def test_generator_fails_fast_without_a_valid_lease(client):
+    generator = IdGenerator()
+    with pytest.raises(WorkerNumberUnavailable):
+        generator.next_id()
+    generator.maintain()
+    generator.next_id()
+    # A lease that may have expired unrenewed is not used
+    generator._lease_deadline = 0.0
+    with pytest.raises(WorkerNumberUnavailable):
+        generator.next_id()
+    generator.maintain()
+    generator.next_id()
+    asyncio.run(generator.stop())
+
+def test_generator_leases_again_after_losing_its_number(client):
+    generator = IdGenerator()
+    generator.maintain()
+    lost = generator.worker_id
+    # Another process takes the number after the lease expired
+    set_expiry([lost], datetime.now(timezone.utc) - timedelta(seconds=1))
+    claim_worker_number("g" * 32)
+
+    generator.maintain()
+    assert generator.worker_id not in (None, lost)
+    generator.next_id()
+    release_worker_lease(lost, "g" * 32)
+    asyncio.run(generator.stop())
+
+def test_ids_are_unique_and_time_ordered():
+    generator = IdGenerator(worker_id=7)
+    ids = [generator.next_id() for _ in range(10000)]
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+    assert all(len(value) == 13 for value in ids)
+
+def test_checkout_is_refused_while_no_worker_number_is_leased(client, store, product, monkeypatch):
+    _, headers = store
+    item = product(stock=3)
+    monkeypatch.setattr(order_ids, "_lease_deadline", 0.0)
+    response = client.post("/api/orders", headers={"host": headers["host"]}, json={
+        "customer_name": "Customer", "customer_phone": "01700000000", "shipping_address": "Dhaka",
+        "items": [{"product_id": item["id"], "quantity": 1}],
+    })
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    with SessionLocal() as session:
+        assert session.get(Product, item["id"]).stock == 3
@@ -0,0 +1,187 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import httpx
+import pytest
+from sqlalchemy import delete, func, select
+from app.analytics import backfill_if_empty, check
+from app.database import SessionLocal
+from app.main import app
+from app.metrics import request_metrics
+from app.models import Order, OrderItem, Product, ProductDailyStats, StoreDailyStats
+from app.routers import orders as orders_router
+
+def insert_orders(store_id: int, product: dict, count: int):
+    """Bulk insert orders with two items each, bypassing the API for speed"""
+    now = datetime.now(timezone.utc)
+    with SessionLocal() as session:
+        for n in range(count):
+            session.add(Order(
+                store_id=store_id, order_number=f"T{store_id}-{n}",
+                customer_name="c", customer_phone="017", shipping_address="x",
+                subtotal=200.0, total=200.0, created_at=now - timedelta(seconds=n),
+                items=[
+                    OrderItem(product_id=product["id"], product_title=product["title"],
+                              quantity=1, price=100.0, total=100.0)
+                    for _ in range(2)
+                ],
+            ))
+        session.commit()
+
+def statements_for(client, path: str, headers: dict) -> tuple:
+    """(SQL statements issued by one GET, response json), read from the per-request metric"""
+    series = request_metrics.statements.series
+    key = ("GET", path.split("?")[0])
+    before = series[key][1] if key in series else 0
+    response = client.get(path, headers=headers)
+    assert response.status_code == 200, response.text
+    return series[key][1] - before, response.json()
+
+def test_order_listing_statement_count_is_constant(client, store, product):
+    store_json, headers = store
+    insert_orders(store_json["id"], product(), 200)
+    # Warm the store and user caches so only the listing itself is counted
+    client.get("/api/orders?limit=1", headers=headers)
+
+    small, page = statements_for(client, "/api/orders?limit=10", headers)
+    large, page = statements_for(client, "/api/orders?limit=200", headers)
+    assert len(page["items"]) == 200
+    assert all(len(order["items"]) == 2 for order in page["items"])
+    assert large <= 3
+    assert large == small
+
+async def checkout_concurrently(host: str, product_id: int, attempts: int) -> list:
+    """POST attempts single-unit orders at once; return their status codes"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        responses = await asyncio.gather(*(
+            http.post("/api/orders", headers={"host": host}, json={
+                "customer_name": f"Customer {n}", "customer_phone": "01700000000",
+                "shipping_address": "Dhaka", "items": [{"product_id": product_id, "quantity": 1}],
+            })
+            for n in range(attempts)
+        ))
+    return [response.status_code for response in responses]
+
+@pytest.mark.parametrize("stock, attempts", [(1, 10), (5, 20), (50, 300)])
+def test_concurrent_checkouts_never_oversell(client, store, product, stock, attempts):
+    _, headers = store
+    item = product(stock=stock)
+
+    codes = asyncio.run(checkout_concurrently(headers["host"], item["id"], attempts))
+
+    assert codes.count(201) == stock
+    assert codes.count(400) == attempts - stock
+    with SessionLocal() as session:
+        assert session.get(Product, item["id"]).stock == 0
+        assert session.scalar(
+            select(func.count()).select_from(OrderItem).where(OrderItem.product_id == item["id"])
+        ) == stock
+
+async def update_status_concurrently(headers: dict, order_id: int, statuses: list) -> list:
+    """PUT each status to the order at once; return their status codes"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        responses = await asyncio.gather(*(
+            http.put(f"/api/orders/{order_id}", headers=headers, json={"status": new_status})
+            for new_status in statuses
+        ))
+    return [response.status_code for response in responses]
+
+def test_concurrent_status_changes_keep_rollups_consistent(client, store, product):
+    store_json, headers = store
+    item = product(stock=5)
+    response = client.post("/api/orders", headers={"host": headers["host"]}, json={
+        "customer_name": "Customer", "customer_phone": "01700000000",
+        "shipping_address": "Dhaka", "items": [{"product_id": item["id"], "quantity": 1}],
+    })
+    assert response.status_code == 201, response.text
+    order_id = response.json()["id"]
+
+    statuses = ["confirmed", "cancelled", "processing", "shipped", "delivered"]
+    codes = asyncio.run(update_status_concurrently(headers, order_id, statuses))
+
+    assert set(codes) <= {200, 409} and 200 in codes
+    with SessionLocal() as session:
+        final_status = session.get(Order, order_id).status
+        rollups = dict(session.execute(
+            select(StoreDailyStats.status, func.sum(StoreDailyStats.orders))
+            .where(StoreDailyStats.store_id == store_json["id"])
+            .group_by(StoreDailyStats.status)
+        ).all())
+    assert {status: count for status, count in rollups.items() if count} == {final_status: 1}
+
+def test_status_update_keeps_notes_and_returns_new_status(client, store, product):
+    _, headers = store
+    item = product(stock=5)
+    order = client.post("/api/orders", headers={"host": headers["host"]}, json={
+        "customer_name": "Customer", "customer_phone": "01700000000",
+        "shipping_address": "Dhaka", "items": [{"product_id": item["id"], "quantity": 1}],
+    }).json()
+
+    response = client.put(f"/api/orders/{order['id']}", headers=headers,
+                          json={"status": "confirmed", "notes": "Call first"})
+    assert response.status_code == 200, response.text
+    assert response.json()["status"] == "confirmed"
+    assert response.json()["notes"] == "Call first"
+
+def place_order(client, host: str, items: list) -> dict:
+    response = client.post("/api/orders", headers={"host": host}, json={
+        "customer_name": "Customer", "customer_phone": "01700000000", "shipping_address": "Dhaka",
+        "items": [{"product_id": product_id, "quantity": quantity} for product_id, quantity in items],
+    })
+    assert response.status_code == 201, response.text
+    return response.json()
+
+def frozen_datetime(moment: datetime):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return moment.astimezone(tz) if tz else moment.replace(tzinfo=None)
+    return FrozenDatetime
+
+def test_rollups_match_full_recompute_after_status_changes(client, store, product, monkeypatch):
+    store_json, headers = store
+    products = [product(stock=100, price=price)["id"] for price in (100.0, 250.0, 40.0)]
+    now = datetime.now(timezone.utc)
+    placed = []
+    for days_ago in (9, 3, 1, 0):
+        monkeypatch.setattr(orders_router, "datetime", frozen_datetime(now - timedelta(days=days_ago)))
+        placed.append(place_order(client, headers["host"], [(products[0], 1), (products[1], 2)]))
+        placed.append(place_order(client, headers["host"], [(products[2], 3)]))
+    monkeypatch.undo()
+
+    for order, statuses in zip(placed, [
+        ["confirmed", "shipped", "delivered"], ["cancelled"], ["confirmed", "cancelled"],
+        ["processing"], ["cancelled", "pending"], [], ["shipped"], ["confirmed", "confirmed"],
+    ]):
+        for new_status in statuses:
+            response = client.put(f"/api/orders/{order['id']}", headers=headers, json={"status": new_status})
+            assert response.status_code == 200, response.text
+
+    with SessionLocal() as session:
+        assert check(session, store_json["id"]) == []
+        days = session.scalars(
+            select(StoreDailyStats.day).where(StoreDailyStats.store_id == store_json["id"]).distinct()
+        ).all()
+    assert len(days) == 4
+
+def test_first_startup_builds_rollups_for_existing_orders(client, store, product):
+    store_json, headers = store
+    item = product()
+    with SessionLocal() as session:
+        session.execute(delete(StoreDailyStats))
+        session.execute(delete(ProductDailyStats))
+        session.commit()
+    # Orders from before the rollups existed
+    insert_orders(store_json["id"], item, 5)
+
+    backfill_if_empty()
+
+    with SessionLocal() as session:
+        assert check(session) == []
+        order_id = session.scalar(select(Order.id).where(Order.store_id == store_json["id"]).limit(1))
+    response = client.put(f"/api/orders/{order_id}", headers=headers, json={"status": "cancelled"})
+    assert response.status_code == 200, response.text
+    with SessionLocal() as session:
+        assert check(session, store_json["id"]) == []
+        assert session.scalar(select(func.min(StoreDailyStats.orders))) >= 0
@@ -0,0 +1,74 @@
+import asyncio
+import fakeredis
+import pytest
+from app.otp_store import OTPStore, MemoryOTPStore, RedisOTPStore
+
+def test_incomplete_backend_fails_at_instantiation():
+    class SaveOnly(OTPStore):
+        async def save(self, phone, otp, ttl):
+            pass
+
+    with pytest.raises(TypeError):
+        SaveOnly()
+
+def test_memory_store_consumes_once_and_rate_limits():
+    store = MemoryOTPStore()
+
+    async def scenario():
+        await store.save("017", "123456", ttl=60)
+        assert not await store.consume("017", "000000")
+        assert await store.consume("017", "123456")
+        assert not await store.consume("017", "123456")
+        hits = [await store.hit_rate_limit("018", limit=2, window=60) for _ in range(3)]
+        assert hits == [False, False, True]
+
+    asyncio.run(scenario())
+
+@pytest.fixture
+def redis_store():
+    client = fakeredis.FakeAsyncRedis()
+    return client, RedisOTPStore(client, prefix="test-otp")
+
+def test_redis_store_saves_with_ttl_and_replaces_codes(redis_store):
+    client, store = redis_store
+
+    async def scenario():
+        await store.save("017", "111111", ttl=300)
+        assert await client.get("test-otp:code:017") == b"111111"
+        assert 0 < await client.ttl("test-otp:code:017") <= 300
+        await store.save("017", "222222", ttl=300)
+        assert not await store.consume("017", "111111")
+        assert await store.consume("017", "222222")
+
+    asyncio.run(scenario())
+
+def test_redis_store_consumes_once_and_keeps_code_on_wrong_guess(redis_store):
+    client, store = redis_store
+
+    async def scenario():
+        await store.save("017", "123456", ttl=60)
+        assert not await store.consume("017", "000000")
+        assert await client.exists("test-otp:code:017")
+        assert await store.consume("017", "123456")
+        assert not await store.consume("017", "123456")
+        assert not await client.exists("test-otp:code:017")
+        assert not await store.consume("019", "123456")
+
+    asyncio.run(scenario())
+
+def test_redis_store_rate_limit_window_is_not_extended_by_requests(redis_store):
+    client, store = redis_store
+
+    async def scenario():
+        hits = [await store.hit_rate_limit("018", limit=2, window=60) for _ in range(3)]
+        assert hits == [False, False, True]
+        assert 0 < await client.ttl("test-otp:rate:018") <= 60
+        # The window is set by the first request only
+        await client.expire("test-otp:rate:018", 5)
+        await store.hit_rate_limit("018", limit=2, window=60)
+        assert await client.ttl("test-otp:rate:018") <= 5
+        # A new window starts once the counter expires
+        await client.delete("test-otp:rate:018")
+        assert not await store.hit_rate_limit("018", limit=2, window=60)
+
+    asyncio.run(scenario())
@@ -0,0 +1,119 @@
+import asyncio
+import json
+from datetime import timedelta
+import httpx
+import pytest
+from sqlalchemy import delete, select, update
+from app import notifications
+from app.config import settings
+from app.database import SessionLocal
+from app.models import OutboxEvent, OutboxStatus
+from app.outbox import OutboxWorker, enqueue, retry_delay, utcnow
+
+@pytest.fixture
+def outbox(client, monkeypatch):
+    """Empty outbox; returns the requests received by a stand-in for the remote APIs"""
+    with SessionLocal() as session:
+        session.execute(delete(OutboxEvent))
+        session.commit()
+    monkeypatch.setattr(settings, "WHATSAPP_API_URL", "http://whatsapp.test/send")
+    monkeypatch.setattr(settings, "META_GRAPH_API_URL", "http://graph.test")
+    monkeypatch.setattr(settings, "META_ACCESS_TOKEN", "token")
+    received = []
+    responses = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        received.append(request)
+        return responses.pop(0) if responses else httpx.Response(200, json={})
+
+    monkeypatch.setattr(notifications, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    yield received, responses
+    monkeypatch.setattr(notifications, "_http_client", None)
+
+def add_events(events: list):
+    with SessionLocal() as session:
+        enqueue(session, events)
+        session.commit()
+
+def process_batch() -> int:
+    async def run():
+        return await OutboxWorker().process_batch()
+    return asyncio.run(run())
+
+def outbox_events() -> list:
+    with SessionLocal() as session:
+        return session.scalars(select(OutboxEvent).order_by(OutboxEvent.id)).all()
+
+def make_due():
+    with SessionLocal() as session:
+        session.execute(update(OutboxEvent).values(available_at=utcnow() - timedelta(seconds=1)))
+        session.commit()
+
+def test_failed_send_is_retried_with_backoff_and_then_sent(outbox):
+    received, responses = outbox
+    responses.append(httpx.Response(503))
+    add_events([("whatsapp", {"to": "8801700000000", "message": "hi"})])
+
+    before = utcnow()
+    assert process_batch() == 1
+    [event] = outbox_events()
+    assert event.status == OutboxStatus.PENDING
+    assert event.attempts == 1
+    assert "503" in event.last_error
+    available_at = event.available_at.replace(tzinfo=before.tzinfo)
+    assert before + retry_delay(1) <= available_at <= utcnow() + retry_delay(1)
+    # Not due yet: nothing is claimed
+    assert process_batch() == 0
+
+    make_due()
+    assert process_batch() == 1
+    [event] = outbox_events()
+    assert event.status == OutboxStatus.SENT
+    assert event.attempts == 2
+    assert event.last_error is None
+    assert len(received) == 2
+
+def test_event_fails_permanently_after_max_attempts(outbox, monkeypatch):
+    _, responses = outbox
+    monkeypatch.setattr(settings, "OUTBOX_MAX_ATTEMPTS", 2)
+    responses.extend([httpx.Response(500), httpx.Response(500)])
+    add_events([("whatsapp", {"to": "8801700000000", "message": "hi"})])
+
+    process_batch()
+    make_due()
+    process_batch()
+    [event] = outbox_events()
+    assert event.status == OutboxStatus.FAILED
+    assert event.processed_at is not None
+
+def test_retry_delay_doubles_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(settings, "OUTBOX_RETRY_BASE_SECONDS", 5)
+    monkeypatch.setattr(settings, "OUTBOX_RETRY_MAX_SECONDS", 60)
+    assert [retry_delay(n).total_seconds() for n in range(1, 6)] == [5, 10, 20, 40, 60]
+
+def test_conversions_api_events_are_sent_in_one_call_per_pixel(outbox):
+    received, _ = outbox
+    add_events(
+        [("meta_capi", {"pixel_id": "111", "event": {"event_id": f"a{n}"}}) for n in range(3)]
+        + [("meta_capi", {"pixel_id": "222", "event": {"event_id": f"b{n}"}}) for n in range(2)]
+        + [("whatsapp", {"to": "8801700000000", "message": "hi"})]
+    )
+
+    assert process_batch() == 6
+    assert all(event.status == OutboxStatus.SENT for event in outbox_events())
+    calls = {request.url.path: json.loads(request.content) for request in received}
+    assert len(received) == 3
+    assert [e["event_id"] for e in calls["/111/events"]["data"]] == ["a0", "a1", "a2"]
+    assert [e["event_id"] for e in calls["/222/events"]["data"]] == ["b0", "b1"]
+    assert calls["/111/events"]["access_token"] == "token"
+
+def test_failed_batch_call_retries_every_event_in_it(outbox):
+    _, responses = outbox
+    responses.append(httpx.Response(500))
+    add_events([("meta_capi", {"pixel_id": "111", "event": {"event_id": f"a{n}"}}) for n in range(2)])
+
+    process_batch()
+    assert [(e.status, e.attempts) for e in outbox_events()] == [(OutboxStatus.PENDING, 1)] * 2
+    make_due()
+    process_batch()
+    assert [(e.status, e.attempts) for e in outbox_events()] == [(OutboxStatus.SENT, 2)] * 2
@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+from app.database import engine
+from app.routers import products as products_router
+
+@pytest.fixture
+def unique_price(store):
+    """Unique prices in the store fixture's store, a constraint other than the slug index to violate"""
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            f"CREATE UNIQUE INDEX ix_test_products_price ON products (price) WHERE store_id = {store[0]['id']}"
+        )
+    yield
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_test_products_price")
+
+def test_create_product_retries_when_a_concurrent_create_takes_the_slug(client, store, product, monkeypatch):
+    _, headers = store
+    first = product(title="Blue kurta")
+    allocate_slugs = products_router.allocate_slugs
+    calls = []
+
+    async def stale_allocate(db, store_id, titles):
+        # The first attempt sees the slug table from before the other create
+        calls.append(titles)
+        return ["blue-kurta"] if len(calls) == 1 else await allocate_slugs(db, store_id, titles)
+
+    monkeypatch.setattr(products_router, "allocate_slugs", stale_allocate)
+    response = client.post("/api/products", headers=headers, json={"title": "Blue kurta", "price": 120.0})
+    assert response.status_code == 201, response.text
+    assert first["slug"] == "blue-kurta"
+    assert response.json()["slug"] == "blue-kurta-1"
+    assert len(calls) == 2
+
+def test_create_product_raises_other_integrity_errors(client, store, product, unique_price):
+    _, headers = store
+    product(price=100.0)
+    with pytest.raises(IntegrityError, match="products.price"):
+        client.post("/api/products", headers=headers, json={"title": "Other", "price": 100.0})
+
+def test_import_raises_other_integrity_errors(client, store, unique_price):
+    _, headers = store
+    body = b'{"title": "A", "price": 10}\n{"title": "B", "price": 10}\n'
+    with pytest.raises(IntegrityError, match="products.price"):
+        client.post("/api/products/import", headers=headers,
+                    files={"file": ("items.jsonl", body, "application/x-ndjson")})
@@ -0,0 +1,93 @@
+import asyncio
+import fakeredis
+from starlette.requests import Request
+from app.cache import TTLCache
+from app.response_cache import ResponseCache, response_cache
+
+def make_request(query_string: str, tenant_id: int = 1) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/api/public/products",
+        "query_string": query_string.encode(),
+        "headers": [],
+        "state": {"tenant_id": tenant_id},
+    })
+
+def key(query_string: str) -> str:
+    return asyncio.run(ResponseCache(maxsize=10, ttl=60)._key(make_request(query_string)))
+
+def test_key_keeps_encoded_separators_apart():
+    # search="a&b=c" must not share a key with search="a" plus b="c"
+    assert key("search=a%26b%3Dc") != key("search=a&b=c")
+    assert key("search=a%3Db") != key("search%3Da=b")
+
+def test_key_ignores_parameter_order():
+    assert key("page=2&search=shoes") == key("search=shoes&page=2")
+
+def test_key_is_per_tenant():
+    cache = ResponseCache(maxsize=10, ttl=60)
+    first = asyncio.run(cache._key(make_request("page=1", tenant_id=1)))
+    second = asyncio.run(cache._key(make_request("page=1", tenant_id=2)))
+    assert first != second
+
+def redis_cache(server, version_ttl: float = 1.0) -> ResponseCache:
+    return ResponseCache(maxsize=10, ttl=60, redis=fakeredis.FakeAsyncRedis(server=server), version_ttl=version_ttl)
+
+class CountingRedis(fakeredis.FakeAsyncRedis):
+    calls = 0
+
+    async def execute_command(self, *args, **options):
+        CountingRedis.calls += 1
+        return await super().execute_command(*args, **options)
+
+def test_local_hits_skip_redis():
+    cache = ResponseCache(maxsize=10, ttl=60, redis=CountingRedis())
+
+    async def scenario():
+        await cache.set(make_request("page=1"), b"[]")
+        CountingRedis.calls = 0
+        for _ in range(5):
+            assert (await cache.get(make_request("page=1"))).body == b"[]"
+        return CountingRedis.calls
+
+    assert asyncio.run(scenario()) == 0
+
+def test_invalidation_applies_to_other_workers_within_version_ttl():
+    server = fakeredis.FakeServer()
+    first, second = redis_cache(server, version_ttl=0.05), redis_cache(server, version_ttl=0.05)
+
+    async def scenario():
+        await second.set(make_request("page=1"), b"old")
+        assert await second.get(make_request("page=1")) is not None
+        await first.invalidate(1)
+        # The invalidating worker sees it at once, the others after version_ttl
+        assert await first.get(make_request("page=1")) is None
+        await asyncio.sleep(0.1)
+        assert await second.get(make_request("page=1")) is None
+
+    asyncio.run(scenario())
+
+def test_redis_outage_degrades_to_misses():
+    server = fakeredis.FakeServer()
+    cache = redis_cache(server)
+    server.connected = False
+
+    async def scenario():
+        assert await cache.get(make_request("page=1")) is None
+        response = await cache.set(make_request("page=1"), b"[]")
+        assert response.body == b"[]"
+        await cache.invalidate(1)
+
+    asyncio.run(scenario())
+    # The lookup, the store, and the bumps of tenant 1 and tenant 0
+    assert cache.stats["errors"] == 4
+
+def test_storefront_is_served_while_redis_is_down(client, store, monkeypatch):
+    _, headers = store
+    server = fakeredis.FakeServer()
+    server.connected = False
+    monkeypatch.setattr(response_cache, "redis", fakeredis.FakeAsyncRedis(server=server))
+    monkeypatch.setattr(response_cache, "_redis_versions", TTLCache(maxsize=10, ttl=1))
+    response = client.get("/api/public/products", headers={"host": headers["host"]})
+    assert response.status_code == 200, response.text
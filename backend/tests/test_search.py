@@ -0,0 +1,39 @@
+from sqlalchemy import text, update
+from app.database import SessionLocal, engine
+from app.models import Product
+from app.search import SQLITE_SEARCH_DDL, init_search
+
+def fts_changes(statement, params: dict) -> int:
+    """FTS rows written by one statement, from SQLite's total_changes()"""
+    with engine.begin() as conn:
+        before = conn.execute(text("SELECT total_changes()")).scalar()
+        conn.execute(statement, params)
+        return conn.execute(text("SELECT total_changes()")).scalar() - before - 1
+
+def test_stock_updates_leave_the_search_index_alone(client, product):
+    item = product(stock=5, title="Blue kurta")
+    assert fts_changes(text("UPDATE products SET stock = stock - 1 WHERE id = :id"), {"id": item["id"]}) == 0
+    assert fts_changes(text("UPDATE products SET title = 'Red kurta' WHERE id = :id"), {"id": item["id"]}) > 0
+
+def test_title_updates_are_searchable(client, store, product):
+    _, headers = store
+    item = product(title="Blue kurta")
+    with SessionLocal() as session:
+        session.execute(update(Product).where(Product.id == item["id"]).values(title="Green saree", stock=3))
+        session.commit()
+    found = client.get("/api/products/search?q=saree", headers=headers).json()["items"]
+    assert [p["id"] for p in found] == [item["id"]]
+    assert client.get("/api/products/search?q=kurta", headers=headers).json()["items"] == []
+
+def test_init_search_replaces_the_old_update_trigger(client):
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TRIGGER products_fts_update")
+        conn.exec_driver_sql(SQLITE_SEARCH_DDL[-1].replace(
+            "AFTER UPDATE OF title, title_bn, description, description_bn ON", "AFTER UPDATE ON"
+        ))
+    init_search(engine)
+    with engine.connect() as conn:
+        sql = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE name = 'products_fts_update'"
+        ).scalar()
+    assert "AFTER UPDATE OF title, title_bn, description, description_bn ON products" in sql
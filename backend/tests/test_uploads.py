@@ -0,0 +1,123 @@
+import asyncio
+import io
+import uuid
+import httpx
+from PIL import Image
+from app.file_serving import IMMUTABLE_CACHE_CONTROL
+from app.images import variant_filename
+from app.main import app
+from app.routers import uploads
+from app.routers.uploads import UPLOAD_DIR
+from tests.conftest import AUTH
+
+BOUNDARY = "test-boundary"
+
+def png_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+def multipart_body(files: list) -> bytes:
+    """multipart/form-data body with a "files" part per (filename, data)"""
+    body = b"".join(
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; filename="{filename}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n".encode() + data + b"\r\n"
+        for filename, data in files
+    )
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+def leftover_part_files() -> list:
+    return list(UPLOAD_DIR.glob(".*.part"))
+
+def write_upload(filename: str, data: bytes = b"image bytes"):
+    (UPLOAD_DIR / filename).write_bytes(data)
+
+def test_original_is_immutable(client):
+    filename = f"{uuid.uuid4()}.png"
+    write_upload(filename)
+    response = client.get(f"/api/uploads/images/{filename}")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+def test_pending_variant_redirects_without_caching(client):
+    filename = f"{uuid.uuid4()}.png"
+    write_upload(filename)
+    for path in (f"/api/uploads/images/{filename}", f"/uploads/{filename}"):
+        response = client.get(f"{path}?variant=thumb", headers={"Accept": "image/webp"}, follow_redirects=False)
+        assert response.status_code == 302
+        assert response.headers["location"] == path
+        assert response.headers["cache-control"] == "no-store"
+        assert response.headers["vary"] == "Accept"
+        assert "etag" not in response.headers
+
+def test_generated_variant_is_immutable_and_varies_on_accept(client):
+    filename = f"{uuid.uuid4()}.png"
+    write_upload(filename, b"original")
+    write_upload(variant_filename(filename, "thumb", "webp"), b"webp thumb")
+    write_upload(variant_filename(filename, "thumb", "png"), b"png thumb")
+
+    webp = client.get(f"/api/uploads/images/{filename}?variant=thumb", headers={"Accept": "image/webp"})
+    assert webp.status_code == 200
+    assert webp.content == b"webp thumb"
+    assert webp.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert webp.headers["vary"] == "Accept"
+
+    png = client.get(f"/api/uploads/images/{filename}?variant=thumb", headers={"Accept": "image/*"})
+    assert png.content == b"png thumb"
+    assert png.headers["vary"] == "Accept"
+    assert png.headers["etag"] != webp.headers["etag"]
+
+def test_upload_saves_files(client):
+    response = client.post(
+        "/api/uploads/images", headers=AUTH,
+        files=[("files", ("a.png", png_bytes(), "image/png")), ("files", ("b.PNG", png_bytes(), "image/png"))],
+    )
+    assert response.status_code == 200, response.text
+    urls = response.json()["files"]
+    assert len(urls) == 2
+    for url in urls:
+        assert client.get(url).content == png_bytes()
+    assert not leftover_part_files()
+
+def test_upload_rejects_disallowed_type_and_missing_files(client):
+    response = client.post("/api/uploads/images", headers=AUTH, files=[("files", ("a.exe", b"MZ", "application/octet-stream"))])
+    assert response.status_code == 400
+    response = client.post("/api/uploads/images", headers=AUTH, files=[("other", ("a.png", png_bytes(), "image/png"))])
+    assert response.status_code == 400
+    assert not leftover_part_files()
+
+def test_oversized_content_length_is_rejected_before_reading(client, monkeypatch):
+    monkeypatch.setattr(uploads, "MAX_FILE_SIZE", 1000)
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_FILES", 2)
+    body = multipart_body([("a.png", b"x" * 5000)])
+    response = client.post(
+        "/api/uploads/images", content=body,
+        headers={**AUTH, "Content-Type": f"multipart/form-data; boundary={BOUNDARY}"},
+    )
+    assert response.status_code == 413
+
+async def post_streamed(body: bytes, chunk_size: int) -> tuple:
+    """POST body in chunks without Content-Length; return (status, bytes the app read)"""
+    sent = 0
+
+    async def chunks():
+        nonlocal sent
+        for offset in range(0, len(body), chunk_size):
+            sent += chunk_size
+            yield body[offset:offset + chunk_size]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        response = await http.post(
+            "/api/uploads/images", content=chunks(),
+            headers={**AUTH, "Content-Type": f"multipart/form-data; boundary={BOUNDARY}"},
+        )
+    return response.status_code, sent
+
+def test_oversized_file_stops_the_upload_early(client, monkeypatch):
+    monkeypatch.setattr(uploads, "MAX_FILE_SIZE", 10_000)
+    body = multipart_body([("a.png", b"x" * 1_000_000)])
+    status_code, sent = asyncio.run(post_streamed(body, 4096))
+    assert status_code == 400
+    assert sent < 20_000
+    assert not leftover_part_files()
@@ -15,6 +15,7 @@ const resources = {
       "add": "যোগ করুন",
       "search": "খুঁজুন",
       "loading": "লোড হচ্ছে...",
+      "load_more": "আরও দেখুন",
       "error": "ত্রুটি",
       "success": "সফল",
       
@@ -69,6 +70,7 @@ const resources = {
       "add": "Add",
       "search": "Search",
       "loading": "Loading...",
+      "load_more": "Load more",
       "error": "Error",
       "success": "Success",
       
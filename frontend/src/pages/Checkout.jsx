@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react'
+import React, { useState, useEffect, useRef } from 'react'
 import { useSearchParams, useNavigate } from 'react-router-dom'
 import { useTranslation } from 'react-i18next'
 import apiClient from '../api/client'
@@ -20,6 +20,12 @@ function Checkout() {
     quantity: 1
   })
   const [loading, setLoading] = useState(false)
+  // Same key for retries of an unchanged order, so the server creates it once
+  const idempotencyKey = useRef(null)
+
+  useEffect(() => {
+    idempotencyKey.current = null
+  }, [formData])
 
   useEffect(() => {
     if (productId) {
@@ -40,6 +46,10 @@ function Checkout() {
     e.preventDefault()
     if (!product) return
 
+    if (!idempotencyKey.current) {
+      idempotencyKey.current = window.crypto?.randomUUID?.()
+        || `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`
+    }
     setLoading(true)
     try {
       await apiClient.post('/api/orders', {
@@ -50,6 +60,8 @@ function Checkout() {
         shipping_address: formData.shipping_address,
         shipping_city: formData.shipping_city,
         shipping_postal: formData.shipping_postal,
+      }, {
+        headers: { 'Idempotency-Key': idempotencyKey.current },
       })
       alert('Order placed successfully!')
       navigate('/')
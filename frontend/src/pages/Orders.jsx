@@ -6,16 +6,18 @@ import apiClient from '../api/client'
 function Orders() {
   const { t } = useTranslation()
   const [orders, setOrders] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
   const [loading, setLoading] = useState(true)
 
   useEffect(() => {
     loadOrders()
   }, [])
 
-  const loadOrders = async () => {
+  const loadOrders = async (cursor = null) => {
     try {
-      const response = await apiClient.get('/api/orders')
-      setOrders(response.data)
+      const response = await apiClient.get('/api/orders', { params: cursor ? { cursor } : {} })
+      setOrders((prev) => (cursor ? [...prev, ...response.data.items] : response.data.items))
+      setNextCursor(response.data.next_cursor)
     } catch (error) {
       console.error('Failed to load orders:', error)
     } finally {
@@ -55,6 +57,14 @@ function Orders() {
             No orders yet.
           </div>
         )}
+        {nextCursor && (
+          <button
+            onClick={() => loadOrders(nextCursor)}
+            className="w-full py-2 border rounded-lg text-blue-600 font-semibold"
+          >
+            {t('load_more')}
+          </button>
+        )}
       </div>
     </Layout>
   )
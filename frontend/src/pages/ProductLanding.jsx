@@ -20,8 +20,8 @@ function ProductLanding() {
     try {
       // Try public endpoint first (works without subdomain)
       const publicResponse = await apiClient.get(`/api/public/products?slug=${slug}`)
-      if (publicResponse.data && publicResponse.data.length > 0) {
-        setProduct(publicResponse.data[0])
+      if (publicResponse.data && publicResponse.data.items.length > 0) {
+        setProduct(publicResponse.data.items[0])
         
         // Load store info
         try {
@@ -63,13 +63,7 @@ function ProductLanding() {
   }
 
   const getImages = () => {
-    if (!product?.images) return []
-    try {
-      const images = JSON.parse(product.images)
-      return images.map(getImageUrl).filter(Boolean)
-    } catch (e) {
-      return []
-    }
+    return (product?.images || []).map((img) => getImageUrl(img.url)).filter(Boolean)
   }
 
   const shareOnFacebook = () => {
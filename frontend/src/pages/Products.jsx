@@ -9,6 +9,7 @@ function Products() {
   const { t } = useTranslation()
   const { getProductUrl, currentStore } = useStoreStore()
   const [products, setProducts] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
   const [filteredProducts, setFilteredProducts] = useState([])
   const [loading, setLoading] = useState(true)
   const [showForm, setShowForm] = useState(false)
@@ -35,10 +36,11 @@ function Products() {
     }
   }, [products, searchTerm, filterPublished])
 
-  const loadProducts = async () => {
+  const loadProducts = async (cursor = null) => {
     try {
-      const response = await apiClient.get('/api/products')
-      setProducts(response.data)
+      const response = await apiClient.get('/api/products', { params: cursor ? { cursor } : {} })
+      setProducts((prev) => (cursor ? [...prev, ...response.data.items] : response.data.items))
+      setNextCursor(response.data.next_cursor)
     } catch (error) {
       console.error('Failed to load products:', error)
     } finally {
@@ -74,8 +76,7 @@ function Products() {
         ...formData,
         price: parseFloat(formData.price),
         discount_price: formData.discount_price ? parseFloat(formData.discount_price) : null,
-        stock: parseInt(formData.stock) || 0,
-        images: JSON.stringify(formData.images)
+        stock: parseInt(formData.stock) || 0
       }
       
       if (editingProduct) {
@@ -102,7 +103,7 @@ function Products() {
       discount_price: product.discount_price || '',
       stock: product.stock?.toString() || '0',
       is_published: product.is_published || false,
-      images: product.images ? (typeof product.images === 'string' ? JSON.parse(product.images) : product.images) : []
+      images: (product.images || []).map((img) => img.url)
     })
     setShowForm(true)
   }
@@ -139,19 +140,13 @@ function Products() {
   }
 
   const getImageUrl = (product) => {
-    if (!product.images) return null
-    try {
-      const images = JSON.parse(product.images)
-      if (images && images.length > 0) {
-        const imgUrl = images[0]
-        if (imgUrl.startsWith('http')) return imgUrl
-        const apiUrl = apiClient.defaults.baseURL || window.location.origin
-        return `${apiUrl}${imgUrl}`
-      }
-    } catch (e) {
-      return null
-    }
-    return null
+    const image = product.images?.[0]
+    if (!image) return null
+    // Listings only need the small variant when the upload has one
+    const imgUrl = image.variants?.thumb || image.url
+    if (imgUrl.startsWith('http')) return imgUrl
+    const apiUrl = apiClient.defaults.baseURL || window.location.origin
+    return `${apiUrl}${imgUrl}`
   }
 
   if (loading) {
@@ -373,6 +368,14 @@ function Products() {
               : 'No products yet.'}
           </div>
         )}
+        {nextCursor && (
+          <button
+            onClick={() => loadProducts(nextCursor)}
+            className="w-full py-2 border rounded-lg text-blue-600 font-semibold"
+          >
+            {t('load_more')}
+          </button>
+        )}
       </div>
     </Layout>
   )